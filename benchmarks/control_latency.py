@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - control socket benchmark
+
+Compares old control server (thread per client, every message handled
+under global lock) with ControlServer, which handles all clients on
+daemon mainloop.
+
+In both cases, server process also runs simulated input processing,
+taking --work microseconds every millisecond, as daemon does while
+controller is in use. Clients run in separate process and every one of
+them sends message, waits for response and repeats. Reported are
+round-trip times and number of messages handled per second.
+"""
+from scc.control_server import ControlServer
+from scc.scheduler import Scheduler
+from scc.poller import Poller
+from socketserver import UnixStreamServer, ThreadingMixIn, StreamRequestHandler
+import os, sys, time, socket, tempfile, threading, selectors, argparse
+import multiprocessing
+
+MESSAGE = b"Led: 50\n"
+RESPONSE = b"OK.\n"
+INPUT_PERIOD = 0.001
+
+
+class ThreadingUnixStreamServer(ThreadingMixIn, UnixStreamServer): daemon_threads = True
+
+
+def busy(seconds):
+	end = time.perf_counter() + seconds
+	while time.perf_counter() < end:
+		pass
+
+
+def run_clients(socket_file, clients, messages, pipe):
+	""" Runs in child process, sends results back through pipe """
+	sel = selectors.DefaultSelector()
+	sent, started, latencies = {}, {}, []
+	for i in range(clients):
+		s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		s.connect(socket_file)
+		sel.register(s, selectors.EVENT_READ)
+		sent[s] = 0
+	start = time.perf_counter()
+	for s in sent:
+		started[s] = time.perf_counter()
+		s.sendall(MESSAGE)
+	remaining = clients * messages
+	while remaining:
+		for key, mask in sel.select():
+			s = key.fileobj
+			for i in range(s.recv(4096).count(b"\n")):
+				latencies.append(time.perf_counter() - started[s])
+				remaining -= 1
+				sent[s] += 1
+				if sent[s] < messages:
+					started[s] = time.perf_counter()
+					s.sendall(MESSAGE)
+	pipe.send(( time.perf_counter() - start, latencies ))
+	for s in sent:
+		s.close()
+
+
+def threaded_server(socket_file, work, clients_done):
+	""" Thread per client, global lock, input processing on main thread """
+	lock = threading.Lock()
+	class Handler(StreamRequestHandler):
+		def handle(self):
+			for line in self.rfile:
+				with lock:
+					self.wfile.write(RESPONSE)
+	
+	server = ThreadingUnixStreamServer(socket_file, Handler)
+	t = threading.Thread(target=server.serve_forever)
+	t.daemon = True
+	t.start()
+	yield
+	while not clients_done():
+		time.sleep(INPUT_PERIOD)
+		busy(work)
+	server.shutdown()
+	server.server_close()
+
+
+def poller_server(socket_file, work, clients_done):
+	""" ControlServer and input processing on same mainloop """
+	poller, scheduler = Poller(), Scheduler()
+	scheduler.set_wakeup(poller.wakeup)
+	def on_connect(connection):
+		connection.on_message = lambda c, line: c.write(RESPONSE)
+	def input_tick():
+		busy(work)
+		scheduler.schedule(INPUT_PERIOD, input_tick)
+	
+	server = ControlServer(poller, socket_file, on_connect)
+	scheduler.schedule(INPUT_PERIOD, input_tick)
+	yield
+	while not clients_done():
+		poller.poll(scheduler.get_timeout())
+		scheduler.run()
+	server.close()
+
+
+def measure(name, server, args):
+	socket_file = os.path.join(tempfile.mkdtemp(), "daemon.socket")
+	parent, child = multiprocessing.Pipe()
+	p = multiprocessing.Process(target=run_clients,
+		args=(socket_file, args.clients, args.messages, child))
+	steps = server(socket_file, args.work / 1000000.0, lambda : parent.poll())
+	next(steps)			# server is listening
+	p.start()
+	for x in steps:
+		pass
+	total, latencies = parent.recv()
+	p.join()
+	latencies.sort()
+	print("%-9s p50: %7.1fus  p99: %7.1fus  max: %8.1fus  %8.0f msgs/s" % (name,
+		latencies[len(latencies) * 50 // 100] * 1000000.0,
+		latencies[len(latencies) * 99 // 100] * 1000000.0,
+		latencies[-1] * 1000000.0,
+		len(latencies) / total))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-c', '--clients', type=int, default=50,
+		help="number of concurrently connected clients")
+	parser.add_argument('-m', '--messages', type=int, default=200,
+		help="number of messages sent by every client")
+	parser.add_argument('-w', '--work', type=float, default=100,
+		help="microseconds of simulated input processing every millisecond")
+	args = parser.parse_args()
+	
+	measure("threaded", threaded_server, args)
+	measure("poller", poller_server, args)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
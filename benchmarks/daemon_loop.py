@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - mainloop benchmark
+
+Compares old mainloop (select() with fixed 10ms timeout, spinning over all
+mainloop functions) with event-driven one, that sleeps in poller until
+next scheduled task is due.
+
+Measures number of wakeups per second, context switches, CPU time and
+how late are scheduled tasks executed.
+"""
+from scc.scheduler import Scheduler
+from scc.poller import Poller
+import sys, time, select, resource, argparse
+
+PERIOD = 0.02		# same as BallModifier uses
+
+
+def legacy_loop(scheduler, poller, duration):
+	""" Mainloop as it was before: poller.poll had fixed 10ms timeout """
+	iterations = 0
+	end = time.time() + duration
+	while time.time() < end:
+		select.select([], [], [], 0.01)
+		scheduler.run()
+		iterations += 1
+	return iterations
+
+
+def event_loop(scheduler, poller, duration):
+	""" Mainloop as used by SCCDaemon.run """
+	iterations = 0
+	end = time.time() + duration
+	scheduler.schedule(duration, lambda: None)	# so loop ends in time
+	while time.time() < end:
+		poller.poll(scheduler.get_timeout())
+		scheduler.run()
+		iterations += 1
+	return iterations
+
+
+def measure(name, loop, duration, periodic):
+	scheduler = Scheduler()
+	poller = Poller()
+	lateness = []
+	
+	def task(expected):
+		lateness.append(time.time() - expected)
+		scheduler.schedule(PERIOD, task, time.time() + PERIOD)
+	
+	if periodic:
+		scheduler.schedule(PERIOD, task, time.time() + PERIOD)
+	
+	r_start = resource.getrusage(resource.RUSAGE_SELF)
+	t_start = time.time()
+	iterations = loop(scheduler, poller, duration)
+	elapsed = time.time() - t_start
+	r_end = resource.getrusage(resource.RUSAGE_SELF)
+	
+	cpu = (r_end.ru_utime - r_start.ru_utime) + (r_end.ru_stime - r_start.ru_stime)
+	print("%-8s %-9s wakeups/s: %8.1f  ctx switches/s: %8.1f  cpu: %5.2f%%" % (
+		name, "periodic" if periodic else "idle",
+		iterations / elapsed,
+		(r_end.ru_nvcsw - r_start.ru_nvcsw) / elapsed,
+		100.0 * cpu / elapsed,
+	))
+	if lateness:
+		lateness.sort()
+		print("%-18s timer jitter: avg %6.3fms  p50 %6.3fms  p99 %6.3fms  max %6.3fms" % (
+			"",
+			1000.0 * sum(lateness) / len(lateness),
+			1000.0 * lateness[len(lateness) // 2],
+			1000.0 * lateness[int(len(lateness) * 0.99)],
+			1000.0 * lateness[-1],
+		))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-d', '--duration', type=float, default=3.0,
+		help="duration of each measurement in seconds")
+	args = parser.parse_args()
+	
+	for periodic in (False, True):
+		measure("legacy", legacy_loop, args.duration, periodic)
+		measure("event", event_loop, args.duration, periodic)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - input decoding benchmark
+
+Decodes stream of generated Steam Controller packets, including rotation
+of both pads, and compares creating new ControllerInput for every packet,
+as it was done before, with unpacking into reusable SCInput buffers.
+
+Needs libusb to be installed, as sc_dongle imports it, but no controller.
+"""
+from scc.drivers.sc_dongle import ControllerInput, SCInput, TUP_FORMAT
+from scc.drivers.sc_dongle import INPUT_STRUCT
+from scc.constants import STICK_PAD_MIN, STICK_PAD_MAX
+from math import sin, cos, pi as PI
+import os, sys, time, struct, argparse
+
+ROTATION = 15.0 * PI / -180.0
+
+
+def generate_packets(count):
+	packets = []
+	for i in range(count):
+		p = bytearray(os.urandom(64))
+		p[2] = 1		# SCStatus.INPUT
+		packets.append(bytes(p))
+	return packets
+
+
+def legacy(packets):
+	for data in packets:
+		idata = ControllerInput._make(struct.unpack(TUP_FORMAT, data))
+		s, c = sin(ROTATION), cos(ROTATION)
+		x, y = idata.lpad_x, idata.lpad_y
+		idata = idata._replace(
+			lpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s))),
+			lpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c))),
+		)
+		s, c = sin(ROTATION), cos(ROTATION)
+		x, y = idata.rpad_x, idata.rpad_y
+		idata = idata._replace(
+			rpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s))),
+			rpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c))),
+		)
+
+
+def reusable(packets):
+	state, old_state = SCInput(), SCInput()
+	s, c = sin(ROTATION), cos(ROTATION)
+	for data in packets:
+		state.unpack(data)
+		x, y = state.lpad_x, state.lpad_y
+		state.lpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s)))
+		state.lpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c)))
+		x, y = state.rpad_x, state.rpad_y
+		state.rpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s)))
+		state.rpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c)))
+		state, old_state = old_state, state
+
+
+def measure(name, fn, packets):
+	blocks = sys.getallocatedblocks()
+	start = time.perf_counter()
+	fn(packets)
+	t = time.perf_counter() - start
+	print("%-8s packets: %6i  per packet: %6.2fus  leftover blocks: %i" % (
+		name, len(packets), t * 1000000.0 / len(packets),
+		sys.getallocatedblocks() - blocks))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-p', '--packets', type=int, default=100000,
+		help="number of generated packets")
+	args = parser.parse_args()
+	
+	assert INPUT_STRUCT.size <= 64
+	packets = generate_packets(args.packets)
+	measure("legacy", legacy, packets)
+	measure("reusable", reusable, packets)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Input dispatch benchmark
+
+Replays generated stream of controller inputs (mostly pad, stick and gyro
+movement with occasional button press) through Mapper with one of
+default profiles loaded. Compares current Mapper, which dispatches
+inputs using compiled profile, with Mapper that walked all buttons and
+checked controller flags on every input.
+
+All virtual devices are replaced by dummies. Both mappers are measured
+in turns, several times, and best time of each is reported, as single
+run is easily skewed by rest of the system.
+"""
+from scc.constants import SCButtons, STICKTILT, LEFT, RIGHT, CPAD, STICK
+from scc.constants import FE_STICK, FE_TRIGGER, FE_PAD, ControllerFlags
+from scc.drivers.fake import FakeController
+from scc.parser import TalkingActionParser
+from scc.scheduler import Scheduler
+from scc.profile import Profile
+from scc.mapper import Mapper
+from scc.uinput import Dummy
+from collections import namedtuple
+import os, sys, time, random, argparse, logging, traceback
+log = logging.getLogger("Mapper")
+
+Input = namedtuple('Input',
+	'buttons ltrig rtrig stick_x stick_y lpad_x lpad_y rpad_x rpad_y '
+	'cpad_x cpad_y accel_x accel_y accel_z gpitch groll gyaw q1 q2 q3 q4'
+)
+ZERO = Input(*[0] * len(Input._fields))
+BUTTONS = ( SCButtons.A, SCButtons.B, SCButtons.X, SCButtons.Y,
+	SCButtons.LB, SCButtons.RB )
+
+
+class NullDevice(Dummy):
+	def clearRemainders(self):
+		pass
+
+
+class BenchController(FakeController):
+	def get_gyro_enabled(self):
+		return True
+
+
+class LegacyMapper(Mapper):
+	
+	def input(self, controller, old_state, state):
+		"""
+		Mapper.input as it was before profiles were compiled, with same
+		tracing, recording and state publishing checks as Mapper has now.
+		"""
+		tr = self.tracer
+		if tr: tr.begin()
+		if self.recorder:
+			self.recorder.record(controller, state)
+		if self.state_ring:
+			self.state_ring.publish(controller, state)
+		
+		# Store states
+		self.old_state = old_state
+		self.old_buttons = self.buttons
+		
+		self.state = state
+		self.buttons = state.buttons
+		
+		t = time.time()
+		controller.time_elapsed = self.time_elapsed = t - controller.lastTime
+		controller.lastTime = t
+		
+		if self.buttons & SCButtons.LPAD and not self.buttons & (SCButtons.LPADTOUCH | STICKTILT):
+			self.buttons = (self.buttons & ~SCButtons.LPAD) | SCButtons.STICKPRESS
+		
+		fe = self.force_event
+		self.force_event = set()
+		
+		# Check buttons
+		xor = self.old_buttons ^ self.buttons
+		btn_rem = xor & self.old_buttons
+		btn_add = xor & self.buttons
+		
+		try:
+			if btn_add or btn_rem:
+				# At least one button was pressed
+				for x in self.profile.buttons:
+					if x & btn_add:
+						self.profile.buttons[x].button_press(self)
+					elif x & btn_rem:
+						self.profile.buttons[x].button_release(self)
+			
+			
+			# Check stick
+			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
+				if FE_STICK in fe or self.old_state.stick_x != state.stick_x or self.old_state.stick_y != state.stick_y:
+					self.profile.stick.whole(self, state.stick_x, state.stick_y, STICK)
+			elif not self.buttons & SCButtons.LPADTOUCH:
+				if FE_STICK in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
+					self.profile.stick.whole(self, state.lpad_x, state.lpad_y, STICK)
+			
+			# Check gyro
+			if controller.get_gyro_enabled():
+				self.profile.gyro.gyro(self, state.gpitch, state.gyaw, state.groll, state.q1, state.q2, state.q3, state.q4)
+			
+			# Check triggers
+			if FE_TRIGGER in fe or state.ltrig != self.old_state.ltrig:
+				if LEFT in self.profile.triggers:
+					self.profile.triggers[LEFT].trigger(self, state.ltrig, self.old_state.ltrig)
+			if FE_TRIGGER in fe or state.rtrig != self.old_state.rtrig:
+				if RIGHT in self.profile.triggers:
+					self.profile.triggers[RIGHT].trigger(self, state.rtrig, self.old_state.rtrig)
+			
+			# Check pads
+			# RPAD
+			if controller.flags & ControllerFlags.HAS_RSTICK:
+				if FE_PAD in fe or self.old_state.rpad_x != state.rpad_x or self.old_state.rpad_y != state.rpad_y:
+					self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
+			elif FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
+				self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
+			
+			# LPAD
+			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
+				if FE_PAD in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
+					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
+			else:
+				if self.buttons & SCButtons.LPADTOUCH:
+					# Pad is being touched now
+					if not self.lpad_touched:
+						self.lpad_touched = True
+					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
+					if self.old_state.buttons & STICKTILT and not self.buttons & STICKTILT:
+						# LPAD and stick share axes and so when they are used simultaneously (by someone with 3 hands or so :)
+						# this is how mapper can tell that stick was recentered
+						self.profile.stick.whole(self, 0, 0, STICK)
+				elif not self.buttons & STICKTILT:
+					# Pad is not being touched
+					if self.lpad_touched:
+						self.lpad_touched = False
+						self.profile.pads[LEFT].whole(self, 0, 0, LEFT)
+					
+			# CPAD (touchpad on DS4 controller)
+			if controller.flags & ControllerFlags.HAS_CPAD:
+				if ((FE_PAD in fe)
+						or (self.old_state.cpad_x != state.cpad_x)
+						or (self.old_state.cpad_y != state.cpad_y)
+						or ((self.old_buttons & SCButtons.CPADTOUCH) and not (self.buttons & SCButtons.CPADTOUCH))
+					):
+					if self.buttons & SCButtons.CPADTOUCH:
+						self.profile.pads[CPAD].whole(self, state.cpad_x, state.cpad_y, CPAD)
+					elif self.old_buttons & SCButtons.CPADTOUCH:
+						self.profile.pads[CPAD].whole(self, 0, 0, CPAD)
+		except Exception:
+			# Log error but don't crash here, it breaks too many things at once
+			if hasattr(self, "_testing"):
+				raise
+			log.error("Error while processing controller event")
+			log.error(traceback.format_exc())
+		
+		# TODO: Is it important to run scheduled stuff before generate_events?
+		self.scheduler.run()
+		self.generate_events()
+		self.generate_feedback()
+
+
+def generate_frames(count, seed=0):
+	""" Generates list of (old_state, state) pairs """
+	rnd = random.Random(seed)
+	frames, state = [], ZERO
+	for i in range(count):
+		buttons = state.buttons
+		if i % 50 == 0:
+			buttons ^= rnd.choice(BUTTONS)
+		touch = SCButtons.LPADTOUCH | SCButtons.RPADTOUCH if i % 200 < 150 else 0
+		buttons = (buttons & ~(SCButtons.LPADTOUCH | SCButtons.RPADTOUCH)) | touch
+		new_state = state._replace(
+			buttons = buttons,
+			ltrig = (i * 3) % 256 if i % 300 < 100 else 0,
+			lpad_x = rnd.randint(-32768, 32767) if touch else 0,
+			lpad_y = rnd.randint(-32768, 32767) if touch else 0,
+			rpad_x = rnd.randint(-32768, 32767) if touch else 0,
+			rpad_y = rnd.randint(-32768, 32767) if touch else 0,
+			gpitch = rnd.randint(-100, 100),
+			gyaw = rnd.randint(-100, 100),
+			groll = rnd.randint(-100, 100),
+		)
+		frames.append(( state, new_state ))
+		state = new_state
+	return frames
+
+
+def measure(cls, filename, frames):
+	""" Returns time spent processing one frame, in microseconds """
+	profile = Profile(TalkingActionParser()).load(filename)
+	profile.compress()
+	mapper = cls(profile, Scheduler(), keyboard=False, mouse=False,
+		gamepad=False, poller=None)
+	controller = BenchController(0)
+	mapper.set_controller(controller)
+	mapper.keyboard = NullDevice()
+	mapper.mouse = NullDevice()
+	mapper.gamepad = NullDevice()
+	start = time.perf_counter()
+	for old_state, state in frames:
+		mapper.input(controller, old_state, state)
+	return (time.perf_counter() - start) * 1000000.0 / len(frames)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-f', '--frames', type=int, default=20000,
+		help="number of generated frames")
+	parser.add_argument('-r', '--rounds', type=int, default=5,
+		help="number of times every mapper is measured")
+	parser.add_argument('profiles', nargs='*', help="profile files to use; "
+		"all default profiles are used if not specified")
+	args = parser.parse_args()
+	
+	logging.disable(logging.WARNING)
+	profiles = args.profiles or [ os.path.join("default_profiles", x)
+		for x in sorted(os.listdir("default_profiles")) if not x.startswith(".") ]
+	frames = generate_frames(args.frames)
+	for filename in profiles:
+		print(os.path.split(filename)[-1])
+		times = { LegacyMapper: [], Mapper: [] }
+		for i in range(args.rounds):
+			for cls in times:
+				times[cls].append(measure(cls, filename, frames))
+		for name, cls in (("legacy", LegacyMapper), ("compiled", Mapper)):
+			print("%-8s frames: %6i  per frame: %6.2fus" % (
+				name, len(frames), min(times[cls])))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
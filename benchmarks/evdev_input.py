@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - evdev input benchmark
+
+Feeds stream of evdev events to EvdevController and compares handling
+every event separately with new namedtuple, as it was done before, with
+applying whole report to pending state and sending it to mapper once per
+SYN_REPORT.
+
+Stream is either generated, simulating generic gamepad reporting four
+axes and occasional button in every report, or read from file recorded
+with 'cat /dev/input/eventX > file'. Controller config for recorded
+stream can be specified with --config, same as one stored in
+~/.config/scc/devices.
+
+Doesn't need evdev module nor any device.
+"""
+from scc.drivers.evdevdrv import EvdevController, EVENT, EVENTS_PER_READ
+from scc.drivers.evdevdrv import EV_SYN, EV_KEY, EV_ABS, SYN_REPORT
+from scc.constants import SCButtons, STICK_PAD_MIN, STICK_PAD_MAX
+from scc.constants import TRIGGER_MIN, TRIGGER_MAX
+from scc.tools import clamp
+from collections import namedtuple
+from math import sin, cos, pi as PI
+import os, sys, time, json, argparse
+
+InputEvent = namedtuple('InputEvent', 'sec usec type code value')
+CONFIG = {
+	"buttons" : { "304" : "A", "305" : "B", "307" : "X", "308" : "Y" },
+	"axes" : {
+		"0" : { "axis" : "stick_x", "min" : -32768, "max" : 32767, "deadzone" : 2000 },
+		"1" : { "axis" : "stick_y", "min" : 32767, "max" : -32768, "deadzone" : 2000 },
+		"3" : { "axis" : "rpad_x", "min" : -32768, "max" : 32767, "deadzone" : 2000 },
+		"4" : { "axis" : "rpad_y", "min" : 32767, "max" : -32768, "deadzone" : 2000 },
+		"2" : { "axis" : "ltrig", "min" : 0, "max" : 255 },
+		"5" : { "axis" : "rtrig", "min" : 0, "max" : 255 },
+	},
+}
+
+
+class Device(object):
+	""" Replays stream of events through pipe """
+	fn = "/dev/null"
+	
+	def __init__(self):
+		self.fd, self._w = os.pipe()
+		os.set_blocking(self.fd, False)
+	
+	def read(self):
+		""" Same as evdev.InputDevice.read """
+		data = os.read(self.fd, EVENT.size * EVENTS_PER_READ)
+		return [ InputEvent(*x) for x in EVENT.iter_unpack(data) ]
+	
+	def feed(self, data):
+		os.write(self._w, data)
+	
+	def close(self):
+		os.close(self.fd)
+		os.close(self._w)
+
+
+class CountingMapper(object):
+	def __init__(self):
+		self.inputs = 0
+	
+	def input(self, controller, old_state, state):
+		self.inputs += 1
+	
+	def schedule(self, delay, cb, *data):
+		return None
+	
+	def cancel_task(self, task):
+		pass
+
+
+class LegacyController(EvdevController):
+	""" EvdevController with input handling as it was before """
+	
+	def input(self, *a):
+		new_state = self._state
+		need_cancel_padpressemu = False
+		for event in self.device.read():
+			if event.type == EV_KEY and event.code in self._dpad_map:
+				cal = self._calibrations[event.code]
+				if event.value:
+					if self._dpad_map[event.code]:
+						value = STICK_PAD_MAX
+					else:
+						value = STICK_PAD_MIN
+					cal = self._calibrations[event.code]
+					value = int(value * cal.scale * STICK_PAD_MAX)
+				else:
+					value = 0
+				axis = self._axis_map[event.code]
+				if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
+					b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
+					need_cancel_padpressemu = True
+					new_state = new_state._replace(buttons=b, **{ axis : value })
+				elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
+					b = new_state.buttons | SCButtons.RPADTOUCH
+					need_cancel_padpressemu = True
+					new_state = new_state._replace(buttons=b, **{ axis : value })
+				else:
+					new_state = new_state._replace(**{ axis : value })
+			elif event.type == EV_KEY and event.code in self._button_map:
+				if event.value:
+					b = new_state.buttons | self._button_map[event.code]
+					new_state = new_state._replace(buttons=b)
+				else:
+					b = new_state.buttons & ~self._button_map[event.code]
+					new_state = new_state._replace(buttons=b)
+			elif event.type == EV_KEY and event.code in self._axis_map:
+				axis = self._axis_map[event.code]
+				if event.value:
+					new_state = new_state._replace(**{ axis : TRIGGER_MAX })
+				else:
+					new_state = new_state._replace(**{ axis : TRIGGER_MIN })
+			elif event.type == EV_ABS and event.code in self._axis_map:
+				cal = self._calibrations[event.code]
+				value = (float(event.value) * cal.scale) + cal.offset
+				if value >= -cal.deadzone and value <= cal.deadzone:
+					value = 0
+				else:
+					value = clamp(cal.clamp_min,
+							int(value * cal.clamp_max), cal.clamp_max)
+				axis = self._axis_map[event.code]
+				if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
+					b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
+					need_cancel_padpressemu = True
+					new_state = new_state._replace(buttons=b, **{ axis : value })
+				elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
+					b = new_state.buttons | SCButtons.RPADTOUCH
+					need_cancel_padpressemu = True
+					new_state = new_state._replace(buttons=b, **{ axis : value })
+				else:
+					new_state = new_state._replace(**{ axis : value })
+		
+		if new_state is not self._state:
+			old_state, self._state = self._state, new_state
+			if self.mapper:
+				if need_cancel_padpressemu:
+					if self._padpressemu_task:
+						self.mapper.cancel_task(self._padpressemu_task)
+					self._padpressemu_task = self.mapper.schedule(
+						self.PADPRESS_EMULATION_TIMEOUT,
+						self.cancel_padpress_emulation
+					)
+				self.mapper.input(self, old_state, new_state)
+
+
+def generate_stream(reports):
+	""" Returns (data, number of reports) """
+	events = []
+	for i in range(reports):
+		a = 2 * PI * i / 500.0
+		events += [
+			( EV_ABS, 0, int(32767 * cos(a)) ),
+			( EV_ABS, 1, int(32767 * sin(a)) ),
+			( EV_ABS, 3, int(32767 * sin(a)) ),
+			( EV_ABS, 4, int(32767 * cos(a)) ),
+		]
+		if i % 50 == 0:
+			events.append(( EV_KEY, 304 + (i // 50) % 2, (i // 100) % 2 ))
+		events.append(( EV_SYN, SYN_REPORT, 0 ))
+	return b"".join([ EVENT.pack(0, 0, *e) for e in events ]), reports
+
+
+def load_stream(filename):
+	""" Returns (data, number of reports) """
+	with open(filename, "rb") as f:
+		data = f.read()
+	data = data[0:len(data) - len(data) % EVENT.size]
+	reports = len([ x for x in EVENT.iter_unpack(data)
+		if x[2] == EV_SYN and x[3] == SYN_REPORT ])
+	return data, reports
+
+
+def measure(name, cls, config, data, reports):
+	device = Device()
+	c = cls(None, device, None, config)
+	c.set_mapper(CountingMapper())
+	chunk = EVENT.size * EVENTS_PER_READ
+	start = time.perf_counter()
+	for i in range(0, len(data), chunk):
+		device.feed(data[i:i+chunk])
+		c.input()
+	t = time.perf_counter() - start
+	device.close()
+	print("%-8s reports: %6i  per report: %6.2fus  mapper inputs per report: %.2f" % (
+		name, reports, t * 1000000.0 / max(1, reports),
+		float(c.mapper.inputs) / max(1, reports)))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-r', '--reports', type=int, default=100000,
+		help="number of generated reports")
+	parser.add_argument('-c', '--config', help="controller config file")
+	parser.add_argument('stream', nargs='?', help="file with recorded events")
+	args = parser.parse_args()
+	
+	config = CONFIG
+	if args.config:
+		with open(args.config, "r") as f:
+			config = json.load(f)
+	if args.stream:
+		data, reports = load_stream(args.stream)
+	else:
+		data, reports = generate_stream(args.reports)
+	measure("legacy", LegacyController, config, data, reports)
+	measure("batched", EvdevController, config, data, reports)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
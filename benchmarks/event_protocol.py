@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - event protocol benchmark
+
+Compares text 'Event:' messages with binary event frames: time daemon
+spends encoding events, time client spends parsing them back and number
+of bytes sent per event.
+
+Every generated frame contains stick and pad position, as when menu is
+controlled by stick while finger rests on pad, and every tenth frame
+also button press or release.
+"""
+from scc.control_server import Connection
+from scc.sccdaemon import Client
+from scc.poller import Poller
+from scc import binevents
+import sys, time, socket, argparse
+
+
+def generate_batches(count):
+	batches = []
+	for i in range(count):
+		batch = [
+			( "sc0", "STICK", [ i % 32768, -i % 32768 ] ),
+			( "sc0", "LEFT", [ (i * 3) % 32768, 100 ] ),
+		]
+		if i % 10 == 0:
+			batch.append(( "sc0", "A", [ (i // 10) % 2 ] ))
+		batches.append(batch)
+	return batches
+
+
+def parse_text(data, emit):
+	""" Same as DaemonManager does with text messages """
+	while b"\n" in data:
+		line, data = data.split(b"\n", 1)
+		line = line.decode("utf-8")
+		if line.startswith("Event:"):
+			parts = line[6:].strip().split(" ")
+			emit(parts[0], parts[1], [ int(float(x)) for x in parts[2:] ])
+
+
+def parse_binary(data, emit):
+	""" Same as DaemonManager does with binary frames """
+	while data:
+		controller_id, events, size = binevents.unpack(data)
+		data = data[size:]
+		for what, values in events:
+			emit(controller_id, what, values)
+
+
+def measure(name, binary, parse, batches):
+	# Events are only formatted, nothing is sent through connection
+	a, b = socket.socketpair()
+	client = Client(Connection(Poller(), a), None)
+	client.binary_events = binary
+	events = [ 0 ]
+	def emit(controller_id, what, values):
+		events[0] += 1
+	
+	start = time.perf_counter()
+	encoded = [ client._format_events(batch) for batch in batches ]
+	encode_time = time.perf_counter() - start
+	start = time.perf_counter()
+	for data in encoded:
+		parse(data, emit)
+	parse_time = time.perf_counter() - start
+	size = sum([ len(x) for x in encoded ])
+	print("%-7s events: %7i  encode: %5.2fus  parse: %5.2fus  bytes: %5.2f  (per event)" % (
+		name, events[0], encode_time * 1000000.0 / events[0],
+		parse_time * 1000000.0 / events[0], float(size) / events[0]))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-f', '--frames', type=int, default=100000,
+		help="number of generated frames")
+	args = parser.parse_args()
+	
+	batches = generate_batches(args.frames)
+	measure("text", False, parse_text, batches)
+	measure("binary", True, parse_binary, batches)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Hit-test benchmark
+
+Measures time needed to find key under cursor on generated on-screen
+keyboard layouts of growing size, as done by OSD keyboard for both pads
+at input rate. Compares linear scan over all keys, as done before, with
+GridIndex lookup.
+"""
+from scc.gridindex import GridIndex
+import sys, time, random, argparse
+
+KEY_SIZE = 80
+GAP = 5
+
+
+class Key(object):
+	def __init__(self, x, y, w, h):
+		self.x, self.y, self.w, self.h = x, y, w, h
+	
+	def contains(self, x, y):
+		return (x >= self.x and y >= self.y
+			and x <= self.x + self.w and y <= self.y + self.h)
+
+
+def make_layout(columns, rows):
+	""" Generates rows of keys, with some of them wider, as on real keyboard """
+	rnd = random.Random(columns * rows)
+	keys = []
+	for row in range(rows):
+		x = 0
+		for col in range(columns):
+			w = KEY_SIZE * rnd.choice(( 1, 1, 1, 1, 1.5, 2 ))
+			keys.append(Key(x, row * (KEY_SIZE + GAP), w, KEY_SIZE))
+			x += w + GAP
+	return keys
+
+
+def linear(keys, x, y):
+	for key in keys:
+		if key.contains(x, y):
+			return key
+	return None
+
+
+def measure(fn, points):
+	start = time.perf_counter()
+	for x, y in points:
+		fn(x, y)
+	return (time.perf_counter() - start) / len(points) * 1000000.0
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-n', '--lookups', type=int, default=100000,
+		help="number of cursor positions tested on every layout")
+	args = parser.parse_args()
+	
+	rnd = random.Random(0)
+	for columns, rows in ((15, 5), (30, 10), (60, 20), (120, 40)):
+		keys = make_layout(columns, rows)
+		width = max([ k.x + k.w for k in keys ])
+		height = rows * (KEY_SIZE + GAP)
+		points = [ (rnd.uniform(0, width), rnd.uniform(0, height))
+			for i in range(args.lookups) ]
+		start = time.perf_counter()
+		index = GridIndex(keys)
+		build = (time.perf_counter() - start) * 1000.0
+		print("%5i keys  linear: %7.2fus  index: %5.2fus  (built in %.2fms)" % (
+			len(keys),
+			measure(lambda x, y: linear(keys, x, y), points),
+			measure(index.find, points),
+			build))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Launcher search benchmark
+
+Measures time needed to update OSD launcher results after every typed key,
+for generated lists of applications of growing size. Compares scanning
+whole list, as done before, with AppIndex search. Also reported is time
+needed to load saved index.
+"""
+from scc.appindex import AppIndex
+import os, sys, time, random, tempfile, argparse
+
+BUTTONS = [ "1", "2ABC", "3DEF", "4GHI", "5JKL", "6MNO", "7PQRS", "8TUV", "9WXYZ", "0" ]
+CHAR_MAP = { c : b[0] for b in BUTTONS for c in b }
+SYLLABLES = ("ka to ri me su ne lo wa xi pe gu ba do fi ho ju ly mo "
+	"ny qu ra se ti vo ze tra ster pho cli").split(" ")
+
+
+def make_apps(count):
+	""" Generates application names made of 1 to 3 words of random syllables """
+	rnd = random.Random(count)
+	def word():
+		return "".join([ rnd.choice(SYLLABLES) for x in range(rnd.randint(2, 4)) ])
+	return [ ("app%i.desktop" % (i,),
+		" ".join([ word().capitalize() for x in range(rnd.randint(1, 3)) ]))
+		for i in range(count) ]
+
+
+def linear(db, query, max_rows):
+	results = []
+	for keys, app in db:
+		if query in keys:
+			results.append(app)
+			if len(results) > max_rows: break
+	return results
+
+
+def measure(fn, queries):
+	start = time.perf_counter()
+	for query in queries:
+		fn(query)
+	return (time.perf_counter() - start) / len(queries) * 1000000.0
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-q', '--queries', type=int, default=2000,
+		help="number of typed strings searched on every list")
+	args = parser.parse_args()
+	
+	os.environ["XDG_DATA_HOME"] = tempfile.mkdtemp()
+	os.environ["XDG_DATA_DIRS"] = os.environ["XDG_DATA_HOME"]
+	rnd = random.Random(0)
+	for count in (100, 1000, 10000):
+		apps = make_apps(count)
+		filename = os.path.join(tempfile.mkdtemp(), "launcher.json")
+		index = AppIndex(CHAR_MAP, filename)
+		index.rebuild(apps)
+		db = [ (a.keys, a) for a in index.apps ]
+		# Every query is typed key by key, as user would do it
+		queries = []
+		while len(queries) < args.queries:
+			keys = rnd.choice(index.apps).keys
+			start = rnd.randint(0, max(0, len(keys) - 6))
+			queries += [ keys[start:start+i] for i in range(1, 7) ]
+		
+		start = time.perf_counter()
+		AppIndex(CHAR_MAP, filename).load()
+		load = (time.perf_counter() - start) * 1000.0
+		print("%6i apps  linear: %8.1fus  index: %6.1fus  (loaded in %.1fms)" % (
+			count,
+			measure(lambda q: linear(db, q, 5), queries),
+			measure(lambda q: index.search(q)[0:5], queries),
+			load))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
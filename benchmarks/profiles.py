@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Profile benchmark
+
+Loads every profile from default_profiles/ and profile_examples/ (or
+profiles specified on command line) and drives it with set of synthetic
+workloads: stick circles, pad swipes, gyro noise, button mashing and
+trigger ramps.
+
+For every profile reports time needed to load and compress it and, for
+every workload, time spent per frame, number of syscalls per frame,
+number of memory blocks left allocated per frame and peak memory
+allocated while processing workload.
+
+Virtual devices are real UInput instances, but write to /dev/null instead
+of uinput, so syscalls are counted same way as in daemon.
+
+Use --json to get machine-readable results and --baseline to compare
+them with previously saved ones. With --baseline, exit code is 1 if any
+per-frame time got slower by more than --threshold.
+"""
+from scc.constants import SCButtons, STICK_PAD_MIN, STICK_PAD_MAX
+from scc.drivers.fake import FakeController
+from scc.parser import TalkingActionParser
+from scc.scheduler import Scheduler
+from scc.profile import Profile
+from scc.mapper import Mapper
+from collections import namedtuple
+from math import sin, cos, pi as PI
+import os, sys, time, json, random, argparse, logging, tracemalloc
+import scc.uinput
+
+Input = namedtuple('Input',
+	'buttons ltrig rtrig stick_x stick_y lpad_x lpad_y rpad_x rpad_y '
+	'cpad_x cpad_y accel_x accel_y accel_z gpitch groll gyaw q1 q2 q3 q4'
+)
+ZERO = Input(*[0] * len(Input._fields))
+PROFILE_DIRS = ( "default_profiles", "profile_examples" )
+MASHED = [ x for x in SCButtons if x not in (SCButtons.LPADTOUCH,
+	SCButtons.RPADTOUCH, SCButtons.LPAD, SCButtons.RPAD, SCButtons.STICKPRESS) ]
+
+
+class NullLib(object):
+	""" Replaces libuinput, so UInput writes to /dev/null """
+	
+	def uinput_module_version(self):
+		return scc.uinput.UNPUT_MODULE_VERSION
+	
+	def uinput_init(self, *a):
+		return os.open("/dev/null", os.O_WRONLY)
+	
+	def uinput_set_delay_period(self, *a):
+		pass
+	
+	def uinput_destroy(self, fd):
+		os.close(fd)
+
+
+class NullSAHandler(object):
+	""" Special actions handler that does nothing """
+	
+	def __getattr__(self, name):
+		if name.startswith("on_sa_"):
+			return lambda *a: None
+		raise AttributeError(name)
+
+
+class BenchController(FakeController):
+	def get_gyro_enabled(self):
+		return True
+
+
+class ErrorCounter(logging.Handler):
+	""" Counts errors logged by Mapper """
+	
+	def __init__(self):
+		logging.Handler.__init__(self, logging.ERROR)
+		self.count = 0
+	
+	def emit(self, record):
+		self.count += 1
+
+
+# Workloads. Every one is generator yielding states
+def stick_circles(frames):
+	for i in range(frames):
+		a = 2 * PI * i / 100.0
+		yield ZERO._replace(
+			lpad_x = int(STICK_PAD_MAX * cos(a)),
+			lpad_y = int(STICK_PAD_MAX * sin(a)))
+
+
+def pad_swipes(frames):
+	for i in range(frames):
+		phase = i % 60
+		if phase >= 50:
+			# Finger lifted
+			yield ZERO
+			continue
+		x = STICK_PAD_MIN + (STICK_PAD_MAX - STICK_PAD_MIN) * phase // 50
+		yield ZERO._replace(
+			buttons = SCButtons.LPADTOUCH | SCButtons.RPADTOUCH,
+			lpad_x = x, lpad_y = x // 2,
+			rpad_x = -x, rpad_y = x // 3)
+
+
+def gyro_noise(frames):
+	rnd = random.Random(0)
+	for i in range(frames):
+		yield ZERO._replace(
+			gpitch = rnd.randint(-50, 50),
+			groll = rnd.randint(-50, 50),
+			gyaw = rnd.randint(-50, 50),
+			q1 = rnd.randint(-32768, 32767),
+			q2 = rnd.randint(-32768, 32767),
+			q3 = rnd.randint(-32768, 32767),
+			q4 = rnd.randint(-32768, 32767))
+
+
+def button_mashing(frames):
+	rnd = random.Random(0)
+	buttons = 0
+	for i in range(frames):
+		buttons ^= rnd.choice(MASHED)
+		yield ZERO._replace(buttons = buttons)
+
+
+def trigger_ramps(frames):
+	for i in range(frames):
+		value = abs(255 - (i * 5) % 510)
+		yield ZERO._replace(ltrig = value, rtrig = 255 - value)
+
+
+WORKLOADS = ( stick_circles, pad_swipes, gyro_noise,
+	button_mashing, trigger_ramps )
+
+
+def load_profile(filename):
+	profile = Profile(TalkingActionParser()).load(filename)
+	profile.compress()
+	return profile
+
+
+def create_mapper(profile):
+	mapper = Mapper(profile, Scheduler(), keyboard=b"Keyboard",
+		mouse=b"Mouse", gamepad=False, poller=None)
+	mapper.gamepad = scc.uinput.Gamepad(b"Gamepad")
+	mapper.gamepad.set_batching(True)
+	mapper._batched.append(mapper.gamepad)
+	mapper.set_special_actions_handler(NullSAHandler())
+	mapper.set_controller(BenchController(0))
+	return mapper
+
+
+def run_workload(filename, workload, frames):
+	"""
+	Runs workload with new mapper. Returns (time, syscalls, blocks).
+	"""
+	states = list(workload(frames))
+	mapper = create_mapper(load_profile(filename))
+	controller, old_state = mapper.controller, ZERO
+	writes = [ 0 ]
+	_write = os.write
+	def counting_write(fd, data):
+		writes[0] += 1
+		return _write(fd, data)
+	
+	os.write = counting_write
+	try:
+		blocks = sys.getallocatedblocks()
+		start = time.perf_counter()
+		for state in states:
+			mapper.input(controller, old_state, state)
+			old_state = state
+		t = time.perf_counter() - start
+		blocks = sys.getallocatedblocks() - blocks
+	finally:
+		os.write = _write
+	return t, writes[0], blocks
+
+
+def measure_peak(filename, workload, frames):
+	""" Returns peak memory allocated while processing workload """
+	states = list(workload(frames))
+	mapper = create_mapper(load_profile(filename))
+	controller, old_state = mapper.controller, ZERO
+	tracemalloc.start()
+	try:
+		base, peak = tracemalloc.get_traced_memory()
+		for state in states:
+			mapper.input(controller, old_state, state)
+			old_state = state
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return peak - base
+
+
+def benchmark(filename, frames, repeat):
+	errors = ErrorCounter()
+	logging.getLogger().addHandler(errors)
+	try:
+		start = time.perf_counter()
+		for i in range(repeat):
+			load_profile(filename)
+		load_time = (time.perf_counter() - start) / repeat
+		
+		result = {
+			"profile": os.path.split(filename)[-1],
+			"load_ms": load_time * 1000.0,
+			"workloads": {},
+		}
+		for workload in WORKLOADS:
+			t, syscalls, blocks = min([ run_workload(filename, workload, frames)
+				for i in range(repeat) ])
+			result["workloads"][workload.__name__] = {
+				"frame_us": t * 1000000.0 / frames,
+				"syscalls_per_frame": float(syscalls) / frames,
+				"blocks_per_frame": float(blocks) / frames,
+				"peak_kb": measure_peak(filename, workload, frames) / 1024.0,
+			}
+		result["errors"] = errors.count
+	finally:
+		logging.getLogger().removeHandler(errors)
+	return result
+
+
+def print_result(result):
+	print("%s (load %.2fms, %i errors)" % (result["profile"],
+		result["load_ms"], result["errors"]))
+	for name, w in sorted(result["workloads"].items()):
+		print("  %-15s %7.2fus/frame  %5.2f syscalls/frame  %6.2f blocks/frame  peak %7.1fkB" % (
+			name, w["frame_us"], w["syscalls_per_frame"],
+			w["blocks_per_frame"], w["peak_kb"]))
+
+
+def compare(results, baseline, threshold):
+	""" Prints and returns number of regressions against baseline """
+	baseline = { x["profile"] : x for x in baseline }
+	regressions = 0
+	for result in results:
+		if result["profile"] not in baseline:
+			continue
+		for name, w in result["workloads"].items():
+			old = baseline[result["profile"]]["workloads"].get(name)
+			if old and w["frame_us"] > old["frame_us"] * threshold:
+				print("REGRESSION: %s %s: %.2fus -> %.2fus" % (result["profile"],
+					name, old["frame_us"], w["frame_us"]), file=sys.stderr)
+				regressions += 1
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-f', '--frames', type=int, default=2000,
+		help="number of frames in every workload")
+	parser.add_argument('-r', '--repeat', type=int, default=3,
+		help="number of repeats; best time is reported")
+	parser.add_argument('-j', '--json', action='store_true',
+		help="print results as json")
+	parser.add_argument('-b', '--baseline', help="json file with results "
+		"of previous run to compare with")
+	parser.add_argument('-t', '--threshold', type=float, default=1.25,
+		help="slowdown (ratio) reported as regression")
+	parser.add_argument('profiles', nargs='*', help="profile files to use; "
+		"all from default_profiles and profile_examples are used if not specified")
+	args = parser.parse_args()
+	
+	logging.getLogger().setLevel(logging.ERROR)
+	logging.getLogger().addHandler(logging.NullHandler())
+	scc.uinput.find_library = lambda name : NullLib()
+	profiles = args.profiles or [ os.path.join(d, x)
+		for d in PROFILE_DIRS for x in sorted(os.listdir(d))
+		if x.endswith(".sccprofile") and not x.startswith(".") ]
+	
+	results = []
+	for filename in profiles:
+		results.append(benchmark(filename, args.frames, args.repeat))
+		if not args.json:
+			print_result(results[-1])
+	if args.json:
+		json.dump(results, sys.stdout, indent=2, sort_keys=True)
+		print("")
+	if args.baseline:
+		with open(args.baseline, "r") as f:
+			if compare(results, json.load(f), args.threshold):
+				return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Replay benchmark
+
+Replays inputs recorded by daemon (see scc.recorder) through Mapper with
+specified profile loaded, as fast as possible, and reports time spent
+per input. All virtual devices are replaced by dummies, so results depend
+only on profile and recorded inputs.
+
+To record inputs, start daemon with SCC_RECORD environment variable set
+to prefix of recording file name, for example
+`$ SCC_RECORD=/tmp/ scc-daemon debug`
+"""
+from scc.drivers.replay import ReplayController
+from scc.parser import TalkingActionParser
+from scc.scheduler import Scheduler
+from scc.profile import Profile
+from scc.mapper import Mapper
+from scc.uinput import Dummy
+import sys, time, argparse, logging
+
+
+class NullDevice(Dummy):
+	def clearRemainders(self):
+		pass
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('recording', help="file with recorded inputs")
+	parser.add_argument('profile', help="profile file to use")
+	parser.add_argument('-r', '--repeat', type=int, default=5,
+		help="number of times recording is replayed")
+	args = parser.parse_args()
+	
+	logging.disable(logging.WARNING)
+	profile = Profile(TalkingActionParser()).load(args.profile)
+	profile.compress()
+	c = ReplayController(args.recording)
+	for i in range(args.repeat):
+		mapper = Mapper(profile, Scheduler(), keyboard=False, mouse=False,
+			gamepad=False, poller=None)
+		mapper.keyboard, mapper.mouse, mapper.gamepad = (
+			NullDevice(), NullDevice(), NullDevice())
+		mapper.set_controller(c)
+		c.set_mapper(mapper)
+		start = time.perf_counter()
+		c.replay()
+		t = time.perf_counter() - start
+		print("run %i  inputs: %6i  per input: %6.2fus" % (
+			i + 1, len(c.frames), t * 1000000.0 / max(1, len(c.frames))))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Scheduler benchmark
+
+Runs 10k schedule / cancel cycles, as done by BallModifier,
+DoubleclickModifier & co., with some other tasks (as created by other
+controllers) waiting in the scheduler. Compares current Scheduler with
+one based on PriorityQueue, which drained and refilled whole queue to
+cancel single task.
+"""
+from scc.scheduler import Scheduler
+import sys, time, queue, argparse
+
+
+class LegacyScheduler(object):
+	""" Scheduler as it was before heap-based rewrite """
+	
+	def __init__(self):
+		self._scheduled = queue.PriorityQueue()
+		self._next = None
+		self._now = time.time()
+	
+	def schedule(self, delay, callback, *data):
+		task = LegacyTask(self._now + delay, callback, data)
+		if self._next is None or task.time < self._next.time:
+			if self._next:
+				self._scheduled.put(self._next)
+			self._next = task
+		else:
+			self._scheduled.put(task)
+		return task
+	
+	def cancel_task(self, task):
+		if task == self._next:
+			self._next = None if self._scheduled.empty() else self._scheduled.get()
+			return True
+		tasks, found = [], False
+		while not self._scheduled.empty():
+			t = self._scheduled.get()
+			if t == task:
+				found = True
+				break
+			tasks.append(t)
+		for t in tasks:
+			self._scheduled.put(t)
+		return found
+	
+	def run(self):
+		self._now = time.time()
+		while self._next and self._now >= self._next.time:
+			callback, data = self._next.callback, self._next.data
+			self._next = None if self._scheduled.empty() else self._scheduled.get()
+			callback(*data)
+
+
+class LegacyTask(object):
+	
+	def __init__(self, time, callback, data):
+		self.time = time
+		self.callback = callback
+		self.data = data
+	
+	def __lt__(self, other):
+		return self.time < other.time
+
+
+def measure(cls, cycles, pending):
+	s = cls()
+	nothing = lambda *a: None
+	for i in range(pending):
+		s.schedule(60.0 + i * 0.001, nothing)
+	
+	start = time.perf_counter()
+	for i in range(cycles):
+		task = s.schedule(0.02 + (i % 7) * 0.001, nothing)
+		s.cancel_task(task)
+		if i % 100 == 0:
+			s.run()
+	return time.perf_counter() - start
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-c', '--cycles', type=int, default=10000,
+		help="number of schedule / cancel cycles")
+	args = parser.parse_args()
+	
+	for pending in (0, 10, 100):
+		for name, cls in (("legacy", LegacyScheduler), ("heap", Scheduler)):
+			t = measure(cls, args.cycles, pending)
+			print("%-7s pending: %3i  total: %8.2fms  per cycle: %7.2fus" % (
+				name, pending, t * 1000.0, t * 1000000.0 / args.cycles))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
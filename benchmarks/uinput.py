@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - uinput benchmark
+
+Generates typical busy frame (gyro on 3 axes, two sticks, buttons) and
+compares writing every event with separate syscall, as it was done before,
+with batched writing, where all events from frame are written to device
+with single write.
+
+Events are written to /dev/null, so uinput doesn't have to be available.
+"""
+from scc.uinput import UInput, INPUT_EVENT, EV_KEY, EV_ABS, EV_SYN, SYN_REPORT
+from scc.uinput import Axes, Keys
+import os, sys, time, argparse
+import scc.uinput
+
+AXES = ( Axes.ABS_X, Axes.ABS_Y, Axes.ABS_RX, Axes.ABS_RY,
+	Axes.ABS_Z, Axes.ABS_RZ, Axes.ABS_HAT0X )
+BUTTONS = ( Keys.BTN_A, Keys.BTN_B )
+
+
+class NullDevice(UInput):
+	""" UInput that writes to /dev/null instead of creating device """
+	
+	def __init__(self, batching):
+		self._lib = None
+		self._k, self._a, self._r = BUTTONS, AXES, ()
+		self._buffer = bytearray(INPUT_EVENT.size * scc.uinput.EVENT_BUFFER_SIZE)
+		self._view = memoryview(self._buffer)
+		self._offset = 0
+		self._synced = True
+		self._fd = os.open("/dev/null", os.O_WRONLY)
+		self.set_batching(batching)
+
+
+class LegacyNullDevice(object):
+	""" Writes every event with separate syscall, as libuinput did """
+	
+	def __init__(self):
+		self._fd = os.open("/dev/null", os.O_WRONLY)
+	
+	def keyEvent(self, key, val):
+		os.write(self._fd, INPUT_EVENT.pack(0, 0, EV_KEY, key, val))
+	
+	def axisEvent(self, axis, val):
+		os.write(self._fd, INPUT_EVENT.pack(0, 0, EV_ABS, axis, val))
+	
+	def synEvent(self):
+		os.write(self._fd, INPUT_EVENT.pack(0, 0, EV_SYN, SYN_REPORT, 0))
+	
+	def flush(self):
+		pass
+
+
+def frame(dev, i):
+	for a in AXES:
+		dev.axisEvent(a, (i * 37 + a) % 32767)
+	for b in BUTTONS:
+		dev.keyEvent(b, i & 1)
+	dev.synEvent()
+	dev.flush()
+
+
+def measure(name, dev, frames):
+	writes = [ 0 ]
+	_write = os.write
+	def counting_write(fd, data):
+		writes[0] += 1
+		return _write(fd, data)
+	
+	os.write = counting_write
+	try:
+		start = time.perf_counter()
+		for i in range(frames):
+			frame(dev, i)
+		t = time.perf_counter() - start
+	finally:
+		os.write = _write
+	print("%-8s frames: %6i  syscalls/frame: %5.1f  per frame: %6.2fus" % (
+		name, frames, float(writes[0]) / frames, t * 1000000.0 / frames))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+	parser.add_argument('-f', '--frames', type=int, default=100000,
+		help="number of generated frames")
+	args = parser.parse_args()
+	
+	measure("legacy", LegacyNullDevice(), args.frames)
+	measure("synced", NullDevice(False), args.frames)
+	measure("batched", NullDevice(True), args.frames)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Application Index
+
+Searchable list of installed applications, used by OSD launcher.
+
+Every application name is converted to string of keys that has to be pressed
+on phone-like keyboard to type it. Every substring of those up to NGRAM keys
+long is indexed, so search for short string is single dict lookup and longer
+one has to check only applications containing its least common n-gram, or
+results of previous search, if user is still typing same string.
+
+List is stored in cache directory and used until any directory with .desktop
+files is changed. Launched applications are remembered and sorted
+before others.
+"""
+from __future__ import unicode_literals
+
+from scc.paths import get_cache_path
+
+import os, json, logging
+log = logging.getLogger("AppIndex")
+
+
+def get_application_dirs():
+	"""
+	Returns list of directories where .desktop files are searched for,
+	as defined by XDG Base Directory specification.
+	"""
+	data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+	data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+	return [ os.path.join(x, "applications")
+		for x in [ data_home ] + data_dirs.split(":") if x ]
+
+
+class App(object):
+	""" Indexed application """
+	__slots__ = ("id", "name", "keys")
+	
+	def __init__(self, id, name, keys):
+		self.id, self.name, self.keys = id, name, keys
+	
+	def __repr__(self):
+		return "<App %s>" % (self.id,)
+
+
+class AppIndex(object):
+	"""
+	'char_map' maps (uppercase) characters to keys they are typed with.
+	Characters that are not in it are skipped.
+	"""
+	VERSION = 1
+	NGRAM = 3
+	RECENT_MAX = 20
+	
+	def __init__(self, char_map, filename=None):
+		self.char_map = char_map
+		self.filename = filename or os.path.join(get_cache_path(), "launcher.json")
+		self.apps = []
+		self.recent = []		# IDs of launched applications, most recent first
+		self._dirs = {}			# Directory -> mtime when apps were listed
+		self._ngrams = {}
+		self._results = []		# Stack of (query, results) for incremental search
+	
+	
+	def name_to_keys(self, name):
+		return "".join([ self.char_map[c] for c in name.upper() if c in self.char_map ])
+	
+	
+	@staticmethod
+	def _get_dirs():
+		"""
+		Returns mtime of every application directory and its subdirectories.
+		Missing directories are included with None, so they are
+		noticed when created.
+		"""
+		dirs = {}
+		for path in get_application_dirs():
+			if not os.path.isdir(path):
+				dirs[path] = None
+				continue
+			for root, subdirs, files in os.walk(path):
+				try:
+					dirs[root] = os.stat(root).st_mtime_ns
+				except OSError:
+					dirs[root] = None
+		return dirs
+	
+	
+	def _get_charset(self):
+		""" Returns string describing char_map, so cache made with other is not used """
+		return "".join([ "%s%s" % x for x in sorted(self.char_map.items()) ])
+	
+	
+	def load(self):
+		"""
+		Loads list of applications from file.
+		Returns False if file doesn't exist or is outdated, in which case
+		rebuild() has to be called. Recently launched applications
+		are loaded in any case.
+		"""
+		try:
+			with open(self.filename, "r") as f:
+				data = json.loads(f.read())
+			self.recent = data.get("recent", [])
+			if data.get("version") != self.VERSION:
+				return False
+			if data.get("charset") != self._get_charset():
+				return False
+			dirs = self._get_dirs()
+			if data.get("dirs") != dirs:
+				return False
+			self._dirs = dirs
+			self._set_apps([ App(*x) for x in data["apps"] ])
+		except Exception as e:
+			if os.path.exists(self.filename):
+				log.warning("Failed to load application list: %s", e)
+			return False
+		return True
+	
+	
+	def rebuild(self, apps):
+		"""
+		Replaces list of applications and saves it.
+		'apps' is iterable of (id, display_name) tuples.
+		"""
+		self._dirs = self._get_dirs()
+		self._set_apps([ App(id, name, self.name_to_keys(name)) for (id, name) in apps ])
+		try:
+			self.save()
+		except OSError as e:
+			log.warning("Failed to save application list: %s", e)
+	
+	
+	def save(self):
+		if not os.path.exists(os.path.dirname(self.filename)):
+			os.makedirs(os.path.dirname(self.filename))
+		data = {
+			"version": self.VERSION,
+			"charset": self._get_charset(),
+			"dirs": self._dirs or self._get_dirs(),
+			"recent": self.recent,
+			"apps": [ (a.id, a.name, a.keys) for a in self.apps ],
+		}
+		tmp = self.filename + ".tmp"
+		with open(tmp, "w") as f:
+			f.write(json.dumps(data))
+		os.rename(tmp, self.filename)
+	
+	
+	def launched(self, app_id):
+		""" Moves application to top of results and saves index """
+		self.recent = [ app_id ] + [ x for x in self.recent if x != app_id ]
+		self.recent = self.recent[0:self.RECENT_MAX]
+		self._set_apps(self.apps)
+		try:
+			self.save()
+		except OSError as e:
+			log.warning("Failed to save application list: %s", e)
+	
+	
+	def _set_apps(self, apps):
+		""" Sorts applications and indexes all short substrings of their keys """
+		rank = { app_id : i for (i, app_id) in enumerate(self.recent) }
+		self.apps = sorted(apps, key=lambda a: rank.get(a.id, len(rank)))
+		self._ngrams = {}
+		self._results = []
+		for app in self.apps:
+			for length in range(1, self.NGRAM + 1):
+				for start in range(0, len(app.keys) - length + 1):
+					lst = self._ngrams.setdefault(app.keys[start:start+length], [])
+					if not lst or lst[-1] is not app:
+						lst.append(app)
+	
+	
+	def search(self, query):
+		"""
+		Returns list of applications with names typed by keys in 'query',
+		recently launched first. Returned list must not be modified.
+		"""
+		if not query:
+			self._results = []
+			return []
+		while self._results and not query.startswith(self._results[-1][0]):
+			self._results.pop()
+		if self._results and self._results[-1][0] == query:
+			return self._results[-1][1]
+		if len(query) <= self.NGRAM:
+			results = self._ngrams.get(query, [])
+		else:
+			# Every application containing query is in list of every
+			# n-gram in it, so shortest of those is searched
+			candidates = min([ self._ngrams.get(query[i:i+self.NGRAM], [])
+				for i in range(0, len(query) - self.NGRAM + 1) ], key=len)
+			if self._results and len(self._results[-1][1]) < len(candidates):
+				candidates = self._results[-1][1]
+			results = [ a for a in candidates if query in a.keys ]
+		self._results.append(( query, results ))
+		return results
+	
+	
+	def match(self, app, query):
+		"""
+		Returns (start, end) range of characters in application name
+		that are typed by 'query', or (0, 0) if there is none.
+		"""
+		positions = []
+		for i, c in enumerate(app.name):
+			for u in c.upper():
+				if u in self.char_map:
+					positions.append(i)
+		index = app.keys.find(query) if query else -1
+		if index < 0:
+			return 0, 0
+		return positions[index], positions[index + len(query) - 1] + 1
@@ -0,0 +1,65 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Binary events
+
+Compact alternative to 'Event: ...' messages sent by daemon to clients that
+observe or lock inputs. Client enables it by sending 'Event format: binary'
+message to daemon, text messages are used by default.
+
+Events are then sent in frames mixed with text messages. Frame starts with
+zero byte, which never starts text message, and carries all events for one
+controller that were waiting to be sent:
+	
+	HEADER		- zero byte, length of controller ID, number of records
+	ID			- controller ID, utf-8 encoded
+	RECORD * n	- source, number of values (1 or 2) and two values
+
+Sources are numbered by their position in SOURCES.
+"""
+from scc.constants import SCButtons, STICK, LEFT, RIGHT, CPAD
+import struct
+
+MARKER = 0
+HEADER = struct.Struct("<BBH")
+RECORD = struct.Struct("<BBxxii")
+
+SOURCES = tuple([ x.name for x in SCButtons ]) + ( STICK, LEFT, RIGHT, CPAD )
+SOURCE_IDS = { x : i for (i, x) in enumerate(SOURCES) }
+
+
+def pack(controller_id, events):
+	"""
+	Returns frame with events for one controller.
+	'events' is list of (source name, values) tuples. All sources
+	have to be in SOURCES.
+	"""
+	controller_id = controller_id.encode("utf-8")
+	data = [ HEADER.pack(MARKER, len(controller_id), len(events)), controller_id ]
+	for what, values in events:
+		if len(values) == 1:
+			data.append(RECORD.pack(SOURCE_IDS[what], 1, int(values[0]), 0))
+		else:
+			data.append(RECORD.pack(SOURCE_IDS[what], 2,
+				int(values[0]), int(values[1])))
+	return b"".join(data)
+
+
+def unpack(data):
+	"""
+	Parses frame at start of 'data'.
+	Returns (controller_id, events, size), where events is list of
+	(source name, values) and size is length of frame in bytes, or None
+	if data doesn't contain whole frame yet.
+	"""
+	if len(data) < HEADER.size:
+		return None
+	marker, id_length, count = HEADER.unpack_from(data)
+	start = HEADER.size + id_length
+	size = start + count * RECORD.size
+	if len(data) < size:
+		return None
+	controller_id = bytes(data[HEADER.size:start]).decode("utf-8")
+	events = []
+	for source, length, v1, v2 in RECORD.iter_unpack(data[start:size]):
+		events.append(( SOURCES[source], [ v1, v2 ][0:length] ))
+	return controller_id, events, size
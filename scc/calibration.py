@@ -0,0 +1,106 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Calibration
+
+Input calibration shared by all drivers. Everything that needs any
+non-trivial math is computed once, when controller config is applied,
+so drivers only do few multiplications and comparisons per input.
+
+AxisCalibrationData, created by parse_axis, describes how raw value of
+evdev or HID axis is converted to range used by SC-Controller. Evdev
+driver applies it in Python, HID driver passes it to its C decoder.
+
+PadRotation rotates pad coordinates by angle set in controller config.
+"""
+from scc.constants import STICK_PAD_MIN, STICK_PAD_MAX, TRIGGER_MIN, TRIGGER_MAX
+from collections import namedtuple
+from math import pi as PI, sin, cos
+
+TRIGGERS = "ltrig", "rtrig"
+
+AxisCalibrationData = namedtuple('AxisCalibrationData',
+	'scale offset center clamp_min clamp_max deadzone'
+)
+
+
+def parse_axis(axis):
+	"""
+	Creates AxisCalibrationData from axis config, as stored in
+	evdev or HID device config file.
+	"""
+	min       = axis.get("min", -127)
+	max       = axis.get("max",  128)
+	center    = axis.get("center", 0)
+	clamp_min = STICK_PAD_MIN
+	clamp_max = STICK_PAD_MAX
+	deadzone  = axis.get("deadzone", 0)
+	offset = 0
+	if (max >= 0 and min >= 0):
+		offset = 1
+	if max > min:
+		scale = (-2.0 / (min-max)) if min != max else 1.0
+		deadzone = abs(float(deadzone) * scale)
+		offset *= -1.0
+	else:
+		scale = (-2.0 / (min-max)) if min != max else 1.0
+		deadzone = abs(float(deadzone) * scale)
+	if axis in TRIGGERS:
+		clamp_min = TRIGGER_MIN
+		clamp_max = TRIGGER_MAX
+		offset += 1.0
+		scale *= 0.5
+	
+	return AxisCalibrationData(scale, offset, center, clamp_min, clamp_max, deadzone)
+
+
+class PadRotation(object):
+	"""
+	Rotates pad coordinates by angles set as 'input_rotation_l' and
+	'input_rotation_r' in controller config. sin and cos are computed
+	only once, when PadRotation is created.
+	"""
+	__slots__ = ('left', 'right')
+	
+	def __init__(self, angle_l=0.0, angle_r=0.0):
+		""" Angles are in degrees, as stored in controller config """
+		self.left = PadRotation._matrix(angle_l)		# (sin, cos) or None
+		self.right = PadRotation._matrix(angle_r)
+	
+	
+	@staticmethod
+	def _matrix(angle):
+		if not angle:
+			return None
+		r = float(angle) * PI / -180.0
+		return sin(r), cos(r)
+	
+	
+	@staticmethod
+	def from_config(config):
+		"""
+		Creates PadRotation from controller config.
+		Returns None if neither pad is rotated.
+		"""
+		rotation = PadRotation(config['input_rotation_l'], config['input_rotation_r'])
+		if rotation.left or rotation.right:
+			return rotation
+		return None
+	
+	
+	def apply(self, state, left, right):
+		"""
+		Rotates pads of mutable 'state' in place. Pad is rotated only if
+		respective 'left' or 'right' argument is true, which drivers use
+		to skip pads that are not touched.
+		"""
+		if left and self.left:
+			s, c = self.left
+			x, y = state.lpad_x, state.lpad_y
+			# Adjust for rotation and clamp
+			state.lpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s)))
+			state.lpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c)))
+		if right and self.right:
+			s, c = self.right
+			x, y = state.rpad_x, state.rpad_y
+			state.rpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s)))
+			state.rpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c)))
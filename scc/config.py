@@ -3,17 +3,32 @@
 SC-Controller - Config
 
 Handles loading, storing and querying config file
+
+Every Config instance loads its own copy of configuration and can be
+modified and saved. Code that only reads configuration, often, should use
+Config.shared() instead, which returns read-only instance shared by whole
+process and reloads it only when file is changed.
 """
 from __future__ import unicode_literals
 
 from scc.paths import get_config_path
 from scc.profile import Encoder
 from scc.special_actions import ChangeProfileAction
+from types import MappingProxyType
 
 import os, json, logging
 log = logging.getLogger("Config")
 
 
+def _freeze(value):
+	""" Returns read-only copy of value loaded from config file """
+	if isinstance(value, dict):
+		return MappingProxyType({ k : _freeze(value[k]) for k in value })
+	if isinstance(value, list):
+		return tuple([ _freeze(x) for x in value ])
+	return value
+
+
 class Config(object):
 	DEFAULTS = {
 		"autoswitch_osd":	True,	# True to show OSD message when profile is autoswitched
@@ -33,6 +48,7 @@ class Config(object):
 			"sc_by_cable": True,
 			"sc_by_bt": True,
 			"fake": False,			# Used for developement
+			"replay": False,		# Used for developement
 			"hiddrv": True,
 			"evdevdrv": True,
 			"ds4drv": True,			# At least one of hiddrv or evdevdrv has to be enabled as well
@@ -76,7 +92,18 @@ class Config(object):
 		# ~/.config/scc can ask daemon to send notifications about all
 		# (or only some) inputs.
 		# This enables GUI to display which physical button was pressed to user.
+		# Also makes daemon to publish state of every controller into file
+		# readable by other programs. See scc.statering.
 		"enable_sniffing" : False,
+		# latency_tracing - If set to positive number, daemon measures time
+		# spent processing every input and writes summary to log every
+		# 'latency_tracing' seconds. Measured data are also available
+		# using 'Stats.' message.
+		"latency_tracing" : 0,
+		# usb_input_transfers - Number of transfers kept waiting for input
+		# from every USB endpoint. More of them allows daemon to stall for
+		# longer without losing packets. See 'Input:' stats message.
+		"usb_input_transfers" : 4,
 		# Style and colors used by OSD
 		"osd_style": "Classic.gtkstyle.css",
 		"osd_colors": {
@@ -120,17 +147,53 @@ class Config(object):
 		"osd_alignment":		0,		# not used yet
 		"input_rotation_l":		20,		# range -180 to 180
 		"input_rotation_r":		-20,	# range -180 to 180
+		"input_coalescing":		False,	# see Controller.set_input_coalescing
 		"menu_control":			"STICK",
 		"menu_confirm":			"A",
 		"menu_cancel":			"B",
 	}
+	# Instance returned by Config.shared()
+	_shared = None
 	
 	
-	def __init__(self):
+	def __init__(self, read_only=False):
 		self.filename = os.path.join(get_config_path(), "config.json")
+		self.read_only = read_only
+		self._stat = None
 		self.reload()
 	
 	
+	@staticmethod
+	def shared():
+		"""
+		Returns process-wide Config instance. It's reloaded only when
+		config file was changed since it was loaded, so this costs only
+		single stat() call.
+		
+		Returned instance is shared by everyone and its values are
+		read-only; Attempt to change any raises TypeError.
+		"""
+		if Config._shared is None:
+			Config._shared = Config(read_only=True)
+		elif Config._shared.is_changed():
+			log.debug("Configuration file changed, reloading")
+			Config._shared.reload()
+		return Config._shared
+	
+	
+	def _get_stat(self):
+		try:
+			st = os.stat(self.filename)
+		except OSError:
+			return None
+		return st.st_mtime_ns, st.st_size, st.st_ino
+	
+	
+	def is_changed(self):
+		""" Returns True if file was changed since it was loaded or saved """
+		return self._get_stat() != self._stat
+	
+	
 	def reload(self):
 		""" (Re)loads configuration. Works as load(), but handles exceptions """
 		try:
@@ -141,6 +204,8 @@ class Config(object):
 			self.create()
 		if self.check_values():
 			self.save()
+		if self.read_only:
+			self.values = _freeze(self.values)
 	
 	
 	def _check_dict(self, values, defaults):
@@ -182,10 +247,15 @@ class Config(object):
 		"""
 		Returns self['controllers'][controller_id], creating new node populated
 		with defaults if there is none.
+		
+		On read-only instance, copy of that node with defaults filled in
+		is returned instead and configuration is not changed.
 		"""
 		if controller_id in self.values['controllers']:
 			# Check values in existing config
 			rv = self.values['controllers'][controller_id]
+			if self.read_only:
+				rv = dict(rv)
 			for key in self.CONTROLLER_DEFAULTS:
 				if key not in rv:
 					if key in ("input_rotation_l", "input_rotation_r"):
@@ -195,15 +265,19 @@ class Config(object):
 						rv[key] = self.CONTROLLER_DEFAULTS[key]
 			return rv
 		# Create new config
-		rv = self.values['controllers'][controller_id] = {
+		rv = {
 			key : self.CONTROLLER_DEFAULTS[key] for key in self.CONTROLLER_DEFAULTS
 		}
 		rv["name"] = controller_id
+		if not self.read_only:
+			self.values['controllers'][controller_id] = rv
 		return rv
 	
 	
 	def load(self):
-		self.values = json.loads(open(self.filename, "r").read())
+		self._stat = self._get_stat()
+		with open(self.filename, "r") as f:
+			self.values = json.loads(f.read())
 	
 	
 	def create(self):
@@ -221,7 +295,9 @@ class Config(object):
 		# Save
 		data = { k:self.values[k] for k in self.values }
 		jstr = Encoder(sort_keys=True, indent=4).encode(data)
-		open(self.filename, "w").write(jstr)
+		with open(self.filename, "w") as f:
+			f.write(jstr)
+		self._stat = self._get_stat()
 		log.debug("Configuration saved")
 	
 	
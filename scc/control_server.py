@@ -0,0 +1,225 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Control Server
+
+Unix socket server used by daemon to talk with its clients. Accepting
+connections, reading messages and writing responses is all done on main
+thread, using same poller that daemon mainloop sleeps on, so message
+handlers run along with input processing and need no locking.
+
+Writes never block. Data that cannot be sent immediately is buffered and
+sent once socket becomes writable. Connection that is not read by other
+side is closed when more than MAX_BUFFERED bytes is waiting.
+"""
+import os, socket, logging
+log = logging.getLogger("ControlServer")
+
+MAX_BUFFERED = 1024 * 1024
+READ_SIZE = 65536
+BACKLOG = 64
+
+
+class ControlServer(object):
+	"""
+	Listens on unix socket. 'on_connect' is called as on_connect(connection)
+	for every accepted connection and is expected to set callbacks
+	on Connection instance.
+	"""
+	
+	def __init__(self, poller, socket_file, on_connect):
+		self.poller = poller
+		self.socket_file = socket_file
+		self.on_connect = on_connect
+		self.connections = set()
+		if os.path.exists(socket_file):
+			os.unlink(socket_file)
+		self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self._socket.setblocking(False)
+		self._socket.bind(socket_file)
+		self._socket.listen(BACKLOG)
+		self.poller.register(self._socket.fileno(), poller.POLLIN, self._on_accept)
+	
+	
+	def _on_accept(self, fd, event):
+		while True:
+			try:
+				sock, address = self._socket.accept()
+			except (BlockingIOError, InterruptedError):
+				return
+			except OSError as e:
+				log.error("Failed to accept connection: %s", e)
+				return
+			connection = Connection(self.poller, sock, self)
+			self.connections.add(connection)
+			self.on_connect(connection)
+	
+	
+	def close(self):
+		""" Closes all connections and removes socket """
+		for connection in list(self.connections):
+			connection.close()
+		self.poller.unregister(self._socket.fileno())
+		self._socket.close()
+		if os.path.exists(self.socket_file):
+			os.unlink(self.socket_file)
+
+
+class Connection(object):
+	"""
+	Accepted connection. Has to be used only from main thread.
+	
+	Callbacks, set by whoever accepted connection:
+	 - on_message(connection, line) - called for every received line,
+	   without trailing newline
+	 - on_writable(connection) - called once after wait_writable() is used
+	   and everything written so far was sent
+	 - on_close(connection) - called once when connection is closed,
+	   by either side
+	"""
+	
+	def __init__(self, poller, sock, server=None):
+		sock.setblocking(False)
+		self.poller = poller
+		self.server = server
+		self.socket = sock
+		self.fd = sock.fileno()
+		self.on_message = None
+		self.on_writable = None
+		self.on_close = None
+		self.closed = False
+		self._in = b""
+		self._out = bytearray()
+		self._paused = False
+		self._want_write = False
+		self._events = None
+		self._update_events()
+	
+	
+	def _update_events(self):
+		events = self.poller.POLLIN
+		if self._out or self._want_write:
+			events |= self.poller.POLLOUT
+		if events != self._events:
+			self._events = events
+			self.poller.register(self.fd, events, self._on_event)
+	
+	
+	def write(self, data):
+		"""
+		Sends data or buffers it to be sent later. Never blocks and never
+		fails; If connection is broken, it is closed on next poll.
+		"""
+		if self.closed:
+			return
+		if not self._out:
+			try:
+				sent = self.socket.send(data)
+			except (BlockingIOError, InterruptedError):
+				sent = 0
+			except OSError:
+				self.shutdown()
+				return
+			if sent == len(data):
+				return
+			data = data[sent:]
+		self._out += data
+		if len(self._out) > MAX_BUFFERED:
+			log.warning("Connection %s is not reading, disconnecting", self.fd)
+			self._out = bytearray()
+			self.shutdown()
+		self._update_events()
+	
+	
+	def wait_writable(self):
+		""" Requests on_writable to be called when socket can take more data """
+		if not self.closed and not self._want_write:
+			self._want_write = True
+			self._update_events()
+	
+	
+	def pause(self):
+		""" Stops dispatching received messages until resume() is called """
+		self._paused = True
+	
+	
+	def resume(self):
+		""" Dispatches messages received while paused and continues """
+		self._paused = False
+		self._dispatch()
+	
+	
+	def _on_event(self, fd, event):
+		if event == self.poller.POLLIN:
+			self._read()
+		elif event == self.poller.POLLOUT:
+			self._flush()
+	
+	
+	def _read(self):
+		try:
+			data = self.socket.recv(READ_SIZE)
+		except (BlockingIOError, InterruptedError):
+			return
+		except OSError:
+			data = b""
+		if not data:
+			self.close()
+			return
+		self._in += data
+		if len(self._in) > MAX_BUFFERED:
+			log.warning("Connection %s sent too long message, disconnecting", self.fd)
+			self.close()
+			return
+		self._dispatch()
+	
+	
+	def _dispatch(self):
+		while not self._paused and not self.closed and b"\n" in self._in:
+			line, self._in = self._in.split(b"\n", 1)
+			try:
+				self.on_message(self, line)
+			except Exception as e:
+				log.exception(e)
+	
+	
+	def _flush(self):
+		if self._out:
+			try:
+				sent = self.socket.send(self._out)
+			except (BlockingIOError, InterruptedError):
+				return
+			except OSError:
+				self._out = bytearray()
+				self.shutdown()
+				return
+			del self._out[0:sent]
+		if not self._out and self._want_write:
+			self._want_write = False
+			self.on_writable(self)
+		if not self.closed:
+			self._update_events()
+	
+	
+	def shutdown(self):
+		"""
+		Shuts down connection. Unlike close(), on_close is not called
+		immediately, but on next poll, so this is safe to call from anywhere.
+		"""
+		try:
+			self.socket.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+	
+	
+	def close(self):
+		if not self.closed:
+			self.closed = True
+			self.poller.unregister(self.fd)
+			try:
+				self.socket.close()
+			except OSError:
+				pass
+			if self.server:
+				self.server.connections.discard(self)
+			if self.on_close:
+				self.on_close(self)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python2
 from scc.constants import HapticPos
+from scc import tracing
 import time
+import copy
 import logging
 
 log = logging.getLogger("SCController")
@@ -23,6 +25,16 @@ class Controller(object):
 		next_id += 1
 		self.lastTime = time.time()
 		self.time_elapsed = 0.0
+		# Time when input sent to mapper was received, see scc.tracing
+		self.input_received = None
+		# Input coalescing, see set_input_coalescing
+		self._coalescing = False
+		self._coalesced_old = None		# old_state of first coalesced input
+		self._coalesced = None			# newest coalesced state
+		self._coalesced_edges = 0		# buttons changed by coalesced inputs
+		self._coalesced_received = None	# when first coalesced input was received
+		self.coalesced_merged = 0
+		self.coalesced_dropped = 0
 	
 	
 	def get_type(self):
@@ -69,6 +81,78 @@ class Controller(object):
 		return self.mapper
 	
 	
+	def set_input_coalescing(self, enabled):
+		"""
+		Enables or disables input coalescing. When enabled, inputs passed to
+		send_input are not sent to mapper right away, but merged together
+		and sent by flush_input, which daemon calls once per mainloop
+		iteration. That way, daemon that falls behind drops stale inputs
+		instead of lagging.
+		
+		Analog values are taken from newest input only. Buttons are merged,
+		but input that would press and release (or release and press) same
+		button is never merged with previous one, so no button press is lost.
+		"""
+		if self._coalescing and not enabled:
+			self.flush_input()
+		self._coalescing = enabled
+	
+	
+	def get_input_coalescing(self):
+		""" Returns True if input coalescing is enabled """
+		return self._coalescing
+	
+	
+	def send_input(self, old_state, state):
+		"""
+		Passes input to mapper or stores it if coalescing is enabled.
+		Should be used by drivers instead of calling mapper.input directly.
+		
+		Mapper has to be set.
+		"""
+		if not self._coalescing:
+			self.input_received = tracing.get_received()
+			self.mapper.input(self, old_state, state)
+			return
+		if self._coalesced is None:
+			self._coalesced_received = tracing.get_received()
+			self._coalesced_old = _snapshot(old_state)
+			self._coalesced = _snapshot(state)
+			self._coalesced_edges = old_state.buttons ^ state.buttons
+			return
+		edges = self._coalesced.buttons ^ state.buttons
+		if edges & self._coalesced_edges:
+			# Merging would lose button press or release
+			self.input_received = self._coalesced_received
+			self.mapper.input(self, self._coalesced_old, self._coalesced)
+			self._coalesced_received = tracing.get_received()
+			self._coalesced_old = self._coalesced
+			self._coalesced = _snapshot(state)
+			self._coalesced_edges = edges
+			return
+		self._coalesced = _snapshot(state)
+		if edges:
+			self._coalesced_edges |= edges
+			self.coalesced_merged += 1
+		else:
+			self.coalesced_dropped += 1
+	
+	
+	def flush_input(self):
+		"""
+		Sends coalesced input, if any, to mapper.
+		Returns True if there was input to send.
+		"""
+		if self._coalesced is not None:
+			old_state, state = self._coalesced_old, self._coalesced
+			self._coalesced_old, self._coalesced = None, None
+			self.input_received = self._coalesced_received
+			if self.mapper:
+				self.mapper.input(self, old_state, state)
+			return True
+		return False
+	
+	
 	def apply_config(self, config):
 		"""
 		Called from daemon to apply controller configuration stored
@@ -110,11 +194,38 @@ class Controller(object):
 		pass
 	
 	
+	def get_input_stats(self):
+		"""
+		Returns (received, lost, reordered) counts of input packets,
+		or None if driver can't detect lost packets.
+		"""
+		return None
+	
+	
+	def get_control_stats(self):
+		"""
+		Returns stats of control messages (feedback, configuration) sent
+		to device, as returned by USBDevice.get_control_stats, or None
+		if driver doesn't queue them.
+		"""
+		return None
+	
+	
 	def disconnected(self):
 		""" Called from daemon after controller is disconnected """
 		pass
 	
 
+def _snapshot(state):
+	"""
+	Returns copy of state that is not changed by driver.
+	Drivers often reuse state buffers, but tuples are immutable.
+	"""
+	if isinstance(state, tuple):
+		return state
+	return copy.copy(state)
+
+
 class HapticData(object):
 	""" Simple container to hold haptic feedback settings """
 	
@@ -136,8 +136,7 @@ class DS4Controller(HIDController):
 					self._decoder.state.buttons &= ~SCButtons.CPADTOUCH
 				else:
 					self._decoder.state.buttons |= SCButtons.CPADTOUCH
-				self.mapper.input(self,
-						self._decoder.old_state, self._decoder.state)
+				self.send_input(self._decoder.old_state, self._decoder.state)
 
 	
 	def get_gyro_enabled(self):
@@ -276,7 +275,7 @@ class DS4EvdevController(EvdevController):
 		if new_state is not self._state:
 			old_state, self._state = self._state, new_state
 			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
+				self.send_input(old_state, new_state)
 	
 	
 	def _touchpad_input(self, *a):
@@ -316,7 +315,7 @@ class DS4EvdevController(EvdevController):
 		if new_state is not self._state:
 			old_state, self._state = self._state, new_state
 			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
+				self.send_input(old_state, new_state)
 	
 	
 	def close(self):
@@ -8,6 +8,7 @@ devices is read from config file.
 
 from scc.constants import STICK_PAD_MIN, STICK_PAD_MAX, TRIGGER_MIN, TRIGGER_MAX
 from scc.constants import SCButtons, ControllerFlags
+from scc.calibration import TRIGGERS, parse_axis
 from scc.controller import Controller
 from scc.paths import get_config_path
 from scc.tools import clamp
@@ -26,21 +27,34 @@ except ImportError:
 	ecodes = FakeECodes()
 
 from collections import namedtuple
-import os, sys, binascii, json, logging
+import os, sys, struct, binascii, json, logging
 log = logging.getLogger("evdev")
 
-TRIGGERS = "ltrig", "rtrig"
 FIRST_BUTTON = 288
 
+# struct input_event, as read from device node, and constants from
+# linux/input-event-codes.h. Defined here so input can be decoded without
+# creating evdev.InputEvent for every event.
+EVENT = struct.Struct("llHHi")
+EVENTS_PER_READ = 64
+EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+SYN_REPORT = 0x00
+
 EvdevControllerInput = namedtuple('EvdevControllerInput',
 	'buttons ltrig rtrig stick_x stick_y lpad_x lpad_y rpad_x rpad_y '
 	'gpitch groll gyaw q1 q2 q3 q4 '
 	'cpad_x cpad_y'
 )
 
-AxisCalibrationData = namedtuple('AxisCalibrationData',
-	'scale offset center clamp_min clamp_max deadzone'
-)
+FIELD_INDEX = { x : i for (i, x) in enumerate(EvdevControllerInput._fields) }
+BUTTONS = FIELD_INDEX["buttons"]
+# Pad axes and (buttons checked, buttons set) for pad touch emulation
+PAD_TOUCH = {
+	"lpad_x" : (SCButtons.LPADTOUCH, SCButtons.LPAD | SCButtons.LPADTOUCH),
+	"lpad_y" : (SCButtons.LPADTOUCH, SCButtons.LPAD | SCButtons.LPADTOUCH),
+	"rpad_x" : (SCButtons.RPADTOUCH, SCButtons.RPADTOUCH),
+	"rpad_y" : (SCButtons.RPADTOUCH, SCButtons.RPADTOUCH),
+}
 
 class EvdevController(Controller):
 	"""
@@ -74,6 +88,17 @@ class EvdevController(Controller):
 			self._id = self._generate_id()
 		self._state = EvdevControllerInput( *[0] * len(EvdevControllerInput._fields) )
 		self._padpressemu_task = None
+		# Events are read into _buffer and applied to _pending, which is
+		# turned into new state once SYN_REPORT is received.
+		# _changed and _buttons_changed are bitmasks of fields and buttons
+		# changed in _pending since last SYN_REPORT.
+		self._buffer = bytearray(EVENT.size * EVENTS_PER_READ)
+		self._view = memoryview(self._buffer)
+		self._pending = list(self._state)
+		self._changed = 0
+		self._buttons_changed = 0
+		self._need_cancel_padpressemu = False
+		self._synced = self._state
 
 
 	def _parse_config(self, config):
@@ -102,6 +127,41 @@ class EvdevController(Controller):
 				self._calibrations[code] = parse_axis(value)
 				self._dpad_map[code] = value.get("positive", False)
 				self._axis_map[code] = axis
+		self._compile_tables()
+
+
+	def _compile_tables(self):
+		"""
+		Generates tables used by input() from button, axis and dpad maps.
+
+		_key_buttons maps EV_KEY code to button mask.
+		_key_axes maps EV_KEY code to (field index, pressed value,
+		released value, touch check, touch buttons).
+		_abs_axes maps EV_ABS code to (field index, scale, offset, deadzone,
+		clamp_min, clamp_max, touch check, touch buttons).
+		"""
+		self._key_buttons = {}
+		self._key_axes = {}
+		self._abs_axes = {}
+		for code, button in self._button_map.items():
+			if code not in self._dpad_map:
+				self._key_buttons[code] = int(button)
+		for code, axis in self._axis_map.items():
+			index = FIELD_INDEX[axis]
+			check, touch = PAD_TOUCH.get(axis, (0, 0))
+			check, touch = int(check), int(touch)
+			if code in self._dpad_map:
+				cal = self._calibrations[code]
+				value = STICK_PAD_MAX if self._dpad_map[code] else STICK_PAD_MIN
+				value = int(value * cal.scale * STICK_PAD_MAX)
+				self._key_axes[code] = (index, value, 0, check, touch)
+			elif code in self._calibrations:
+				cal = self._calibrations[code]
+				self._abs_axes[code] = (index, cal.scale, cal.offset, cal.deadzone,
+					cal.clamp_min, cal.clamp_max, check, touch)
+			else:
+				# Trigger mapped to button
+				self._key_axes[code] = (index, TRIGGER_MAX, TRIGGER_MIN, 0, 0)
 
 
 	def close(self):
@@ -152,83 +212,105 @@ class EvdevController(Controller):
 
 
 	def input(self, *a):
-		new_state = self._state
-		need_cancel_padpressemu = False
 		try:
-			for event in self.device.read():
-				if event.type == ecodes.EV_KEY and event.code in self._dpad_map:
-					cal = self._calibrations[event.code]
-					if event.value:
-						if self._dpad_map[event.code]:
-							# Positive
-							value = STICK_PAD_MAX
-						else:
-							value = STICK_PAD_MIN
-						cal = self._calibrations[event.code]
-						value = int(value * cal.scale * STICK_PAD_MAX)
-					else:
-						value = 0
-					axis = self._axis_map[event.code]
-					if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
-						b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
-						b = new_state.buttons | SCButtons.RPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					else:
-						new_state = new_state._replace(**{ axis : value })
-				elif event.type == ecodes.EV_KEY and event.code in self._button_map:
-					if event.value:
-						b = new_state.buttons | self._button_map[event.code]
-						new_state = new_state._replace(buttons=b)
-					else:
-						b = new_state.buttons & ~self._button_map[event.code]
-						new_state = new_state._replace(buttons=b)
-				elif event.type == ecodes.EV_KEY and event.code in self._axis_map:
-					axis = self._axis_map[event.code]
-					if event.value:
-						new_state = new_state._replace(**{ axis : TRIGGER_MAX })
-					else:
-						new_state = new_state._replace(**{ axis : TRIGGER_MIN })
-				elif event.type == ecodes.EV_ABS and event.code in self._axis_map:
-					cal = self._calibrations[event.code]
-					value = (float(event.value) * cal.scale) + cal.offset
-					if value >= -cal.deadzone and value <= cal.deadzone:
-						value = 0
-					else:
-						value = clamp(cal.clamp_min,
-								int(value * cal.clamp_max), cal.clamp_max)
-					axis = self._axis_map[event.code]
-					if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
-						b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
-						b = new_state.buttons | SCButtons.RPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					else:
-						new_state = new_state._replace(**{ axis : value })
+			count = os.readv(self.device.fd, [ self._buffer ])
+		except BlockingIOError:
+			return
 		except IOError as e:
 			# TODO: Maybe check e.errno to determine exact error
 			# all of them are fatal for now
 			log.error(e)
 			_evdevdrv.device_removed(self.device.fn)
+			return
+		self._apply_events(self._view[0:count - count % EVENT.size])
 
-		if new_state is not self._state:
-			# Something got changed
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				if need_cancel_padpressemu:
-					if self._padpressemu_task:
-						self.mapper.cancel_task(self._padpressemu_task)
-					self._padpressemu_task = self.mapper.schedule(
-						self.PADPRESS_EMULATION_TIMEOUT,
-						self.cancel_padpress_emulation
-					)
-				self.mapper.input(self, old_state, new_state)
+
+	def _apply_events(self, data):
+		"""
+		Applies events from data (buffer with input_event structures)
+		to pending state. Calls _commit for every SYN_REPORT.
+		"""
+		self._sync_pending()
+		pending = self._pending
+		key_buttons, key_axes, abs_axes = (self._key_buttons,
+			self._key_axes, self._abs_axes)
+		changed, buttons_changed = self._changed, self._buttons_changed
+		for sec, usec, ev_type, code, value in EVENT.iter_unpack(data):
+			if ev_type == EV_ABS:
+				if code not in abs_axes:
+					continue
+				(index, scale, offset, deadzone, clamp_min, clamp_max,
+					check, touch) = abs_axes[code]
+				value = (float(value) * scale) + offset
+				if value >= -deadzone and value <= deadzone:
+					value = 0
+				else:
+					value = clamp(clamp_min, int(value * clamp_max), clamp_max)
+			elif ev_type == EV_KEY:
+				if code in key_buttons:
+					mask = key_buttons[code]
+					if value:
+						pending[BUTTONS] |= mask
+					else:
+						pending[BUTTONS] &= ~mask
+					buttons_changed |= mask
+					changed |= 1
+					continue
+				if code not in key_axes:
+					continue
+				index, pressed, released, check, touch = key_axes[code]
+				value = pressed if value else released
+			elif ev_type == EV_SYN and code == SYN_REPORT:
+				self._changed, self._buttons_changed = changed, buttons_changed
+				self._commit()
+				changed, buttons_changed = 0, 0
+				continue
+			else:
+				continue
+			pending[index] = value
+			changed |= 1 << index
+			if check and not pending[BUTTONS] & check:
+				pending[BUTTONS] |= touch
+				buttons_changed |= touch
+				self._need_cancel_padpressemu = True
+		self._changed, self._buttons_changed = changed, buttons_changed
+
+
+	def _sync_pending(self):
+		"""
+		Copies state changed by something else (pad touch emulation or
+		other device of same controller) since last commit to pending state.
+		Fields changed by report that is being read are kept.
+		"""
+		if self._state is self._synced:
+			return
+		pending, state = self._pending, self._state
+		for index in range(len(pending)):
+			if not self._changed & (1 << index):
+				pending[index] = state[index]
+		pending[BUTTONS] = ((state.buttons & ~self._buttons_changed)
+			| (pending[BUTTONS] & self._buttons_changed))
+		self._synced = state
+
+
+	def _commit(self):
+		""" Turns pending state into new state and sends it to mapper """
+		if not self._changed:
+			return
+		pending = self._pending
+		old_state = self._state
+		self._state = self._synced = EvdevControllerInput._make(pending)
+		self._changed, self._buttons_changed = 0, 0
+		if self.mapper:
+			if self._need_cancel_padpressemu:
+				if self._padpressemu_task:
+					self.mapper.cancel_task(self._padpressemu_task)
+				self._padpressemu_task = self.mapper.schedule(
+					self.PADPRESS_EMULATION_TIMEOUT,
+					self.cancel_padpress_emulation
+				)
+			self.send_input(old_state, self._state)
+		self._need_cancel_padpressemu = False
 
 
 	def test_input(self, event):
@@ -275,7 +357,7 @@ class EvdevController(Controller):
 			# Something got changed
 			old_state, self._state = self._state, new_state
 			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
+				self.send_input(old_state, new_state)
 
 		if need_reschedule:
 			self._padpressemu_task = mapper.schedule(
@@ -325,32 +407,6 @@ class EvdevController(Controller):
 		pass
 
 
-def parse_axis(axis):
-	min       = axis.get("min", -127)
-	max       = axis.get("max",  128)
-	center    = axis.get("center", 0)
-	clamp_min = STICK_PAD_MIN
-	clamp_max = STICK_PAD_MAX
-	deadzone  = axis.get("deadzone", 0)
-	offset = 0
-	if (max >= 0 and min >= 0):
-		offset = 1
-	if max > min:
-		scale = (-2.0 / (min-max)) if min != max else 1.0
-		deadzone = abs(float(deadzone) * scale)
-		offset *= -1.0
-	else:
-		scale = (-2.0 / (min-max)) if min != max else 1.0
-		deadzone = abs(float(deadzone) * scale)
-	if axis in TRIGGERS:
-		clamp_min = TRIGGER_MIN
-		clamp_max = TRIGGER_MAX
-		offset += 1.0
-		scale *= 0.5
-
-	return AxisCalibrationData(scale, offset, center, clamp_min, clamp_max, deadzone)
-
-
 class EvdevDriver(object):
 	SCAN_INTERVAL = 5
 
@@ -11,7 +11,8 @@ from scc.drivers.usb import register_hotplug_device, unregister_hotplug_device
 from scc.drivers.usb import USBDevice
 from scc.constants import STICK_PAD_MIN, STICK_PAD_MAX
 from scc.constants import SCButtons, ControllerFlags
-from scc.drivers.evdevdrv import FIRST_BUTTON, TRIGGERS, parse_axis
+from scc.drivers.evdevdrv import FIRST_BUTTON
+from scc.calibration import TRIGGERS, parse_axis
 from scc.controller import Controller
 from scc.paths import get_config_path
 from scc.tools import find_library
@@ -526,8 +527,7 @@ class HIDController(USBDevice, Controller):
 	def input(self, endpoint, data):
 		if _lib.decode(ctypes.byref(self._decoder), data):
 			if self.mapper:
-				self.mapper.input(self,
-						self._decoder.old_state, self._decoder.state)
+				self.send_input(self._decoder.old_state, self._decoder.state)
 
 
 	def apply_config(self, config):
@@ -94,7 +94,7 @@ class RemotePadController(Controller):
 	
 	def _input(self, trash, data):
 		if self._enabled and self.mapper:
-			self.mapper.input(self, self._old_state, data.contents)
+			self.send_input(self._old_state, data.contents)
 			ctypes.memmove(byref(self._old_state), data, self._state_size)
 	
 	def get_gui_config_file(self):
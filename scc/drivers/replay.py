@@ -0,0 +1,116 @@
+#!/usr/bin/env python2
+"""
+SC Controller - Replay driver
+
+Feeds inputs recorded by scc.recorder back to mapper. Does nothing by
+default, unless SCC_REPLAY environment variable is set. If it is, creates
+one controller for every file in SCC_REPLAY (separated by ':') and replays
+its inputs in real time.
+
+For debuging and benchmarking purposes only. See ReplayController.replay
+for replaying without daemon.
+"""
+
+from scc.controller import Controller
+from scc import recorder
+import os, time, logging
+
+ENV_VAR = "SCC_REPLAY"
+log = logging.getLogger("Replay")
+
+if ENV_VAR in os.environ:
+	def init(daemon, config):
+		return True
+	
+	
+	def start(daemon):
+		for i, filename in enumerate(os.environ[ENV_VAR].split(":")):
+			try:
+				c = ReplayController(filename, i)
+			except (IOError, ValueError) as e:
+				log.error("Failed to load recording: %s", e)
+				continue
+			daemon.add_controller(c)
+			c.play(daemon.get_scheduler())
+
+
+class ReplayController(Controller):
+	def __init__(self, filename, number=0):
+		Controller.__init__(self)
+		self.flags, self.frames = recorder.load(filename)
+		self._id = "replay%s" % (number,)
+		self._gyro_enabled = False
+		self._old_state = recorder.RecordedInput(*[0] * len(recorder.FIELDS))
+		self._index = 0
+		self._start = None
+	
+	
+	def get_type(self):
+		return "replay"
+	
+	
+	def get_gyro_enabled(self):
+		""" Returns True if gyroscope was enabled while input was recorded """
+		return self._gyro_enabled
+	
+	
+	def set_led_level(self, level):
+		pass
+	
+	
+	def _input(self, index):
+		t, self._gyro_enabled, state = self.frames[index]
+		if self.mapper:
+			self.mapper.input(self, self._old_state, state)
+		self._old_state = state
+	
+	
+	def play(self, scheduler):
+		"""
+		Starts replaying recorded inputs in real time,
+		using scheduler to wait between them.
+		"""
+		self._index = 0
+		self._start = time.time()
+		self._play_next(scheduler)
+	
+	
+	def _play_next(self, scheduler):
+		if self._index >= len(self.frames):
+			log.info("%s: Replay finished", self.get_id())
+			return
+		self._input(self._index)
+		self._index += 1
+		if self._index < len(self.frames):
+			t = self.frames[self._index][0]
+			scheduler.schedule(max(0, self._start + t - time.time()),
+				self._play_next, scheduler)
+	
+	
+	def replay(self, realtime=False):
+		"""
+		Feeds all recorded inputs to mapper and returns after last one.
+		
+		If 'realtime' is False, inputs are processed as fast as possible
+		and time.time is temporarily replaced to return recorded time,
+		so time-dependent actions behave as they would in real time and
+		replaying same recording always generates same outputs.
+		"""
+		_time = time.time
+		start = _time()
+		try:
+			for self._index in range(len(self.frames)):
+				t = start + self.frames[self._index][0]
+				if realtime:
+					delay = t - time.time()
+					if delay > 0:
+						time.sleep(delay)
+				else:
+					time.time = lambda : t
+				self._input(self._index)
+		finally:
+			time.time = _time
+	
+	
+	def __repr__(self):
+		return "<ReplayController %s>" % (self.get_id(),)
@@ -8,11 +8,10 @@ Shares a lot of classes with sc_dongle.py
 """
 
 from scc.lib.hidraw import HIDRaw
-from scc.constants import ControllerFlags, STICK_PAD_MIN, STICK_PAD_MAX
+from scc.constants import ControllerFlags
 from scc.tools import find_library
 from .sc_dongle import SCPacketType, SCPacketLength, SCConfigType
 from .sc_dongle import SCController
-from math import sin, cos
 import os, sys, struct, ctypes, logging
 
 VENDOR_ID = 0x28de
@@ -225,7 +224,7 @@ class SCByBt(SCController):
 		# For BT controller, index is ignored
 		for x in self._cmsg:
 			# First byte is reserved, following 3 are for PacketType, size and ConfigType
-			if x[0:4] == data[0:4]:
+			if x[1:4] == data[0:3]:
 				self._cmsg.remove(x)
 				break
 		self.send_control(index, data)
@@ -266,30 +265,11 @@ class SCByBt(SCController):
 		
 		if r == 1:
 			if self.mapper is not None:
-				if self._input_rotation_l and (self._state.type & 0x0100) != 0:
-					lx, ly = self._state.lpad_x, self._state.lpad_y
-					s, c = sin(self._input_rotation_l), cos(self._input_rotation_l)
-
-					# Adjust LX for rotation and clamp
-					value = int(lx * c - ly * s)
-					self._state.lpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust LY for rotation and clamp
-					value = int(lx * s + ly * c)
-					self._state.lpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-				if self._input_rotation_r and (self._state.type & 0x0200) != 0:
-					rx, ry = self._state.rpad_x, self._state.rpad_y
-					s, c = sin(self._input_rotation_r), cos(self._input_rotation_r)
-
-					# Adjust RX for rotation and clamp
-					value = int(rx * c - ry * s)
-					self._state.rpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust RY for rotation and clamp
-					value = int(rx * s + ry * c)
-					self._state.rpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
+				if self._rotation:
+					self._rotation.apply(self._state, self._state.type & 0x0100,
+						self._state.type & 0x0200)
 				
-				self.mapper.input(self, self._old_state, self._state)
+				self.send_input(self._old_state, self._state)
 			self.flush()
 		elif r > 1:
 			log.error("Read Failed")
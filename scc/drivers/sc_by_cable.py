@@ -9,9 +9,8 @@ Shares a lot of classes with sc_dongle.py
 
 from scc.lib.usb1 import USBError
 from scc.drivers.usb import USBDevice, register_hotplug_device
-from .sc_dongle import ControllerInput, TUP_FORMAT
 from .sc_dongle import SCStatus, SCController
-import struct, logging
+import logging
 
 VENDOR_ID = 0x28de
 PRODUCT_ID = 0x1102
@@ -65,13 +64,13 @@ class SCByCable(USBDevice, SCController):
 	
 	
 	def _wait_input(self, endpoint, data):
-		tup = ControllerInput._make(struct.unpack(TUP_FORMAT, data))
 		if not self._ready:
 			self.daemon.add_controller(self)
 			self.configure()
 			self._ready = True
-		if tup.status == SCStatus.INPUT:
-			self._last_tup = tup
+		if data[2] == SCStatus.INPUT and self.check_sequence(data):
+			# Only latest packet is kept, always unpacked into same buffer
+			self._last_tup = self.decode(data)
 	
 	
 	def _timer(self):
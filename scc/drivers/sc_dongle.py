@@ -8,11 +8,12 @@ Handles one or multiple controllers connected to dongle.
 
 from scc.lib import IntEnum
 from scc.drivers.usb import USBDevice, register_hotplug_device
-from scc.constants import SCButtons, STICKTILT, STICK_PAD_MIN, STICK_PAD_MAX
+from scc.constants import SCButtons, STICKTILT
+from scc.calibration import PadRotation
+from scc.sequence import InputSequence
 from scc.controller import Controller
 from scc.config import Config
 from collections import namedtuple
-from math import pi as PI, sin, cos
 import struct, logging
 
 VENDOR_ID = 0x28de
@@ -50,6 +51,7 @@ INPUT_FORMAT = [
 	('16x', 'ukn_07')]
 FORMATS, NAMES = zip(*INPUT_FORMAT)
 TUP_FORMAT = '<' + ''.join(FORMATS)
+INPUT_STRUCT = struct.Struct(TUP_FORMAT)
 ControllerInput = namedtuple('ControllerInput', ' '.join([ x for x in NAMES if not x.startswith('ukn_') ]))
 SCI_NULL = ControllerInput._make(struct.unpack('<' + ''.join(FORMATS), b'\x00' * 64))
 STICKPRESS = 0b1000000000000000000000000000000
@@ -57,6 +59,44 @@ STICKPRESS = 0b1000000000000000000000000000000
 
 log = logging.getLogger("SCDongle")
 
+
+class SCInput(object):
+	"""
+	Mutable replacement for ControllerInput.
+	
+	Every SCController keeps two of those and unpacks incoming packets into
+	one that is not currently used as mapper's 'state', so no new object
+	has to be created for each packet. Has same fields as ControllerInput.
+	"""
+	__slots__ = ControllerInput._fields
+	
+	def __init__(self):
+		self.unpack(b'\x00' * INPUT_STRUCT.size)
+	
+	
+	def unpack(self, data):
+		""" Unpacks raw packet into this object """
+		(self.type, self.status, self.seq, self.buttons,
+			self.ltrig, self.rtrig,
+			self.lpad_x, self.lpad_y, self.rpad_x, self.rpad_y,
+			self.accel_x, self.accel_y, self.accel_z,
+			self.gpitch, self.groll, self.gyaw,
+			self.q1, self.q2, self.q3, self.q4) = INPUT_STRUCT.unpack(data)
+	
+	
+	def __iter__(self):
+		for x in self.__slots__:
+			yield getattr(self, x)
+	
+	
+	def __eq__(self, other):
+		return tuple(self) == tuple(other)
+	
+	
+	def __repr__(self):
+		return "ControllerInput(%s)" % (", ".join([
+			"%s=%r" % (x, getattr(self, x)) for x in self.__slots__ ]),)
+
 def init(daemon, config):
 	""" Registers hotplug callback for controller dongle """
 	def cb(device, handle):
@@ -103,8 +143,9 @@ class Dongle(USBDevice):
 	
 	
 	def _on_input(self, endpoint, data):
-		tup = ControllerInput._make(struct.unpack(TUP_FORMAT, data))
-		if tup.status == SCStatus.HOTPLUG:
+		# Status is checked before unpacking whole packet
+		status = data[2]
+		if status == SCStatus.HOTPLUG:
 			# Most of INPUT_FORMAT doesn't apply here
 			if ord(str(data[4])) == 2:
 				# Controller connected
@@ -116,7 +157,7 @@ class Dongle(USBDevice):
 					self.daemon.remove_controller(self._controllers[endpoint])
 					self._controllers[endpoint].disconnected()
 					del self._controllers[endpoint]
-		elif tup.status == SCStatus.INPUT:
+		elif status == SCStatus.INPUT:
 			if endpoint not in self._controllers:
 				self._add_controller(endpoint)
 			elif len(self._no_serial):
@@ -124,7 +165,9 @@ class Dongle(USBDevice):
 					x.read_serial()
 				self._no_serial = []
 			else:
-				self._controllers[endpoint].input(tup)
+				c = self._controllers[endpoint]
+				if c.check_sequence(data):
+					c.input(c.decode(data))
 
 
 class SCStatus(IntEnum):
@@ -163,20 +206,24 @@ class SCConfigType(IntEnum):
 
 
 class SCController(Controller):
+	# See InputSequence
+	REORDER_WINDOW = 64
+	
 	def __init__(self, driver, ccidx, endpoint):
 		Controller.__init__(self)
 		self._driver = driver
 		self._endpoint = endpoint
 		self._idle_timeout = 600
 		self._enable_gyros = False
-		self._input_rotation_l = 0
-		self._input_rotation_r = 0
+		self._rotation = None		# PadRotation or None if not rotated
 		self._led_level = 10
 		# TODO: Is serial really used anywhere?
 		self._serial = "0000000000"
 		self._id = self._generate_id() if driver else "-"
-		self._old_state = SCI_NULL
+		self._old_state = SCInput()
+		self._state = SCInput()		# buffer for next packet
 		self._ccidx = ccidx
+		self._sequence = InputSequence(self.REORDER_WINDOW)
 	
 	
 	def get_type(self):
@@ -187,50 +234,45 @@ class SCController(Controller):
 		return "<SCWireless %s>" % (self.get_id(),)
 	
 	
+	def check_sequence(self, data):
+		"""
+		Checks sequence number of raw input packet and counts lost and
+		reordered packets. Returns False if packet is older than one
+		already recieved, or same, and should be ignored.
+		"""
+		return self._sequence.check(data[4] | (data[5] << 8))
+	
+	
+	def get_input_stats(self):
+		return self._sequence.get_stats()
+	
+	
+	def decode(self, data):
+		"""
+		Unpacks raw packet into reusable state object and returns it.
+		Returned object is valid only until input() is called with it.
+		"""
+		self._state.unpack(data)
+		return self._state
+	
+	
 	def input(self, idata):
 		old_state, self._old_state = self._old_state, idata
+		if idata is self._state:
+			# Swap buffers; Next packet is unpacked into one that was
+			# old_state until now
+			self._state = old_state
 		if self.mapper:
 			#if idata.buttons & SCButtons.LPAD:
 			#	# STICKPRESS button may signalize pressing stick instead
 			#	if (idata.buttons & STICKPRESS) and not (idata.buttons & STICKTILT):
 			#		idata = ControllerInput.replace(buttons=idata.buttons & ~SCButtons.LPAD)
 			
-			if self._input_rotation_l or self._input_rotation_r:
-				lx, ly = idata.lpad_x, idata.lpad_y
-				rx, ry = idata.rpad_x, idata.rpad_y
-
-				if self._input_rotation_l and idata.buttons & SCButtons.LPADTOUCH:
-					s, c = sin(self._input_rotation_l), cos(self._input_rotation_l)
-					# Adjust LX for rotation and clamp
-					value = int(idata.lpad_x * c - idata.lpad_y * s)
-					lx = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust LY for rotation and clamp
-					value = int(idata.lpad_x * s + idata.lpad_y * c)
-					ly = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-				if self._input_rotation_r and idata.buttons & SCButtons.RPADTOUCH:
-					s, c = sin(self._input_rotation_r), cos(self._input_rotation_r)
-
-					# Adjust RX for rotation and clamp
-					value = int(idata.rpad_x * c - idata.rpad_y * s)
-					rx = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust RY for rotation and clamp
-					value = int(idata.rpad_x * s + idata.rpad_y * c)
-					ry = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-				# TODO: This is awfull :(
-				idata = ControllerInput(
-						idata.type, idata.status, idata.seq, idata.buttons,
-						idata.ltrig, idata.rtrig,
-						lx, ly, rx, ry,
-						idata.accel_x, idata.accel_y, idata.accel_z,
-						idata.gpitch, idata.groll, idata.gyaw,
-						idata.q1, idata.q2, idata.q3, idata.q4
-				)
-
-			self.mapper.input(self, old_state, idata)
+			if self._rotation:
+				self._rotation.apply(idata, idata.buttons & SCButtons.LPADTOUCH,
+					idata.buttons & SCButtons.RPADTOUCH)
+			
+			self.send_input(old_state, idata)
 	
 	
 	def _generate_id(self):
@@ -252,7 +294,7 @@ class SCController(Controller):
 	
 	def read_serial(self):
 		""" Requests and reads serial number from controller """
-		if Config()["ignore_serials"]:
+		if Config.shared()["ignore_serials"]:
 			# Special exception for cases when controller drops instead of
 			# sending serial number. See issue #103
 			self.generate_serial()
@@ -260,6 +302,10 @@ class SCController(Controller):
 			return
 		
 		def cb(rawserial):
+			if rawserial is None:
+				# Request failed, will be tried again on next input
+				self._driver._no_serial.append(self)
+				return
 			size, serial = struct.unpack(">xBx12s49x", rawserial)
 			if size > 1:
 				serial = serial.strip(b" \x00").decode('ASCII')
@@ -296,14 +342,13 @@ class SCController(Controller):
 	def apply_config(self, config):
 		self.configure(idle_timeout=int(config['idle_timeout']),
 				led_level=float(config['led_level']))
-		self._input_rotation_l = float(config['input_rotation_l']) * PI / -180.0
-		self._input_rotation_r = float(config['input_rotation_r']) * PI / -180.0
+		self._rotation = PadRotation.from_config(config)
 	
 	
 	def disconnected(self):
 		# If ignore_serials config option is enabled, fake serial used by this
 		# controller is stored away and reused when next controller is connected
-		if Config()["ignore_serials"]:
+		if Config.shared()["ignore_serials"]:
 			self._driver._available_serials.add(self._serial)
 	
 	FORMAT1 = b'>BBBBB13sB2s43x'
@@ -395,13 +440,21 @@ class SCController(Controller):
 		return self._enable_gyros
 	
 	
+	def get_control_stats(self):
+		if isinstance(self._driver, USBDevice):
+			return self._driver.get_control_stats()
+		return None
+	
+	
 	def feedback(self, data):
 		self._feedback(*data.data)
 	
 	
 	def _feedback(self, position, amplitude=128, period=0, count=1):
 		"""
-		Add haptic feedback to be send on next usb tick
+		Add haptic feedback to be send on next usb tick.
+		Feedback that was not sent yet is replaced, so only newest one
+		is sent for every haptic.
 		
 		@param int position		haptic to use 1 for left 0 for right
 		@param int amplitude	signal amplitude from 0 to 65535
@@ -409,7 +462,7 @@ class SCController(Controller):
 		@param int count		number of period to play
 		"""
 		if amplitude >= 0:
-			self._driver.send_control(self._ccidx, struct.pack('<BBBHHH',
+			self._driver.overwrite_control(self._ccidx, struct.pack('<BBBHHH',
 					SCPacketType.FEEDBACK, 0x07, position,
 					amplitude, period, count))	
 
@@ -8,34 +8,61 @@ method to get notified about connected USB devices.
 Callback will be called with following arguments:
 	callback(device, handle)
 Callback has to return created USBDevice instance or None.
+
+Control messages are sent asynchronously. Every device has queue of them
+and only one is being transferred at time, so messages are sent as fast
+as device accepts them, while mainloop never waits for device.
 """
 from scc.lib import usb1
+from scc import tracing
+from collections import deque
 
 import time, traceback, logging
 log = logging.getLogger("USB")
 
 class USBDevice(object):
 	""" Base class for all handled usb devices """
+	# Timeout for single control transfer, in ms
+	CONTROL_TIMEOUT = 1000
+	# How many times is failed request sent again before giving up
+	REQUEST_RETRIES = 2
+	
 	def __init__(self, device, handle):
 		self.device = device
 		self.handle = handle
 		self._claimed = []
-		self._cmsg = []		# controll messages
-		self._rmsg = []		# requests (excepts response)
+		self._cmsg = deque()			# controll messages and requests
+		self._control_transfer = None	# created when first needed
+		self._control_busy = False
+		self._control_read = None		# request waiting for response
 		self._transfer_list = []
+		# Stats, see get_control_stats
+		self.control_sent = 0
+		self.control_coalesced = 0
+		self.control_failed = 0
+		self.control_max_queued = 0
+		self.control_latency = tracing.Histogram()
 	
 	
-	def set_input_interrupt(self, endpoint, size, callback):
+	def set_input_interrupt(self, endpoint, size, callback, count=None):
 		"""
 		Helper method for setting up input transfer.
 		
 		callback(endpoint, data) is called repeadedly with every packed recieved.
+		
+		'count' transfers (by default 'usb_input_transfers' from config) are
+		kept submitted, so packets recieved while callback is running are
+		not lost.
 		"""
 		def callback_wrapper(transfer):
-			if (transfer.getStatus() != usb1.TRANSFER_COMPLETED or
-				transfer.getActualLength() != size):
+			if transfer.getStatus() != usb1.TRANSFER_COMPLETED:
+				return
+			if transfer.getActualLength() != size:
+				transfer.submit()
 				return
 			
+			if tracing.ENABLED:
+				tracing.packet_received()
 			data = transfer.getBuffer()
 			try:
 				callback(endpoint, data)
@@ -44,30 +71,25 @@ class USBDevice(object):
 				log.error(e)
 				log.error(traceback.format_exc())
 			finally:
+				if tracing.ENABLED:
+					tracing.packet_done()
 				transfer.submit()
 		
-		transfer = self.handle.getTransfer()
-		transfer.setInterrupt(
-			usb1.ENDPOINT_IN | endpoint,
-			size,
-			callback=callback_wrapper,
-		)
-		transfer.submit()
-		self._transfer_list.append(transfer)
+		for i in range(count or _usb.input_transfers):
+			transfer = self.handle.getTransfer()
+			transfer.setInterrupt(
+				usb1.ENDPOINT_IN | endpoint,
+				size,
+				callback=callback_wrapper,
+			)
+			transfer.submit()
+			self._transfer_list.append(transfer)
 	
 	
 	def send_control(self, index, data):
 		""" Schedules writing control to device """
 		zeros = b'\x00' * (64 - len(data))
-		
-		self._cmsg.insert(0, (
-			0x21,	# request_type
-			0x09,	# request
-			0x0300,	# value
-			index,
-			data + zeros,
-			0		# Timeout
-		))
+		self._queue_control(index, data + zeros, None)
 	
 	
 	def overwrite_control(self, index, data):
@@ -76,45 +98,126 @@ class USBDevice(object):
 		already scheduled controll for same device/index.
 		"""
 		for x in self._cmsg:
-			x_index, x_data, x_timeout = x[-3:]
+			x_index, x_data, x_request = x[1:]
 			# First 3 bytes are for PacketType, size and ConfigType
-			if x_index == index and x_data[0:3] == data[0:3]:
+			# (or haptic position, for feedback)
+			if x_index == index and x_request is None and x_data[0:3] == data[0:3]:
 				self._cmsg.remove(x)
+				self.control_coalesced += 1
 				break
 		self.send_control(index, data)
 	
 	
 	def make_request(self, index, callback, data, size=64):
 		"""
-		Schedules synchronous request that requires response.
-		Request is done ASAP and provided callback is called with recieved data.
+		Schedules request that requires response.
+		Request is sent after all previously scheduled controls and
+		provided callback is called with recieved data.
+		
+		If sending request or reading response fails, request is sent
+		again up to REQUEST_RETRIES times. If that doesn't help either,
+		callback is called with None.
 		"""
-		self._rmsg.append((
-			(
-				0x21,	# request_type
-				0x09,	# request
-				0x0300,	# value
-				index, data
-			), index, size, callback
-		))
+		self._queue_control(index, data, (size, callback, self.REQUEST_RETRIES))
+	
+	
+	def _queue_control(self, index, data, request):
+		self._cmsg.append(( time.perf_counter(), index, data, request ))
+		self.control_max_queued = max(self.control_max_queued, len(self._cmsg))
 	
 	
 	def flush(self):
-		""" Flushes all prepared control messages to the device """
-		while len(self._cmsg):
-			msg = self._cmsg.pop()
-			self.handle.controlWrite(*msg)
-		
-		while len(self._rmsg):
-			msg, index, size, callback = self._rmsg.pop()
-			self.handle.controlWrite(*msg)
-			data = self.handle.controlRead(
+		"""
+		Submits next scheduled control message to the device, unless
+		previous one is still being transferred. Never blocks.
+		"""
+		if self._control_busy:
+			return
+		if self._control_transfer is None:
+			if not self._cmsg:
+				return
+			self._control_transfer = self.handle.getTransfer()
+		if self._control_read:
+			queued, index, data, request = self._control_read
+			self._control_read = None
+			self._control_transfer.setControl(
 				0xA1,	# request_type
 				0x01,	# request
 				0x0300,	# value
-				index, size
-			)
+				index, request[0],
+				callback=self._on_control_done,
+				user_data=(queued, index, data, request, True),
+				timeout=self.CONTROL_TIMEOUT)
+		elif self._cmsg:
+			queued, index, data, request = self._cmsg.popleft()
+			self._control_transfer.setControl(
+				0x21,	# request_type
+				0x09,	# request
+				0x0300,	# value
+				index, data,
+				callback=self._on_control_done,
+				user_data=(queued, index, data, request, False),
+				timeout=self.CONTROL_TIMEOUT)
+		else:
+			return
+		self._control_transfer.submit()
+		self._control_busy = True
+	
+	
+	def _on_control_done(self, transfer):
+		"""
+		Called from USBDriver.mainloop (trough libusb) when control
+		transfer is finished. Next one is submitted by following flush().
+		"""
+		self._control_busy = False
+		queued, index, data, request, is_response = transfer.getUserData()
+		status = transfer.getStatus()
+		if status != usb1.TRANSFER_COMPLETED:
+			self.control_failed += 1
+			log.warning("Control transfer to %s failed with status %s",
+				self, status)
+			if request is None:
+				return
+			size, callback, retries = request
+			if retries > 0 and status not in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+				# Whole request is sent again, before anything else
+				self._cmsg.appendleft(( queued, index, data, (size, callback, retries - 1) ))
+				return
+			self._call_request_callback(callback, None)
+			return
+		if request is not None and not is_response:
+			# Request sent, response is read next
+			self._control_read = queued, index, data, request
+			return
+		self.control_sent += 1
+		self.control_latency.add(time.perf_counter() - queued)
+		if is_response:
+			size, callback, retries = request
+			self._call_request_callback(callback,
+				transfer.getBuffer()[0:transfer.getActualLength()])
+	
+	
+	def _call_request_callback(self, callback, data):
+		try:
 			callback(data)
+		except Exception as e:
+			log.error("Failed to handle response")
+			log.error(e)
+			log.error(traceback.format_exc())
+	
+	
+	def get_control_stats(self):
+		"""
+		Returns (sent, coalesced, failed, queued, max_queued, p50, p99, max)
+		tuple describing control messages sent to device. 'coalesced' is
+		number of messages replaced by newer ones before they were sent,
+		p50, p99 and max are times between scheduling message and device
+		accepting it, in microseconds.
+		"""
+		count, p50, p99, mx = self.control_latency.summary()
+		return (self.control_sent, self.control_coalesced, self.control_failed,
+			len(self._cmsg), self.control_max_queued,
+			p50 * 1000000.0, p99 * 1000000.0, mx * 1000000.0)
 	
 	
 	def force_restart(self):
@@ -169,6 +272,12 @@ class USBDevice(object):
 	
 	def close(self):
 		""" Called after device is disconnected """
+		self._cmsg.clear()
+		self._control_read = None
+		if self._control_busy:
+			try:
+				self._control_transfer.cancel()
+			except: pass
 		try:
 			self.unclaim()
 		except: pass
@@ -179,8 +288,11 @@ class USBDevice(object):
 
 
 class USBDriver(object):
+	INPUT_TRANSFERS = 4
+	
 	def __init__(self):
 		self.daemon = None
+		self.input_transfers = USBDriver.INPUT_TRANSFERS
 		self._known_ids = {}
 		self._fail_cbs = {}
 		self._devices = {}
@@ -188,6 +300,7 @@ class USBDriver(object):
 		self._started = False
 		self._retry_devices = []
 		self._retry_devices_timer = 0
+		self._retry_scheduled = False
 		self._ctx = None	# Set by start method
 		self._changed = 0
 	
@@ -323,12 +436,19 @@ class USBDriver(object):
 				log.error("USB device %s disconnected durring flush", d)
 				d.close()
 				break
-		if len(self._retry_devices):
-			if time.time() > self._retry_devices_timer:
-				self._retry_devices_timer = time.time() + 5.0
-				lst, self._retry_devices = self._retry_devices, []
-				for syspath, (vendor, product) in lst:
-					self.handle_new_device(syspath, vendor, product)
+		if len(self._retry_devices) and not self._retry_scheduled:
+			# Mainloop doesn't iterate periodically, so retrying is scheduled
+			self._retry_scheduled = True
+			delay = max(0.0, self._retry_devices_timer - time.time())
+			self.daemon.get_scheduler().schedule(delay, self._retry)
+	
+	
+	def _retry(self):
+		self._retry_scheduled = False
+		self._retry_devices_timer = time.time() + 5.0
+		lst, self._retry_devices = self._retry_devices, []
+		for syspath, (vendor, product) in lst:
+			self.handle_new_device(syspath, vendor, product)
 
 
 # USBDriver should be process-wide singleton
@@ -336,6 +456,7 @@ _usb = USBDriver()
 
 def init(daemon, config):
 	_usb.set_daemon(daemon)
+	_usb.input_transfers = max(1, int(config["usb_input_transfers"]))
 	daemon.add_on_exit(_usb.on_exit)
 	daemon.add_mainloop(_usb.mainloop)
 	return True
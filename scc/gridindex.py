@@ -0,0 +1,51 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Grid Index
+
+Uniform grid over rectangles (SVG areas, OSD keyboard buttons), used to
+find rectangle under cursor without testing all of them.
+
+Every rectangle is stored in every cell it overlaps. Cell size is derived
+from average size of rectangles, so each cell holds only few of them and
+lookup costs one dict access and couple of comparisons, no matter how
+many rectangles there are.
+"""
+
+
+class GridIndex(object):
+	"""
+	Indexes items with 'x', 'y', 'w' and 'h' attributes.
+	find(x, y) returns same item as testing items in original order and
+	taking first one that contains point (edges included) would.
+	"""
+	
+	def __init__(self, items, cell_size=None):
+		self.items = list(items)
+		self._cells = {}
+		if cell_size is None:
+			cell_size = 1.0
+			if self.items:
+				cell_size = max(
+					sum([ i.w for i in self.items ]) / len(self.items),
+					sum([ i.h for i in self.items ]) / len(self.items),
+					cell_size)
+		self.cell_size = float(cell_size)
+		for item in self.items:
+			x1, y1 = self._cell(item.x, item.y)
+			x2, y2 = self._cell(item.x + item.w, item.y + item.h)
+			for cx in range(x1, x2 + 1):
+				for cy in range(y1, y2 + 1):
+					self._cells.setdefault((cx, cy), []).append(item)
+	
+	
+	def _cell(self, x, y):
+		return int(x // self.cell_size), int(y // self.cell_size)
+	
+	
+	def find(self, x, y):
+		""" Returns first item that contains point or None """
+		for item in self._cells.get(self._cell(x, y), ()):
+			if (x >= item.x and y >= item.y
+					and x <= item.x + item.w and y <= item.y + item.h):
+				return item
+		return None
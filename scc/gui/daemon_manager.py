@@ -12,6 +12,7 @@ from __future__ import unicode_literals
 
 from scc.tools import find_binary, find_button_image, nameof
 from scc.paths import get_daemon_socket
+from scc import binevents
 from scc.gui import BUTTON_ORDER
 from gi.repository import GObject, Gio, GLib
 
@@ -79,6 +80,7 @@ class DaemonManager(GObject.GObject):
 		self.connection = None
 		self.connecting = False
 		self.buffer = b""
+		self._binary_requested = False	# 'Event format: binary' sent on this connection
 		self._connect()
 		self._requests = []
 		self._controllers = []			# Ordered as daemon says
@@ -150,6 +152,7 @@ class DaemonManager(GObject.GObject):
 			self._on_daemon_died()
 			return
 		self.buffer = b""
+		self._binary_requested = False
 		self.connection.get_input_stream().read_bytes_async(102400,
 			1, None, self._on_read_data)
 	
@@ -170,7 +173,19 @@ class DaemonManager(GObject.GObject):
 			self._on_daemon_died()
 			return
 		self.buffer += data
-		while b"\n" in self.buffer:
+		while self.buffer:
+			if self.buffer[0] == binevents.MARKER:
+				frame = binevents.unpack(self.buffer)
+				if frame is None:
+					# Rest of frame not recieved yet
+					break
+				controller_id, events, size = frame
+				self.buffer = self.buffer[size:]
+				for what, values in events:
+					self._on_event(controller_id, what, values)
+				continue
+			if b"\n" not in self.buffer:
+				break
 			line, self.buffer = self.buffer.split(b"\n", 1)
 			line = line.decode("utf-8")
 			if line.startswith("Version:"):
@@ -180,6 +195,12 @@ class DaemonManager(GObject.GObject):
 			elif line.startswith("Ready."):
 				log.debug("Daemon is ready.")
 				self.alive = True
+				if not self._binary_requested:
+					# Events are parsed faster in binary form. Requested only
+					# once per connection, 'Ready.' may be sent repeatedly
+					self._binary_requested = True
+					self.request("Event format: binary", DaemonManager.nocallback,
+							DaemonManager.nocallback)
 				self.emit('alive')
 			elif line.startswith("OK."):
 				if len(self._requests) > 0:
@@ -219,9 +240,7 @@ class DaemonManager(GObject.GObject):
 						c.emit('lost')
 			elif line.startswith("Event:"):
 				data = line[6:].strip().split(" ")
-				c = self.get_controller(data[0])
-				c.emit('event', data[1], [ int(float(x)) for x in data[2:] ])
-				self.emit('event', c, data[1], [ int(float(x)) for x in data[2:] ])
+				self._on_event(data[0], data[1], [ int(float(x)) for x in data[2:] ])
 			elif line.startswith("Error:"):
 				error = line.split(":", 1)[-1].strip()
 				self.alive = True
@@ -243,6 +262,12 @@ class DaemonManager(GObject.GObject):
 				1, None, self._on_read_data)
 	
 	
+	def _on_event(self, controller_id, what, values):
+		c = self.get_controller(controller_id)
+		c.emit('event', what, values)
+		self.emit('event', c, what, values)
+	
+	
 	def is_alive(self):
 		""" Returns True if daemon is running """
 		return self.alive
@@ -7,12 +7,13 @@ Also supports clicking on areas defined in SVG image.
 """
 from __future__ import unicode_literals
 from scc.tools import _
+from scc.gridindex import GridIndex
 
 from gi.repository import Gtk, Gdk, GObject, GdkPixbuf, Rsvg
 #from xml.etree import ElementTree as ET
-from math import sin, cos, pi as PI
+from math import sin, cos, ceil, pi as PI
 from collections import OrderedDict
-import os, sys, re, logging
+import os, sys, re, cairo, hashlib, logging
 import importlib
 
 sys.modules.pop('xml.etree.ElementTree', None)
@@ -23,9 +24,55 @@ log = logging.getLogger("Background")
 ET.register_namespace('', "http://www.w3.org/2000/svg")
 
 
+class PixbufCache(object):
+	"""
+	LRU cache of rendered images, limited by total size of stored pixbufs
+	instead of by number of entries.
+	"""
+	MAX_SIZE = 64 * 1024 * 1024
+	
+	def __init__(self, max_size=MAX_SIZE):
+		self.max_size = max_size
+		self.size = 0
+		self._cache = OrderedDict()
+	
+	
+	@staticmethod
+	def sizeof(pixbuf):
+		return pixbuf.get_rowstride() * pixbuf.get_height()
+	
+	
+	def get(self, key):
+		pixbuf = self._cache.get(key)
+		if pixbuf is not None:
+			self._cache.move_to_end(key)
+		return pixbuf
+	
+	
+	def put(self, key, pixbuf):
+		if key in self._cache:
+			self.size -= self.sizeof(self._cache.pop(key))
+		size = self.sizeof(pixbuf)
+		if size > self.max_size:
+			return
+		self._cache[key] = pixbuf
+		self.size += size
+		while self.size > self.max_size:
+			trash, old = self._cache.popitem(last=False)
+			self.size -= self.sizeof(old)
+	
+	
+	def __len__(self):
+		return len(self._cache)
+
+
 class SVGWidget(Gtk.EventBox):
 	FILENAME = "background.svg"
-	CACHE_SIZE = 50
+	# Padding added around hilighted element, in pixels, to cover its stroke
+	LAYER_PADDING = 2
+	# Shared by all widgets, so same image used in multiple places is
+	# rendered only once
+	pixbuf_cache = PixbufCache()
 	
 	__gsignals__ = {
 			# Raised when mouse is over defined area
@@ -39,8 +86,8 @@ class SVGWidget(Gtk.EventBox):
 	
 	def __init__(self, filename, init_hilighted=True):
 		Gtk.EventBox.__init__(self)
-		self.cache = OrderedDict()
 		self.areas = []
+		self.area_index = GridIndex(self.areas)
 		
 		self.connect("motion-notify-event", self.on_mouse_moved)
 		self.connect("button-press-event", self.on_mouse_click)
@@ -59,11 +106,29 @@ class SVGWidget(Gtk.EventBox):
 	
 	def set_image(self, filename):
 		self.current_svg = open(filename, "r").read()
-		self.cache = OrderedDict()
 		self.areas = []
+		self.svg_changed()
 		self.parse_image()
 	
 	
+	def svg_changed(self):
+		"""
+		Drops everything parsed from current_svg.
+		Has to be called whenever current_svg is changed.
+		"""
+		self._image_key = hashlib.sha1(self._get_svg_data()).hexdigest()
+		self._tree = None
+		self._elements = None
+		self._handle = None
+		self._rects = {}
+	
+	
+	def _get_svg_data(self):
+		if type(self.current_svg) == str:
+			return self.current_svg.encode('utf-8')
+		return self.current_svg
+	
+	
 	def parse_image(self):
 		"""
 		Goes trought SVG image, searches for all rects named
@@ -73,6 +138,7 @@ class SVGWidget(Gtk.EventBox):
 		"""
 		tree = ET.fromstring(self.current_svg.encode("utf-8"))
 		SVGWidget.find_areas(tree, None, self.areas)
+		self.area_index = GridIndex(self.areas)
 		self.image_width =  float(tree.attrib["width"])
 		self.image_height = float(tree.attrib["height"])
 	
@@ -80,11 +146,9 @@ class SVGWidget(Gtk.EventBox):
 	def resize(self, width, height):
 		"""
 		Overrides image size.
-		Doesn't keep aspect ratio and causes cache to be flushed,
-		so this may be slow and nasty.
+		Doesn't keep aspect ratio.
 		"""
 		self.size_override = width, height
-		self.cache = OrderedDict()
 	
 	
 	def on_mouse_click(self, trash, event):
@@ -100,10 +164,10 @@ class SVGWidget(Gtk.EventBox):
 		x_offset = (self.get_allocation().width - self.image_width) / 2
 		x = event.x - x_offset
 		y = event.y
-		for a in self.areas:
-			if a.contains(x, y):
-				self.emit('hover', a.name)
-				return a.name
+		a = self.area_index.find(x, y)
+		if a is not None:
+			self.emit('hover', a.name)
+			return a.name
 		self.emit('leave')
 		return None
 	
@@ -195,39 +259,149 @@ class SVGWidget(Gtk.EventBox):
 	
 	
 	def hilight(self, buttons):
-		""" Hilights specified button, if same ID is found in svg """
-		cache_id = "|".join([ "%s:%s" % (x, buttons[x]) for x in buttons ])
-		if not cache_id in self.cache:
-			# Ok, this is close to madness, but probably better than drawing
-			# 200 images by hand;
+		"""
+		Hilights specified button, if same ID is found in svg.
+		
+		Image without anything hilighted is rendered only once and every
+		hilighted element is rendered separately, only in area it occupies,
+		and drawn over it. All of them, along with resulting images,
+		are kept in pixbuf_cache.
+		"""
+		size = self._get_size()
+		key = (self._image_key, size, tuple(sorted(buttons.items())))
+		pixbuf = self.pixbuf_cache.get(key)
+		if pixbuf is None:
 			if len(buttons) == 0:
 				# Quick way out - changes are not needed
-				tmp = self.current_svg.encode('utf-8') if type(self.current_svg) == str else self.current_svg
-				svg = Rsvg.Handle.new_from_data(tmp)
-			else:
-				# 1st, parse source as XML
-				tree = ET.fromstring(self.current_svg)
-				# 2nd, change colors of some elements
-				for button in buttons:
-					el = SVGEditor.find_by_id(tree, button)
-					if el is not None:
-						SVGEditor.recolor(el, buttons[button])
-					
-				# 3rd, turn it back into XML string......
-				xml = ET.tostring(tree)
-				
-				# ... and now, parse that as XML again......
-				svg = Rsvg.Handle.new_from_data(xml)
-			while len(self.cache) >= self.CACHE_SIZE:
-				self.cache.popitem(False)
-			if self.size_override:
-				w, h = self.size_override
-				self.cache[cache_id] = svg.get_pixbuf().scale_simple(
-						w, h, GdkPixbuf.InterpType.BILINEAR)
+				pixbuf = self._render(self._get_handle(), size)
 			else:
-				self.cache[cache_id] = svg.get_pixbuf()
+				pixbuf = self._render_hilighted(buttons, size)
+			self.pixbuf_cache.put(key, pixbuf)
+		self.image.set_from_pixbuf(pixbuf)
+	
+	
+	def _get_handle(self):
+		""" Returns Rsvg.Handle of current image, without any changes """
+		if self._handle is None:
+			self._handle = Rsvg.Handle.new_from_data(self._get_svg_data())
+		return self._handle
+	
+	
+	def _get_size(self):
+		if self.size_override:
+			return tuple(self.size_override)
+		dims = self._get_handle().get_dimensions()
+		return dims.width, dims.height
+	
+	
+	def _render(self, handle, size, rect=None):
+		"""
+		Renders image scaled to 'size'. If 'rect' is set, only that part
+		of scaled image is rendered.
+		"""
+		width, height = size
+		x, y, w, h = rect or (0, 0, width, height)
+		dims = handle.get_dimensions()
+		surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+		ctx = cairo.Context(surface)
+		ctx.translate(-x, -y)
+		ctx.scale(float(width) / dims.width, float(height) / dims.height)
+		handle.render_cairo(ctx)
+		return Gdk.pixbuf_get_from_surface(surface, 0, 0, w, h)
+	
+	
+	def _get_elements(self):
+		""" Returns dict of all elements with ID, parsing image only once """
+		if self._tree is None:
+			self._tree = ET.fromstring(self._get_svg_data())
+			self._elements = {}
+			for el in self._tree.iter():
+				if 'id' in el.attrib:
+					self._elements.setdefault(el.attrib['id'], el)
+		return self._elements
+	
+	
+	def _render_recolored(self, buttons, size, rect=None):
+		"""
+		Recolors elements on parsed image, renders it and changes
+		colors back, so image doesn't have to be parsed again.
+		"""
+		elements = self._get_elements()
+		original = []
+		for button in buttons:
+			el = elements.get(button)
+			if el is not None:
+				original += [ (e, e.attrib.get('style')) for e in el.iter() ]
+				SVGEditor.recolor(el, buttons[button])
+		try:
+			handle = Rsvg.Handle.new_from_data(ET.tostring(self._tree))
+		finally:
+			for e, style in reversed(original):
+				if style is None:
+					e.attrib.pop('style', None)
+				else:
+					e.attrib['style'] = style
+		return self._render(handle, size, rect)
+	
+	
+	def _get_rect(self, id, size):
+		"""
+		Returns (x, y, width, height) of area occupied by element on image
+		scaled to 'size' or None if element is not visible.
+		"""
+		key = id, size
+		if key not in self._rects:
+			self._rects[key] = None
+			handle = self._get_handle()
+			has_position, position = handle.get_position_sub("#" + id)
+			has_dimensions, dimensions = handle.get_dimensions_sub("#" + id)
+			if has_position and has_dimensions:
+				dims = handle.get_dimensions()
+				width, height = size
+				sx, sy = float(width) / dims.width, float(height) / dims.height
+				x1 = max(0, int(position.x * sx) - self.LAYER_PADDING)
+				y1 = max(0, int(position.y * sy) - self.LAYER_PADDING)
+				x2 = min(width, int(ceil((position.x + dimensions.width) * sx)) + self.LAYER_PADDING)
+				y2 = min(height, int(ceil((position.y + dimensions.height) * sy)) + self.LAYER_PADDING)
+				if x2 > x1 and y2 > y1:
+					self._rects[key] = x1, y1, x2 - x1, y2 - y1
+		return self._rects[key]
+	
+	
+	def _render_hilighted(self, buttons, size):
+		elements = self._get_elements()
+		rects = []
+		for button in buttons:
+			if button not in elements:
+				# Not in image, nothing to hilight
+				continue
+			rect = self._get_rect(button, size)
+			if rect is None or any([ SVGWidget._overlaps(rect, r) for b, r in rects ]):
+				# Layers can't be drawn over each other if they overlap
+				# or if element position is not known
+				return self._render_recolored(buttons, size)
+			rects.append(( button, rect ))
 		
-		self.image.set_from_pixbuf(self.cache[cache_id])
+		base_key = (self._image_key, size, ())
+		base = self.pixbuf_cache.get(base_key)
+		if base is None:
+			base = self._render(self._get_handle(), size)
+			self.pixbuf_cache.put(base_key, base)
+		pixbuf = base.copy()
+		for button, (x, y, w, h) in rects:
+			key = (self._image_key, size, button, buttons[button])
+			layer = self.pixbuf_cache.get(key)
+			if layer is None:
+				layer = self._render_recolored({ button : buttons[button] }, size, (x, y, w, h))
+				self.pixbuf_cache.put(key, layer)
+			layer.copy_area(0, 0, w, h, pixbuf, x, y)
+		return pixbuf
+	
+	
+	@staticmethod
+	def _overlaps(a, b):
+		return (a[0] < b[0] + b[2] and b[0] < a[0] + a[2]
+			and a[1] < b[1] + b[3] and b[1] < a[1] + a[3])
 	
 	
 	def get_pixbuf(self):
@@ -293,7 +467,7 @@ class SVGEditor(object):
 		Return self.
 		"""
 		self._svgw.current_svg = ET.tostring(self._tree)
-		self._svgw.cache = OrderedDict()
+		self._svgw.svg_changed()
 		self._svgw.hilight({})
 		
 		return self
@@ -29,7 +29,9 @@ class Mapper(object):
 		Emulated gamepad will have rumble enabled only if poller is set to
 		instance and configuration allows it.
 		"""
-		self.profile = profile
+		self._profile = profile
+		self._profile_serial = 0
+		self._plan = None						# see _compile_profile
 		self.controller = None
 		self.xdisplay = None
 		self.scheduler = scheduler
@@ -43,6 +45,13 @@ class Mapper(object):
 		self.gamepad = self.create_gamepad(gamepad, poller) if gamepad else Dummy()
 		log.debug("Gamepad:  %s" % (self.gamepad, ))
 		
+		# Events generated while processing input are written to uinput
+		# devices only once, in sync()
+		self._batched = [ x for x in (self.keyboard, self.mouse, self.gamepad)
+				if isinstance(x, UInput) ]
+		for dev in self._batched:
+			dev.set_batching(True)
+		
 		# Set by SCCDaemon instance; Used to handle actions
 		# from scc.special_actions
 		self._sa_handler = None
@@ -59,6 +68,9 @@ class Mapper(object):
 		self.state, self.old_state = None, None
 		self.force_event = set()
 		self.time_elapsed = 0.0
+		self.tracer = None						# see scc.tracing
+		self.recorder = None					# see scc.recorder
+		self.state_ring = None					# see scc.statering
 	
 	
 	def create_gamepad(self, enabled, poller):
@@ -68,7 +80,7 @@ class Mapper(object):
 			# If set, no gamepad is emulated
 			self.gamepad = Dummy()
 			return
-		cfg = Config()
+		cfg = Config.shared()
 		keys = ALL_BUTTONS[0:cfg["output"]["buttons"]]
 		vendor = int(cfg["output"]["vendor"], 16)
 		product = int(cfg["output"]["product"], 16)
@@ -125,16 +137,50 @@ class Mapper(object):
 	
 	
 	def sync(self):
-		""" Syncs generated events """
+		""" Syncs generated events and writes them to virtual devices """
 		if len(self.syn_list):
 			for dev in self.syn_list:
 				dev.synEvent()
 			self.syn_list = set()
+		for dev in self._batched:
+			dev.flush()
+	
+	
+	@property
+	def profile(self):
+		return self._profile
+	
+	
+	@profile.setter
+	def profile(self, profile):
+		self._profile = profile
+		self.profile_changed()
+	
+	
+	def profile_changed(self):
+		"""
+		Has to be called after any action in current profile is replaced.
+		Not needed when new profile is assigned.
+		"""
+		self._profile_serial += 1
+	
+	
+	def _compile_profile(self):
+		"""
+		Generates dispatch plan from current profile and flags of
+		current controller. Returns generated plan.
+		"""
+		serial = self._profile_serial
+		flags = self.controller.flags if self.controller else 0
+		self._plan = self._profile.compile(flags)
+		self._plan.serial = serial
+		return self._plan
 	
 	
 	def set_controller(self, c):
 		""" Sets controller device, used by some (one so far) actions """
 		self.controller = c
+		self._plan = None
 	
 	
 	def get_controller(self):
@@ -158,6 +204,34 @@ class Mapper(object):
 		return self.xdisplay
 	
 	
+	def set_tracer(self, tracer):
+		"""
+		Sets scc.tracing.Tracer instance used to measure time spent
+		processing input. None disables measuring.
+		"""
+		self.tracer = tracer
+	
+	
+	def set_recorder(self, recorder):
+		"""
+		Sets scc.recorder.Recorder instance used to record every input.
+		Previously set recorder is closed. None disables recording.
+		"""
+		if self.recorder:
+			self.recorder.close()
+		self.recorder = recorder
+	
+	
+	def set_state_ring(self, ring):
+		"""
+		Sets scc.statering.StateRing instance where every input is published.
+		Previously set ring is closed. None disables publishing.
+		"""
+		if self.state_ring:
+			self.state_ring.close()
+		self.state_ring = ring
+	
+	
 	def get_current_window(self):
 		"""
 		Returns window id of current window or None if xdisplay is not set
@@ -353,6 +427,17 @@ class Mapper(object):
 	
 	
 	def input(self, controller, old_state, state):
+		tr = self.tracer
+		if tr: tr.begin(controller.input_received)
+		if self.recorder:
+			self.recorder.record(controller, state)
+		if self.state_ring:
+			self.state_ring.publish(controller, state)
+		
+		plan = self._plan
+		if plan is None or plan.serial != self._profile_serial:
+			plan = self._compile_profile()
+		
 		# Store states
 		self.old_state = old_state
 		self.old_buttons = self.buttons
@@ -363,7 +448,7 @@ class Mapper(object):
 		t = time.time()
 		controller.time_elapsed = self.time_elapsed = t - controller.lastTime
 		controller.lastTime = t
-
+		
 		if self.buttons & SCButtons.LPAD and not self.buttons & (SCButtons.LPADTOUCH | STICKTILT):
 			self.buttons = (self.buttons & ~SCButtons.LPAD) | SCButtons.STICKPRESS
 		
@@ -376,74 +461,99 @@ class Mapper(object):
 		btn_add = xor & self.buttons
 		
 		try:
-			if btn_add or btn_rem:
-				# At least one button was pressed
-				for x in self.profile.buttons:
-					if x & btn_add:
-						self.profile.buttons[x].button_press(self)
-					elif x & btn_rem:
-						self.profile.buttons[x].button_release(self)
+			changed = xor & plan.button_mask
+			if changed:
+				# At least one bound button was pressed or released
+				if changed & (changed - 1) == 0:
+					# Exactly one
+					a = plan.button_table[changed]
+					if changed & btn_add:
+						a.button_press(self)
+					else:
+						a.button_release(self)
+					if tr: tr.action(a)
+				else:
+					for x, a in plan.buttons:
+						if x & btn_add:
+							a.button_press(self)
+							if tr: tr.action(a)
+						elif x & btn_rem:
+							a.button_release(self)
+							if tr: tr.action(a)
 			
 			
 			# Check stick
-			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
-				if FE_STICK in fe or self.old_state.stick_x != state.stick_x or self.old_state.stick_y != state.stick_y:
-					self.profile.stick.whole(self, state.stick_x, state.stick_y, STICK)
-			elif not self.buttons & SCButtons.LPADTOUCH:
-				if FE_STICK in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
-					self.profile.stick.whole(self, state.lpad_x, state.lpad_y, STICK)
+			if plan.stick:
+				if plan.separate_stick:
+					if FE_STICK in fe or old_state.stick_x != state.stick_x or old_state.stick_y != state.stick_y:
+						plan.stick.whole(self, state.stick_x, state.stick_y, STICK)
+						if tr: tr.action(plan.stick)
+				elif not self.buttons & SCButtons.LPADTOUCH:
+					if FE_STICK in fe or old_state.lpad_x != state.lpad_x or old_state.lpad_y != state.lpad_y:
+						plan.stick.whole(self, state.lpad_x, state.lpad_y, STICK)
+						if tr: tr.action(plan.stick)
 			
 			# Check gyro
-			if controller.get_gyro_enabled():
-				self.profile.gyro.gyro(self, state.gpitch, state.gyaw, state.groll, state.q1, state.q2, state.q3, state.q4)
+			if plan.gyro and controller.get_gyro_enabled():
+				plan.gyro.gyro(self, state.gpitch, state.gyaw, state.groll, state.q1, state.q2, state.q3, state.q4)
+				if tr: tr.action(plan.gyro)
 			
 			# Check triggers
-			if FE_TRIGGER in fe or state.ltrig != self.old_state.ltrig:
-				if LEFT in self.profile.triggers:
-					self.profile.triggers[LEFT].trigger(self, state.ltrig, self.old_state.ltrig)
-			if FE_TRIGGER in fe or state.rtrig != self.old_state.rtrig:
-				if RIGHT in self.profile.triggers:
-					self.profile.triggers[RIGHT].trigger(self, state.rtrig, self.old_state.rtrig)
+			if plan.ltrig and (FE_TRIGGER in fe or state.ltrig != old_state.ltrig):
+				plan.ltrig.trigger(self, state.ltrig, old_state.ltrig)
+				if tr: tr.action(plan.ltrig)
+			if plan.rtrig and (FE_TRIGGER in fe or state.rtrig != old_state.rtrig):
+				plan.rtrig.trigger(self, state.rtrig, old_state.rtrig)
+				if tr: tr.action(plan.rtrig)
 			
 			# Check pads
 			# RPAD
-			if controller.flags & ControllerFlags.HAS_RSTICK:
-				if FE_PAD in fe or self.old_state.rpad_x != state.rpad_x or self.old_state.rpad_y != state.rpad_y:
-					self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
-			elif FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
-				self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
+			if plan.rpad:
+				if plan.has_rstick:
+					if FE_PAD in fe or old_state.rpad_x != state.rpad_x or old_state.rpad_y != state.rpad_y:
+						plan.rpad.whole(self, state.rpad_x, state.rpad_y, RIGHT)
+						if tr: tr.action(plan.rpad)
+				elif FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
+					plan.rpad.whole(self, state.rpad_x, state.rpad_y, RIGHT)
+					if tr: tr.action(plan.rpad)
 			
 			# LPAD
-			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
-				if FE_PAD in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
-					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
+			if plan.separate_stick:
+				if plan.lpad and (FE_PAD in fe or old_state.lpad_x != state.lpad_x or old_state.lpad_y != state.lpad_y):
+					plan.lpad.whole(self, state.lpad_x, state.lpad_y, LEFT)
+					if tr: tr.action(plan.lpad)
 			else:
 				if self.buttons & SCButtons.LPADTOUCH:
 					# Pad is being touched now
 					if not self.lpad_touched:
 						self.lpad_touched = True
-					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
-					if self.old_state.buttons & STICKTILT and not self.buttons & STICKTILT:
+					if plan.lpad:
+						plan.lpad.whole(self, state.lpad_x, state.lpad_y, LEFT)
+						if tr: tr.action(plan.lpad)
+					if plan.stick and old_state.buttons & STICKTILT and not self.buttons & STICKTILT:
 						# LPAD and stick share axes and so when they are used simultaneously (by someone with 3 hands or so :)
 						# this is how mapper can tell that stick was recentered
-						self.profile.stick.whole(self, 0, 0, STICK)
+						plan.stick.whole(self, 0, 0, STICK)
 				elif not self.buttons & STICKTILT:
 					# Pad is not being touched
 					if self.lpad_touched:
 						self.lpad_touched = False
-						self.profile.pads[LEFT].whole(self, 0, 0, LEFT)
+						if plan.lpad:
+							plan.lpad.whole(self, 0, 0, LEFT)
+							if tr: tr.action(plan.lpad)
 					
 			# CPAD (touchpad on DS4 controller)
-			if controller.flags & ControllerFlags.HAS_CPAD:
+			if plan.cpad:
 				if ((FE_PAD in fe)
-						or (self.old_state.cpad_x != state.cpad_x)
-						or (self.old_state.cpad_y != state.cpad_y)
+						or (old_state.cpad_x != state.cpad_x)
+						or (old_state.cpad_y != state.cpad_y)
 						or ((self.old_buttons & SCButtons.CPADTOUCH) and not (self.buttons & SCButtons.CPADTOUCH))
 					):
 					if self.buttons & SCButtons.CPADTOUCH:
-						self.profile.pads[CPAD].whole(self, state.cpad_x, state.cpad_y, CPAD)
+						plan.cpad.whole(self, state.cpad_x, state.cpad_y, CPAD)
 					elif self.old_buttons & SCButtons.CPADTOUCH:
-						self.profile.pads[CPAD].whole(self, 0, 0, CPAD)
+						plan.cpad.whole(self, 0, 0, CPAD)
+					if tr: tr.action(plan.cpad)
 		except Exception:
 			# Log error but don't crash here, it breaks too many things at once
 			if hasattr(self, "_testing"):
@@ -451,10 +561,15 @@ class Mapper(object):
 			log.error("Error while processing controller event")
 			log.error(traceback.format_exc())
 		
+		if tr: tr.stage("input")
+		
 		# TODO: Is it important to run scheduled stuff before generate_events?
 		self.scheduler.run()
+		if tr: tr.stage("scheduler")
 		self.generate_events()
+		if tr: tr.stage("events")
 		self.generate_feedback()
+		if tr: tr.end()
 	
 	
 	def generate_events(self):
@@ -859,6 +859,19 @@ class ModeModifier(Modifier):
 				self.checks.append(( self.make_button_check(c), action ))
 	
 	
+	def __getstate__(self):
+		# Checks are closures and can't be pickled, see ProfileCache
+		state = self.__dict__.copy()
+		del state["checks"]
+		del state["shell_commands"]
+		return state
+	
+	
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.make_checks()
+	
+	
 	def get_child_actions(self):
 		rv = list(self.mods.values()) + list(self.shell_commands.values())
 		if self.default is not None:
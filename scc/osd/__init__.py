@@ -36,15 +36,20 @@ class OSDWindow(Gtk.Window):
 	
 	EPILOG = ""
 	css_provider = None			# Used by staticmethods
+	css_key = None				# Settings used to generate css_provider
+	_argparsers = {}			# Parsers are created only once per class
 	
 	def __init__(self, wmclass, layer = None):
 		Gtk.Window.__init__(self)
-		OSDWindow._apply_css(Config())
+		OSDWindow._apply_css(Config.shared())
 		
-		self.argparser = argparse.ArgumentParser(description=__doc__,
-			formatter_class=argparse.RawDescriptionHelpFormatter,
-			epilog=self.EPILOG)
-		self._add_arguments()
+		if self.__class__ not in OSDWindow._argparsers:
+			self.argparser = argparse.ArgumentParser(description=__doc__,
+				formatter_class=argparse.RawDescriptionHelpFormatter,
+				epilog=self.EPILOG)
+			self._add_arguments()
+			OSDWindow._argparsers[self.__class__] = self.argparser
+		self.argparser = OSDWindow._argparsers[self.__class__]
 		self.exit_code = -1
 		self.position = (20, -20)
 		self.mainloop = None
@@ -76,6 +81,16 @@ class OSDWindow(Gtk.Window):
 	
 	@staticmethod
 	def _apply_css(config):
+		"""
+		Generates CSS from style and colors in config and applies it
+		to all windows. Does nothing if those didn't change since last call.
+		"""
+		key = (config["osd_style"],
+			tuple(sorted(config['osd_colors'].items())),
+			tuple(sorted(config['osk_colors'].items())))
+		if key == OSDWindow.css_key:
+			return
+		OSDWindow.css_key = key
 		if OSDWindow.css_provider:
 			Gtk.StyleContext.remove_provider_for_screen(
 				Gdk.Screen.get_default(), OSDWindow.css_provider)
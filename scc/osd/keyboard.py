@@ -8,7 +8,7 @@ Display menu that user can navigate through and print chosen item id to stdout
 from __future__ import unicode_literals
 from scc.tools import _, set_logging_level
 
-from gi.repository import Gtk, Gdk, GdkX11, GObject, GLib, GdkPixbuf, cairo
+from gi.repository import Gtk, Gdk, GdkX11, GObject, GLib, GdkPixbuf
 from xml.etree import ElementTree as ET
 from scc.constants import LEFT, RIGHT, STICK, STICK_PAD_MIN, STICK_PAD_MAX
 from scc.constants import STICK_PAD_MIN_HALF, STICK_PAD_MAX_HALF, CPAD
@@ -25,6 +25,7 @@ from scc.config import Config
 from scc.uinput import Keys
 from scc.lib import xwrappers as X
 from scc.gui.svg_widget import SVGWidget, SVGEditor
+from scc.gridindex import GridIndex
 from scc.gui.keycode_to_key import KEY_TO_KEYCODE
 from scc.gui.daemon_manager import DaemonManager, ControllerManager
 from scc.gui.gdk_to_key import KEY_TO_GDK
@@ -33,7 +34,7 @@ from scc.osd.slave_mapper import SlaveMapper
 from scc.osd import OSDWindow
 import scc.osd.osk_actions
 
-import os, sys, json, logging
+import os, sys, json, logging, cairo
 log = logging.getLogger("osd.keyboard")
 
 SPECIAL_KEYS = {
@@ -48,7 +49,15 @@ SPECIAL_KEYS = {
 
 
 class KeyboardImage(Gtk.DrawingArea):
+	"""
+	Everything what doesn't change while keyboard is used (keys, labels,
+	overlay and help) is drawn only once into cached surface. Only keys
+	that are hilighted or pressed are then drawn over it and only area
+	of key that changed is redrawn.
+	"""
 	LINE_WIDTH = 2
+	FONT_SIZE = 48
+	HELP_FONT_SIZE = 16
 	
 	__gsignals__ = {}
 	
@@ -74,6 +83,9 @@ class KeyboardImage(Gtk.DrawingArea):
 		self._hilight = ()
 		self._pressed = ()
 		self._button_images = {}
+		self._label_positions = {}
+		self._cache = None
+		self._cache_key = None
 		self._help_areas = [ self.get_limit("HELP_LEFT"), self.get_limit("HELP_RIGHT") ]
 		self._help_lines = ( [], [] )
 		
@@ -89,6 +101,7 @@ class KeyboardImage(Gtk.DrawingArea):
 		log.debug("Using font %s", self.font_face)
 		
 		self.buttons = [ Button(self.tree, area) for area in areas ]
+		self.button_index = GridIndex(self.buttons)
 		background = SVGEditor.find_by_id(self.tree, "BACKGROUND")
 		self.set_size_request(*SVGEditor.get_size(background))
 		self.overlay.edit().keep("overlay").commit()
@@ -97,14 +110,31 @@ class KeyboardImage(Gtk.DrawingArea):
 	
 	
 	def hilight(self, hilight, pressed):
+		changed = (set(self._hilight) ^ set(hilight)) | (set(self._pressed) ^ set(pressed))
 		self._hilight = hilight
 		self._pressed = pressed
+		for button in changed:
+			self.queue_draw_button(button)
+	
+	
+	def queue_draw_button(self, button):
+		""" Redraws only area of one key, including its border """
+		x, y, w, h = button
+		lw = self.LINE_WIDTH
+		self.queue_draw_area(int(x - lw), int(y - lw),
+			int(w + 2 * lw) + 2, int(h + 2 * lw) + 2)
+	
+	
+	def invalidate(self):
+		""" Drops cached image of keyboard and redraws everything """
+		self._cache = None
+		self._label_positions = {}
 		self.queue_draw()
 	
 	
 	def set_help(self, left, right):
 		self._help_lines = ( left, right )
-		self.queue_draw()
+		self.invalidate()
 	
 	
 	def set_labels(self, labels):
@@ -115,7 +145,7 @@ class KeyboardImage(Gtk.DrawingArea):
 			elif label:
 				#b.label = label.encode("utf-8")
 				b.label = label
-		self.queue_draw()
+		self.invalidate()
 	
 	
 	def get_limit(self, id):
@@ -176,48 +206,88 @@ class KeyboardImage(Gtk.DrawingArea):
 	
 	
 	def on_draw(self, self2, ctx):
-		ctx.select_font_face(self.font_face, 0, 0)
+		width, height = self.get_allocated_width(), self.get_allocated_height()
+		key = (width, height, self.color_button1, self.color_button1_border,
+			self.color_button2, self.color_text)
+		if self._cache is None or self._cache_key != key:
+			self._cache = ctx.get_target().create_similar(
+				cairo.CONTENT_COLOR_ALPHA, width, height)
+			self._cache_key = key
+			self._draw_static(cairo.Context(self._cache))
 		
+		ctx.set_source_surface(self._cache, 0, 0)
+		ctx.paint()
+		
+		if self._hilight or self._pressed:
+			self._setup_font(ctx)
+			overlay = self.overlay.get_pixbuf()
+			lw = self.LINE_WIDTH
+			for button in set(self._hilight) | set(self._pressed):
+				if button in self._pressed:
+					self._draw_button(ctx, button, self.color_pressed)
+				else:
+					self._draw_button(ctx, button, self.color_hilight)
+				# Overlay has to stay above key
+				x, y, w, h = button
+				ctx.save()
+				ctx.rectangle(x - lw, y - lw, w + 2 * lw, h + 2 * lw)
+				ctx.clip()
+				Gdk.cairo_set_source_pixbuf(ctx, overlay, 0, 0)
+				ctx.paint()
+				ctx.restore()
+	
+	
+	def _setup_font(self, ctx):
+		ctx.select_font_face(self.font_face, 0, 0)
 		ctx.set_line_width(self.LINE_WIDTH)
-		ctx.set_font_size(48)
-		ascent, descent, height, max_x_advance, max_y_advance = ctx.font_extents()
+		ctx.set_font_size(self.FONT_SIZE)
+	
+	
+	def _draw_button(self, ctx, button, color):
+		""" Draws single key. Font has to be set by _setup_font """
+		ctx.set_source_rgba(*color)
+		# filled rectangle
+		x, y, w, h = button
+		ctx.move_to(x, y)
+		ctx.line_to(x + w, y)
+		ctx.line_to(x + w, y + h)
+		ctx.line_to(x, y + h)
+		ctx.line_to(x, y)
+		ctx.fill()
+		
+		# border
+		ctx.set_source_rgba(*self.color_button1_border)
+		ctx.move_to(x, y)
+		ctx.line_to(x + w, y)
+		ctx.line_to(x + w, y + h)
+		ctx.line_to(x, y + h)
+		ctx.line_to(x, y)
+		ctx.stroke()
+		
+		# label
+		if button.label:
+			if button not in self._label_positions:
+				ascent, descent, height, max_x_advance, max_y_advance = ctx.font_extents()
+				extents = ctx.text_extents(button.label)
+				x_bearing, y_bearing, width, trash, x_advance, y_advance = extents
+				self._label_positions[button] = (
+					x + w * 0.5 - width * 0.5 - x_bearing, y + h * 0.5 + height * 0.3)
+			ctx.set_source_rgba(*self.color_text)
+			ctx.move_to(*self._label_positions[button])
+			ctx.show_text(button.label)
+			ctx.stroke()
+	
+	
+	def _draw_static(self, ctx):
+		""" Draws keys in their normal state, overlay and help """
+		self._setup_font(ctx)
 		
 		# Buttons
 		for button in self.buttons:
-			if button in self._pressed:
-				ctx.set_source_rgba(*self.color_pressed)
-			elif button in self._hilight:
-				ctx.set_source_rgba(*self.color_hilight)
-			elif button.dark:
-				ctx.set_source_rgba(*self.color_button2)
+			if button.dark:
+				self._draw_button(ctx, button, self.color_button2)
 			else:
-				ctx.set_source_rgba(*self.color_button1)
-			# filled rectangle
-			x, y, w, h = button
-			ctx.move_to(x, y)
-			ctx.line_to(x + w, y)
-			ctx.line_to(x + w, y + h)
-			ctx.line_to(x, y + h)
-			ctx.line_to(x, y)
-			ctx.fill()
-			
-			# border
-			ctx.set_source_rgba(*self.color_button1_border)
-			ctx.move_to(x, y)
-			ctx.line_to(x + w, y)
-			ctx.line_to(x + w, y + h)
-			ctx.line_to(x, y + h)
-			ctx.line_to(x, y)
-			ctx.stroke()
-			
-			# label
-			if button.label:
-				ctx.set_source_rgba(*self.color_text)
-				extents = ctx.text_extents(button.label)
-				x_bearing, y_bearing, width, trash, x_advance, y_advance = extents
-				ctx.move_to(x + w * 0.5 - width * 0.5 - x_bearing, y + h * 0.5 + height * 0.3)
-				ctx.show_text(button.label)
-				ctx.stroke()
+				self._draw_button(ctx, button, self.color_button1)
 		
 		# Overlay
 		Gdk.cairo_set_source_pixbuf(ctx, self.overlay.get_pixbuf(), 0, 0)
@@ -225,7 +295,7 @@ class KeyboardImage(Gtk.DrawingArea):
 		
 		# Help
 		ctx.set_source_rgba(*self.color_text)
-		ctx.set_font_size(16)
+		ctx.set_font_size(self.HELP_FONT_SIZE)
 		ascent, descent, height, max_x_advance, max_y_advance = ctx.font_extents()
 		for left_right in (0, 1):
 			x, y, w, h = self._help_areas[left_right]
@@ -384,6 +454,9 @@ class Keyboard(OSDWindow, TimerManager):
 	
 	
 	def on_keymap_state_changed(self, x11keymap):
+		if self.background is None:
+			# Not displayed yet
+			return
 		if not self.timer_active('labels'):
 			self.timer('labels', 0.1, self.update_labels)
 	
@@ -635,16 +708,14 @@ class Keyboard(OSDWindow, TimerManager):
 		self.f.move(cursor,
 			x - cursor.get_allocation().width * 0.5,
 			y - cursor.get_allocation().height * 0.5)
-		for button in self.background.buttons:
-			if button.contains(x, y):
-				if button != self._hovers[cursor]:
-					self._hovers[cursor] = button
-					if self._pressed[cursor] is not None:
-						self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
-						self.key_from_cursor(cursor, True)
-					if not self.timer_active('update'):
-						self.timer('update', 0.01, self.update_background)
-					break
+		button = self.background.button_index.find(x, y)
+		if button is not None and button != self._hovers[cursor]:
+			self._hovers[cursor] = button
+			if self._pressed[cursor] is not None:
+				self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
+				self.key_from_cursor(cursor, True)
+			if not self.timer_active('update'):
+				self.timer('update', 0.01, self.update_background)
 	
 	
 	def update_background(self, *whatever):
@@ -678,16 +749,15 @@ class Keyboard(OSDWindow, TimerManager):
 		x, y = cursor.position
 		
 		if pressed:
-			for button in self.background.buttons:
-				if button.contains(x, y):
-					if button.name.startswith("KEY_") and hasattr(Keys, button.name):
-						key = getattr(Keys, button.name)
-						if self._pressed[cursor] is not None:
-							self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
-						self.mapper.keyboard.pressEvent([ key ])
-						self._pressed[cursor] = key
-						self._pressed_areas[cursor] = button
-					break
+			button = self.background.button_index.find(x, y)
+			if button is not None:
+				if button.name.startswith("KEY_") and hasattr(Keys, button.name):
+					key = getattr(Keys, button.name)
+					if self._pressed[cursor] is not None:
+						self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
+					self.mapper.keyboard.pressEvent([ key ])
+					self._pressed[cursor] = key
+					self._pressed_areas[cursor] = button
 		elif self._pressed[cursor] is not None:
 			self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
 			self._pressed[cursor] = None
@@ -10,11 +10,12 @@ Reuses styles from OSD Menu and OSD Dialog
 from __future__ import unicode_literals
 from scc.tools import _
 
-from gi.repository import Gtk, Gio, GdkX11, Pango
+from gi.repository import Gtk, Gio, GdkX11, GLib, Pango
 from scc.constants import STICK_PAD_MAX, DEFAULT, LEFT, RIGHT, STICK
 from scc.tools import point_in_gtkrect, circle_to_square, clamp
 from scc.gui.daemon_manager import DaemonManager
 from scc.osd import OSDWindow, StickController
+from scc.appindex import AppIndex
 from scc.paths import get_share_path
 from scc.lib import xwrappers as X
 from scc.config import Config
@@ -44,7 +45,7 @@ class Launcher(OSDWindow):
 	
 	MAX_ROWS = 5
 	
-	_app_db = None	# Static list of all know applications
+	_app_index = None	# Static index of all know applications
 	
 	def __init__(self, cls="osd-menu"):
 		self._buttons = None
@@ -77,37 +78,23 @@ class Launcher(OSDWindow):
 		self._confirm_with = 'A'
 		self._cancel_with = 'B'
 		
-		if Launcher._app_db is None:
-			Launcher._app_db = []
+		if Launcher._app_index is None:
 			for x in Launcher.BUTTONS:
 				for c in x:
 					Launcher.CHAR_TO_NUMBER[c] = x[0]
 			
-			for x in Gio.AppInfo.get_all():
-				try:
-					Launcher._app_db.append(( Launcher.name_to_keys(x), x ))
-				except UnicodeDecodeError:
-					# Just fuck them...
-					pass
+			Launcher._app_index = AppIndex({ c : Launcher.CHAR_TO_NUMBER[c]
+				for c in Launcher.VALID_CHARS })
+			if not Launcher._app_index.load():
+				Launcher._app_index.rebuild(Launcher.list_applications())
 	
 	
 	@staticmethod
-	def name_to_keys(appinfo):
-		name = "".join([
-			Launcher.CHAR_TO_NUMBER[x]
-			for x in appinfo.get_display_name().upper()
-			if x in Launcher.VALID_CHARS
-		])
-		return name
-	
-	
-	@staticmethod
-	def string_to_keys_and_spaces(string):
-		name = "".join([
-			Launcher.CHAR_TO_NUMBER[x] if x in Launcher.VALID_CHARS else " "
-			for x in string.upper()
-		])
-		return name
+	def list_applications():
+		""" Yields (id, display_name) of every installed application """
+		for x in Gio.AppInfo.get_all():
+			if x.get_id() and x.get_display_name():
+				yield x.get_id(), x.get_display_name()
 	
 	
 	def create_parent(self):
@@ -194,7 +181,13 @@ class Launcher(OSDWindow):
 	
 	
 	def _launch(self):
-		self._selected.launcher.launch()
+		app = self._selected.launcher
+		appinfo = Gio.DesktopAppInfo.new(app.id)
+		if appinfo is None:
+			log.error("Application '%s' not found", app.id)
+			return
+		appinfo.launch([], None)
+		self._app_index.launched(app.id)
 	
 	
 	def _add_arguments(self):
@@ -239,51 +232,20 @@ class Launcher(OSDWindow):
 			label.set_xalign(0)
 	
 	
-	def _format_label_markup(self, label):
-		if hasattr(label, "get_display_name"):
-			label = label.get_display_name()
-		else:
-			label = str(label)
-		
-		def _check(substr):
-			i, ch = 0, self._string
-			while len(substr) > 0 and substr[0] == ch[0]:
-				ch = ch[1:]
-				substr = substr[1:]
-				i += 1
-				if len(ch) == 0: return i
-			while len(substr) > 0 and substr[0] == " ":
-				substr = substr[1:]
-				i += 1
-			return -1
-			
-		keys = Launcher.string_to_keys_and_spaces(label)
-		index1, index2 = -1, -1
-		for i in range(0, len(keys)):
-			if keys[i] == self._string[0]:
-				index2 = _check(keys[i:])
-				if index2 > 0:
-					index1 = i
-					index2 = i + index2
-					break
-		
+	def _format_label_markup(self, app):
+		index1, index2 = self._app_index.match(app, self._string)
 		label = "%s<span color='#%s'>%s</span>%s" % (
-			label[0:index1],
+			GLib.markup_escape_text(app.name[0:index1]),
 			self.config["osd_colors"]["menuitem_hilight_text"],
-			label[index1:index2],
-			label[index2:]
+			GLib.markup_escape_text(app.name[index1:index2]),
+			GLib.markup_escape_text(app.name[index2:])
 		)
 		return label
 	
 	
 	def _update_items(self):
 		if len(self._string) > 0:
-			gen = ( item for (keys, item) in self._app_db if self._string in keys )
-			launchers = []
-			for i in gen:
-				launchers.append(i)
-				if len(launchers) > self.MAX_ROWS: break
-			self._set_launchers(launchers)
+			self._set_launchers(self._app_index.search(self._string))
 			self.select(0)
 		else:
 			self._set_launchers([])
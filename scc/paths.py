@@ -143,3 +143,36 @@ def get_daemon_socket():
 	~/.config/scc/daemon.socket under normal conditions.
 	"""
 	return os.path.join(get_config_path(), "daemon.socket")
+
+
+def get_cache_path():
+	"""
+	Returns directory for files that can be regenerated when deleted.
+	~/.cache/scc under normal conditions.
+	"""
+	cachedir = os.path.expanduser("~/.cache")
+	if "XDG_CACHE_HOME" in os.environ:
+		cachedir = os.environ['XDG_CACHE_HOME']
+	return os.path.join(cachedir, "scc")
+
+
+def get_runtime_path():
+	"""
+	Returns directory for files that exist only while daemon is running.
+	$XDG_RUNTIME_DIR/scc under normal conditions, or configuration
+	directory if XDG_RUNTIME_DIR is not set.
+	"""
+	if "XDG_RUNTIME_DIR" in os.environ:
+		return os.path.join(os.environ["XDG_RUNTIME_DIR"], "scc")
+	return get_config_path()
+
+
+def get_state_ring_path(controller_id):
+	"""
+	Returns path to file where daemon publishes state of controller.
+	See scc.statering.
+	
+	$XDG_RUNTIME_DIR/scc/<controller_id>.state under normal conditions.
+	"""
+	return os.path.join(get_runtime_path(),
+		"%s.state" % (controller_id.replace("/", "_"),))
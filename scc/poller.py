@@ -2,13 +2,17 @@
 """
 SC-Controller - Poller
 
-Uses select to pool for file descriptors. Driver classes can use
+Uses epoll to pool for file descriptors. Driver classes can use
 daemon.get_poller().register and .unregister to add file descriptors and
 register callbacks to be called when data is available in them.
 
 Callback is called as callback(fd, event) where event is one of select.POLL*
+
+Poller is also what SCCDaemon's mainloop sleeps on. Code running on other
+threads that needs mainloop to wake up (and, for example, flush queued USB
+messages or re-check scheduler) should call wakeup().
 """
-import select, logging
+import os, errno, select, logging
 log = logging.getLogger("Poller")
 
 
@@ -22,37 +26,96 @@ class Poller(object):
 	def __init__(self):
 		self._events = {}
 		self._callbacks = {}
-		self._pool_in = ()
-		self._pool_out = ()
-		self._pool_pri = ()
+		self._epoll = select.epoll()
+		# Self-pipe used by wakeup()
+		self._wakeup_r, self._wakeup_w = os.pipe()
+		for fd in (self._wakeup_r, self._wakeup_w):
+			os.set_blocking(fd, False)
+		self._wakeup_pending = False
+		self._epoll.register(self._wakeup_r, select.EPOLLIN)
 	
 	
 	def register(self, fd, events, callback):
 		if fd < 0:
 			raise ValueError("Invalid file descriptor")
+		mask = events & (Poller.POLLIN | Poller.POLLOUT | Poller.POLLPRI)
+		if fd in self._events:
+			try:
+				self._epoll.modify(fd, mask)
+			except FileNotFoundError:
+				# fd was closed and reused without being unregistered first
+				self._epoll.register(fd, mask)
+		else:
+			try:
+				self._epoll.register(fd, mask)
+			except FileExistsError:
+				self._epoll.modify(fd, mask)
 		self._events[fd] = events
 		self._callbacks[fd] = callback
-		self._generate_lists()
 	
 	
 	def unregister(self, fd):
 		if fd in self._events: del self._events[fd]
 		if fd in self._callbacks: del self._callbacks[fd]
-		self._generate_lists()
+		try:
+			self._epoll.unregister(fd)
+		except (OSError, ValueError):
+			# Already closed fds are removed from epoll set automatically
+			pass
+	
 	
+	def wakeup(self):
+		"""
+		Forces poll() running on main thread to return as soon as possible.
+		Safe to call from any thread.
+		"""
+		if not self._wakeup_pending:
+			self._wakeup_pending = True
+			try:
+				os.write(self._wakeup_w, b"\x00")
+			except BlockingIOError:
+				# Pipe is full, poll will wake up anyway
+				pass
 	
-	def _generate_lists(self):
-		self._pool_in = [ fd for fd, events in self._events.items() if events & Poller.POLLIN ]
-		self._pool_out = [ fd for fd, events in self._events.items() if events & Poller.POLLOUT ]
-		self._pool_pri = [ fd for fd, events in self._events.items() if events & Poller.POLLPRI ]
+	
+	def _drain_wakeup(self):
+		# Flag is cleared only after pipe is empty. wakeup() called while
+		# pipe is being read doesn't write anything, but that's fine, as
+		# mainloop runs right after poll() returns.
+		try:
+			while os.read(self._wakeup_r, 256):
+				pass
+		except BlockingIOError:
+			pass
+		self._wakeup_pending = False
 	
 	
 	def poll(self, timeout=0.01):
-		inn, out, pri = select.select( self._pool_in, self._pool_out, self._pool_pri, timeout )
+		"""
+		Waits until some of registered file descriptors are ready and calls
+		their callbacks.
+		
+		'timeout' is in seconds. None means 'wait until something happens'.
+		"""
+		if timeout is None:
+			timeout = -1
+		elif timeout < 0:
+			timeout = 0
+		try:
+			ready = self._epoll.poll(timeout)
+		except OSError as e:
+			if e.errno == errno.EINTR:
+				return
+			raise
 		
-		for fd in inn:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLIN)
-		for fd in out:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLOUT)
-		for fd in pri:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLPRI)
+		for fd, events in ready:
+			if fd == self._wakeup_r:
+				self._drain_wakeup()
+				continue
+			cb = self._callbacks.get(fd, DO_NOTHING)
+			if events & (Poller.POLLIN | select.EPOLLHUP | select.EPOLLERR):
+				cb(fd, Poller.POLLIN)
+			if events & Poller.POLLOUT:
+				cb(fd, Poller.POLLOUT)
+			if events & Poller.POLLPRI:
+				cb(fd, Poller.POLLPRI)
@@ -7,7 +7,7 @@ Handles mapping profile stored in json file
 from __future__ import unicode_literals
 
 from scc.constants import LEFT, RIGHT, CPAD, WHOLE, STICK, GYRO
-from scc.constants import SCButtons, HapticPos
+from scc.constants import SCButtons, HapticPos, ControllerFlags
 from scc.special_actions import MenuAction
 from scc.modifiers import HoldModifier
 from scc.lib.jsonencoder import JSONEncoder
@@ -15,7 +15,8 @@ from scc.parser import TalkingActionParser
 from scc.menu_data import MenuData
 from scc.actions import NoAction
 
-import json, logging
+from collections import OrderedDict
+import os, json, pickle, threading, logging
 log = logging.getLogger("profile")
 
 
@@ -242,6 +243,29 @@ class Profile(object):
 			menu.compress()
 	
 	
+	def __getstate__(self):
+		# Parser is not pickled, see ProfileCache
+		state = self.__dict__.copy()
+		del state["parser"]
+		return state
+	
+	
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.parser = None
+	
+	
+	def compile(self, flags=0):
+		"""
+		Returns CompiledProfile - dispatch plan used by Mapper to process
+		inputs from controller with specified ControllerFlags.
+		
+		Plan references actions currently set in profile, so it has to be
+		recompiled when any of them is changed.
+		"""
+		return CompiledProfile(self, flags)
+	
+	
 	def _convert(self, from_version):
 		""" Performs conversion from older profile version """
 		if from_version < 1:
@@ -326,6 +350,107 @@ class Profile(object):
 			# Action format completly changed in v0.4, but profile foramat is same.
 			pass
 
+class CompiledProfile(object):
+	"""
+	Flat dispatch plan generated from Profile. Unbound (NoAction) inputs
+	are left out and controller flags are resolved once, so Mapper touches
+	only inputs that profile actually uses.
+	"""
+	
+	def __init__(self, profile, flags):
+		self.profile = profile
+		self.serial = None		# Set and used by Mapper
+		# Buttons, as list of (button, action) pairs in order in which
+		# they should be processed and as map of button -> action for
+		# (more common) case when only one button is changed
+		self.buttons = [ (int(x), profile.buttons[x])
+			for x in profile.buttons if profile.buttons[x] ]
+		self.button_table = dict(self.buttons)
+		self.button_mask = 0
+		for x, action in self.buttons:
+			self.button_mask |= x
+		
+		# Everything else is set to None if not bound
+		self.stick = profile.stick or None
+		self.gyro = profile.gyro or None
+		self.ltrig = profile.triggers.get(Profile.LEFT) or None
+		self.rtrig = profile.triggers.get(Profile.RIGHT) or None
+		self.lpad = profile.pads.get(Profile.LEFT) or None
+		self.rpad = profile.pads.get(Profile.RIGHT) or None
+		self.cpad = profile.pads.get(Profile.CPAD) or None
+		
+		self.separate_stick = bool(flags & ControllerFlags.SEPARATE_STICK)
+		self.has_rstick = bool(flags & ControllerFlags.HAS_RSTICK)
+		if not flags & ControllerFlags.HAS_CPAD:
+			self.cpad = None
+
+
+class ProfileCache(object):
+	"""
+	LRU cache of loaded and compressed profiles, keyed by file name and
+	checked against modification time and size of file.
+	
+	Profiles are stored pickled, so every load() returns new instance with
+	its own set of actions and no state is shared between mappers.
+	Profiles that can't be pickled are loaded every time.
+	
+	Thread-safe.
+	"""
+	SIZE = 16
+	
+	def __init__(self, size=SIZE):
+		self._size = size
+		self._cache = OrderedDict()		# filename -> (mtime, size, data)
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+	
+	
+	def load(self, filename, parser):
+		"""
+		Returns loaded and compressed profile.
+		Raises same exceptions as Profile.load.
+		"""
+		st = os.stat(filename)
+		with self._lock:
+			entry = self._cache.get(filename)
+			if entry and entry[0:2] == (st.st_mtime_ns, st.st_size):
+				self._cache.move_to_end(filename)
+				self.hits += 1
+				data = entry[2]
+			else:
+				self.misses += 1
+				data = None
+		
+		if data is not None:
+			profile = pickle.loads(data)
+			profile.parser = parser
+			return profile
+		
+		profile = Profile(parser).load(filename)
+		profile.compress()
+		try:
+			data = pickle.dumps(profile, pickle.HIGHEST_PROTOCOL)
+		except Exception as e:
+			log.debug("Profile '%s' cannot be cached: %s", filename, e)
+			return profile
+		with self._lock:
+			self._cache[filename] = (st.st_mtime_ns, st.st_size, data)
+			self._cache.move_to_end(filename)
+			while len(self._cache) > self._size:
+				self._cache.popitem(last=False)
+		return profile
+	
+	
+	def clear(self):
+		with self._lock:
+			self._cache.clear()
+	
+	
+	def __len__(self):
+		return len(self._cache)
+
+
 class Encoder(JSONEncoder):
 	def default(self, obj):
 		#if type(obj) in (list, tuple):
@@ -0,0 +1,78 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Input Recorder
+
+Records inputs from any controller, as they are passed to Mapper, into
+compact binary file and loads them back. See scc.drivers.replay for driver
+that feeds recorded inputs back to mapper.
+
+File starts with header (magic, version and controller flags) followed by
+frames. Every frame stores time relative to first frame, state of gyro
+sensor and every value that mapper may read from controller state.
+Values that controller doesn't provide are recorded as zeros.
+"""
+from collections import namedtuple
+import time, struct, logging
+log = logging.getLogger("Recorder")
+
+FIELDS = ( 'buttons', 'ltrig', 'rtrig', 'stick_x', 'stick_y',
+	'lpad_x', 'lpad_y', 'rpad_x', 'rpad_y', 'cpad_x', 'cpad_y',
+	'accel_x', 'accel_y', 'accel_z', 'gpitch', 'groll', 'gyaw',
+	'q1', 'q2', 'q3', 'q4' )
+RecordedInput = namedtuple('RecordedInput', FIELDS)
+
+MAGIC = b"SCCREC"
+VERSION = 1
+HEADER = struct.Struct('<6sHI')			# magic, version, flags
+# time, gyro enabled, buttons, everything else
+FRAME = struct.Struct('<dBI' + 'i' * (len(FIELDS) - 1))
+
+
+class Recorder(object):
+	"""
+	Writes inputs into file. Set to Mapper using set_recorder method.
+	"""
+	
+	def __init__(self, filename, flags=0):
+		self._file = open(filename, "wb")
+		self._file.write(HEADER.pack(MAGIC, VERSION, flags))
+		self._start = None
+		self.filename = filename
+	
+	
+	def record(self, controller, state):
+		t = time.time()
+		if self._start is None:
+			self._start = t
+		self._file.write(FRAME.pack(t - self._start,
+			1 if controller.get_gyro_enabled() else 0,
+			*[ int(getattr(state, x, 0)) for x in FIELDS ]))
+	
+	
+	def close(self):
+		if self._file:
+			self._file.close()
+			self._file = None
+			log.debug("Recorded inputs saved to '%s'", self.filename)
+
+
+def load(filename):
+	"""
+	Loads recorded inputs from file.
+	Returns (flags, frames), where frames is list of
+	(time, gyro_enabled, RecordedInput) tuples.
+	
+	Raises ValueError if file is not valid.
+	"""
+	with open(filename, "rb") as f:
+		data = f.read()
+	if len(data) < HEADER.size:
+		raise ValueError("Not a recording: '%s'" % (filename,))
+	magic, version, flags = HEADER.unpack_from(data)
+	if magic != MAGIC or version != VERSION:
+		raise ValueError("Not a recording: '%s'" % (filename,))
+	frames = []
+	for values in FRAME.iter_unpack(data[HEADER.size:
+			HEADER.size + (len(data) - HEADER.size) // FRAME.size * FRAME.size]):
+		frames.append(( values[0], bool(values[1]), RecordedInput._make(values[2:]) ))
+	return flags, frames
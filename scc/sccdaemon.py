@@ -14,28 +14,30 @@ from scc.constants import LEFT, RIGHT, STICK, CPAD
 from scc.tools import find_profile, find_menu, nameof, shsplit, shjoin
 from scc.uinput import CannotCreateUInputException
 from scc.tools import set_logging_level, find_binary, clamp
+from scc.paths import get_runtime_path, get_state_ring_path
 from scc.device_monitor import create_device_monitor
 from scc.cemuhook_server import CemuhookServer
 from scc.custom import load_custom_module
 from scc.gestures import GestureDetector
 from scc.parser import TalkingActionParser
 from scc.controller import HapticData
+from scc.control_server import ControlServer
 from scc.scheduler import Scheduler
 from scc.menu_data import MenuData
-from scc.profile import Profile
+from scc.tracing import Tracer
+from scc.statering import StateRing
+from scc.recorder import Recorder
+from scc.profile import Profile, ProfileCache
 from scc.actions import Action
 from scc.config import Config
 from scc.poller import Poller
 from scc.mapper import Mapper
-from scc import drivers
+from scc import drivers, tracing, binevents
 
-from socketserver import UnixStreamServer, ThreadingMixIn, StreamRequestHandler
+from collections import deque
 import os, sys, pkgutil, signal, time, json, logging
 import threading, traceback, subprocess, shlex
 log = logging.getLogger("SCCDaemon")
-tlog = logging.getLogger("Socket Thread")
-
-class ThreadingUnixStreamServer(ThreadingMixIn, UnixStreamServer): daemon_threads = True
 
 
 class SCCDaemon(Daemon):
@@ -43,7 +45,7 @@ class SCCDaemon(Daemon):
 	def __init__(self, piddile, socket_file):
 		set_logging_level(True, True)
 		Daemon.__init__(self, piddile)
-		Config()					# Generates ~/.config/scc and default config if needed
+		Config.shared()				# Generates ~/.config/scc and default config if needed
 		self.started = False
 		self.exiting = False
 		self.socket_file = socket_file
@@ -51,21 +53,22 @@ class SCCDaemon(Daemon):
 		self.dev_monitor = create_device_monitor(self)
 		self.scheduler = Scheduler()
 		self.xdisplay = None
-		self.sserver = None			# UnixStreamServer instance
+		self.sserver = None			# ControlServer instance
 		self.errors = []
 		self.alone = False			# Set by launching script from --alone flag
 		self.custom_py_loaded = False
 		self.osd_daemon = None
 		self.default_profile = None
+		self.profile_cache = ProfileCache()
+		self._profile_requests = {}	# mapper -> number of last profile request
 		self.autoswitch_daemon = None
 		# TODO: Use osd_ids for all menus
 		self.osd_ids = {}
 		self.controllers = []
-		self.mainloops = [ self.poller.poll, self.scheduler.run ]
+		self.mainloops = [ self.scheduler.run ]
 		self.rescan_cbs = [ ]
 		self.on_exit_cbs = []
 		self.subprocs = []
-		self.lock = threading.Lock()
 		self.cemuhook = None
 		self.default_mapper = None
 		self.free_mappers = [ ]
@@ -79,7 +82,7 @@ class SCCDaemon(Daemon):
 		See __init__.py in scc.drivers.
 		"""
 		log.debug("Initializing drivers...")
-		cfg = Config()
+		cfg = Config.shared()
 		self._to_start = set()  # del-eted later by start_drivers
 		to_init = []
 		for importer, modname, ispkg in pkgutil.walk_packages(path=drivers.__path__, onerror=lambda x: None):
@@ -102,6 +105,33 @@ class SCCDaemon(Daemon):
 					self._to_start.add(getattr(mod, "start"))
 	
 	
+	def init_tracing(self):
+		"""
+		Enables measuring of time spent processing inputs, if enabled in
+		config. Has to be called before any mapper is created.
+		"""
+		interval = Config.shared()["latency_tracing"]
+		if interval > 0:
+			log.info("Latency tracing enabled")
+			tracing.ENABLED = True
+			self.scheduler.schedule(interval, self._log_tracing, interval)
+	
+	
+	def _log_tracing(self, interval):
+		for mapper in self.get_traced_mappers():
+			c = mapper.get_controller()
+			mapper.tracer.log_summary(c.get_id() if c else "-")
+		self.scheduler.schedule(interval, self._log_tracing, interval)
+	
+	
+	def get_traced_mappers(self):
+		""" Returns list of all mappers with tracer set """
+		mappers = [ self.default_mapper ] + [
+			c.get_mapper() for c in self.controllers
+			if c.get_mapper() is not self.default_mapper ]
+		return [ m for m in mappers if m and m.tracer ]
+	
+	
 	def init_default_mapper(self):
 		"""
 		default_mapper is persistent mapper assigned to first Controller instance.
@@ -152,6 +182,10 @@ class SCCDaemon(Daemon):
 		"""
 		Adds function that is called in every mainloop iteration.
 		Can be called only durring initialization, in driver 'init' method.
+		
+		Note that mainloop iterates only when some file descriptor registered
+		in poller is ready, scheduled task is due or poller.wakeup() is called.
+		Code that needs to be called periodically should use scheduler.
 		"""
 		if fn not in self.mainloops:
 			self.mainloops.append(fn)
@@ -182,50 +216,85 @@ class SCCDaemon(Daemon):
 			self.rescan_cbs.append(fn)
 	
 	
-	def _set_profile(self, mapper, filename):
-		# Called from socket server thread
-		p = Profile(TalkingActionParser())
-		p.load(filename).compress()
-		self.profile_file = filename
+	def _set_profile(self, mapper, filename, callback):
+		"""
+		Loads profile from file and sets it to mapper.
 		
-		if mapper.profile.gyro and not p.gyro:
-			# Turn off gyro sensor that was enabled but is no longer needed
-			if mapper.get_controller():
-				log.debug("Turning gyrosensor OFF")
-				mapper.get_controller().set_gyro_enabled(False)
-		elif not mapper.profile.gyro and p.gyro:
-			# Turn on gyro sensor that was turned off, if profile has gyro action set
-			if mapper.get_controller():
-				log.debug("Turning gyrosensor ON")
-				mapper.get_controller().set_gyro_enabled(True)
-		# Cancel everything
-		mapper.cancel_all()
-		# Release all buttons
-		mapper.release_virtual_buttons()
-		# Reset mouse (issue #222)
-		mapper.mouse.reset()
+		Profile is loaded on new thread, as that may be slow, and only
+		swapping it is done on main loop. Once that is done, callback is
+		called on main loop as callback(load_time, swap_time, error). Times
+		are in seconds, swap_time includes time spent waiting for main loop.
+		'error' is None on success or exception that was raised.
 		
-		# This last line kinda depends on GIL...
-		mapper.profile = p
-		# Re-apply all locks
-		for c in self.clients:
-			c.reaply_locks(self, mapper)
-		if mapper.get_controller():
-			self.send_profile_info(mapper.get_controller(), self._send_to_all)
-		else:
-			self.send_profile_info(None, self._send_to_all, mapper=mapper)
+		Loads may finish in any order, so every request is numbered and
+		profile is not set if another one was requested for same mapper
+		in meantime.
+		"""
+		request = self._profile_requests.get(mapper, 0) + 1
+		self._profile_requests[mapper] = request
+		
+		def load():
+			start = time.perf_counter()
+			try:
+				p = self.profile_cache.load(filename, TalkingActionParser())
+			except Exception as e:
+				self.scheduler.schedule(0, callback, 0, 0, e)
+				return
+			self.scheduler.schedule(0, self._swap_profile, mapper, request,
+				filename, p, callback, start, time.perf_counter())
+		
+		t = threading.Thread(target=load)
+		t.daemon = True
+		t.start()
+	
+	
+	def _swap_profile(self, mapper, request, filename, p, callback, start, loaded):
+		""" Called on main loop to finish what _set_profile started """
+		if self._profile_requests.get(mapper) != request:
+			callback(loaded - start, time.perf_counter() - loaded, Exception(
+				"Profile '%s' was replaced by newer request" % (filename,)))
+			return
+		try:
+			self.profile_file = filename
+			
+			if mapper.profile.gyro and not p.gyro:
+				# Turn off gyro sensor that was enabled but is no longer needed
+				if mapper.get_controller():
+					log.debug("Turning gyrosensor OFF")
+					mapper.get_controller().set_gyro_enabled(False)
+			elif not mapper.profile.gyro and p.gyro:
+				# Turn on gyro sensor that was turned off, if profile has gyro action set
+				if mapper.get_controller():
+					log.debug("Turning gyrosensor ON")
+					mapper.get_controller().set_gyro_enabled(True)
+			# Cancel everything
+			mapper.cancel_all()
+			# Release all buttons
+			mapper.release_virtual_buttons()
+			# Reset mouse (issue #222)
+			mapper.mouse.reset()
+			
+			mapper.profile = p
+			# Re-apply all locks
+			for c in self.clients:
+				c.reaply_locks(self, mapper)
+			if mapper.get_controller():
+				self.send_profile_info(mapper.get_controller(), self._send_to_all)
+			else:
+				self.send_profile_info(None, self._send_to_all, mapper=mapper)
+		except Exception as e:
+			callback(loaded - start, time.perf_counter() - loaded, e)
+			return
+		callback(loaded - start, time.perf_counter() - loaded, None)
 	
 	
 	def _send_to_all(self, message_str):
 		"""
 		Sends message to all connect clients.
-		Should be called while lock is acquired.
 		Message should be utf-8 encoded str.
 		"""
 		for client in self.clients:
-			try:
-				client.wfile.write(message_str)
-			except: pass
+			client.wfile.write(message_str)
 	
 	
 	def on_sa_turnoff(self, mapper, action):
@@ -236,9 +305,8 @@ class SCCDaemon(Daemon):
 	
 	def on_sa_restart(self, *a):
 		""" Called when 'restart' action is used """
-		with self.lock:
-			for c in self.clients:
-				c.close()
+		for c in self.clients:
+			c.close()
 		os.system("%s %s None restart &" % ( sys.executable, sys.argv[0] ))
 	
 	
@@ -257,24 +325,23 @@ class SCCDaemon(Daemon):
 		""" Called when 'gestures' action is used """
 		# TODO: Take up_direction from action
 		gd = None
-		with self.lock:
-			if action.osd_enabled and self.osd_daemon:
-				# When OSD is enabled, gesture detection is handled
-				# by scc-osd-daemon.
-				self.osd_daemon.gesture_action = action
-				self._osd('gesture',
-					"--controller", mapper.get_controller().get_id(),
-				 	'--control-with', what)
-				log.debug("Gesture detection request sent to scc-osd-daemon")
-			else:
-				# Otherwise it is handled internally
-				up_direction = 0
-				gd = self._start_gesture(
-					mapper,
-					what,
-					up_direction,
-					lambda gesture_string : action.gesture(mapper, gesture_string)
-				)
+		if action.osd_enabled and self.osd_daemon:
+			# When OSD is enabled, gesture detection is handled
+			# by scc-osd-daemon.
+			self.osd_daemon.gesture_action = action
+			self._osd('gesture',
+				"--controller", mapper.get_controller().get_id(),
+			 	'--control-with', what)
+			log.debug("Gesture detection request sent to scc-osd-daemon")
+		else:
+			# Otherwise it is handled internally
+			up_direction = 0
+			gd = self._start_gesture(
+				mapper,
+				what,
+				up_direction,
+				lambda gesture_string : action.gesture(mapper, gesture_string)
+			)
 		if gd:
 			gd.enable()
 			log.debug("Gesture detection started on %s", what)
@@ -291,10 +358,7 @@ class SCCDaemon(Daemon):
 		self.cemuhook.feed(data)
 	
 	def _osd(self, *data):
-		"""
-		Has to be called with self.lock held.
-		Returns True on success.
-		"""
+		""" Returns True on success """
 		# Pre-format data
 		data = b"OSD: %s\n" % (shjoin(data) ,)
 		
@@ -303,43 +367,32 @@ class SCCDaemon(Daemon):
 			log.warning("Cannot show OSD; there is no scc-osd-daemon registered")
 			return False
 		# Send request
-		try:
-			self.osd_daemon.wfile.write(data)
-			self.osd_daemon.wfile.flush()
-		except Exception as e:
-			log.error("Failed to display OSD: %s", e)
-			self.osd_daemon = None
-			return False
+		self.osd_daemon.wfile.write(data)
 		return True
 	
 	
 	def on_sa_osd(self, mapper, action):
 		""" Called when 'osd' action is used """
-		with self.lock:
-			self._osd('message', '-t', str(action.timeout), '-s', str(action.size), action.text)
+		self._osd('message', '-t', str(action.timeout), '-s', str(action.size), action.text)
 	
 	
 	def on_sa_clearosd(self, mapper, action):
 		""" Called when 'clearosd' action is used """
-		with self.lock:
-			self._osd('clear')
+		self._osd('clear')
 	
 	
 	def on_sa_area(self, mapper, action, x1, y1, x2, y2):
 		""" Called when *AreaAction has OSD enabled """
-		with self.lock:
-			self._osd('area', '-x', x1, '-y', y1, '--width', x2-x1, '--height', y2-y1)
+		self._osd('area', '-x', x1, '-y', y1, '--width', x2-x1, '--height', y2-y1)
 	
 	
 	def on_sa_clear_osd(self, *a):
-		with self.lock:
-			self._osd('clear')
+		self._osd('clear')
 	
 	
 	def on_sa_keyboard(self, mapper, action):
 		""" Called when 'keyboard' action is used """
-		with self.lock:
-			self._osd('keyboard')
+		self._osd('keyboard')
 	
 	
 	def on_sa_menu(self, mapper, action, *pars):
@@ -357,8 +410,7 @@ class SCCDaemon(Daemon):
 			p += [ "--from-profile", mapper.profile.get_filename(), action.menu_id ]
 		p += list(pars)
 		
-		with self.lock:
-			self._osd(*p)
+		self._osd(*p)
 	
 	on_sa_gridmenu = on_sa_menu
 	
@@ -375,8 +427,7 @@ class SCCDaemon(Daemon):
 			else:
 				data.append(x)
 		
-		with self.lock:
-			self._osd("dialog", *data)
+		self._osd("dialog", *data)
 	
 	
 	def on_sa_profile(self, mapper, action):
@@ -388,12 +439,12 @@ class SCCDaemon(Daemon):
 			return
 		path = find_profile(name)
 		if path:
-			with self.lock:
-				try:
-					self._set_profile(mapper, path)
+			def cb(load_time, swap_time, error):
+				if error:
+					log.error("Failed to load profile '%s': %s", name, error)
+				else:
 					log.info("Loaded profile '%s'", name)
-				except Exception as e:
-					log.exception(e)
+			self._set_profile(mapper, path, cb)
 			return
 		log.error("Cannot load profile: Profile '%s' not found", name)
 	
@@ -413,8 +464,12 @@ class SCCDaemon(Daemon):
 		self.exiting = True
 		for fn in self.on_exit_cbs:
 			fn(self)
+		for c in self.controllers:
+			if c.get_mapper():
+				c.get_mapper().set_recorder(None)
+				c.get_mapper().set_state_ring(None)
 		for d in (self.osd_daemon, self.autoswitch_daemon):
-			if d: d.wfile.close()
+			if d: d.connection.close()
 		self.osd_daemon, self.autoswitch_daemon = None, None
 		for p in self.subprocs:
 			p.kill()
@@ -458,7 +513,7 @@ class SCCDaemon(Daemon):
 				m.set_xdisplay(self.xdisplay)
 			if not self.alone:
 				self.subprocs.append(Subprocess("scc-osd-daemon", True))
-				if len(Config()["autoswitch"]):
+				if len(Config.shared()["autoswitch"]):
 					# Start scc-autoswitch-daemon only if there are some switch rules defined
 					self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
 		else:
@@ -483,13 +538,15 @@ class SCCDaemon(Daemon):
 		
 		mapper.set_special_actions_handler(self)
 		mapper.set_xdisplay(self.xdisplay)
+		if tracing.ENABLED:
+			mapper.set_tracer(Tracer())
 		mapper.schedule(1.0, self.fix_xinput)
 		return mapper
 	
 	
 	def fix_xinput(self, mapper):
 		name = mapper.get_gamepad_name()
-		if self.xdisplay and Config()["fix_xinput"] and name:
+		if self.xdisplay and Config.shared()["fix_xinput"] and name:
 			# Three conditions: X has to be available, 'fix_xinput' must
 			# be enabled in config and controller should not be dummy
 			# (should have a name)
@@ -507,12 +564,13 @@ class SCCDaemon(Daemon):
 		mapper = mapper or self.default_mapper
 		if self.default_profile == None:
 			try:
-				self.default_profile = find_profile(Config()["recent_profiles"][0])
+				self.default_profile = find_profile(Config.shared()["recent_profiles"][0])
 			except:
 				# Broken config is not reason to fail here
 				pass
 		try:
-			mapper.profile.load(self.default_profile).compress()
+			mapper.profile = self.profile_cache.load(self.default_profile,
+				TalkingActionParser())
 		except Exception as e:
 			log.warning("Failed to load profile. Starting with no mappings.")
 			log.warning("Reason: %s", e)
@@ -531,48 +589,83 @@ class SCCDaemon(Daemon):
 			self.load_default_profile(mapper)
 		mapper.set_controller(c)
 		c.set_mapper(mapper)
+		if "SCC_RECORD" in os.environ:
+			# Undocumented and for debuging purposes only. If set, all inputs
+			# are recorded into $SCC_RECORD<controller_id>.sccrec file
+			filename = "%s%s.sccrec" % (os.environ["SCC_RECORD"], c.get_id())
+			mapper.set_recorder(Recorder(filename, c.flags))
 		if mapper == self.default_mapper:
 			log.debug("Assigned default_mapper to %s", c)
 		if mapper.profile.gyro:
 			log.debug("Turning gyrosensor ON")
 			c.set_gyro_enabled(True)
 		
-		c.apply_config(Config().get_controller_config(c.get_id()))
+		cfg = Config.shared()
+		self.apply_controller_config(c, cfg)
+		self.update_state_ring(c, cfg)
 		self.controllers.append(c)
 		log.debug("Controller added: %s", c)
-		with self.lock:
-			self.send_controller_list(self._send_to_all)
-			self.send_all_profiles(self._send_to_all)
+		self.send_controller_list(self._send_to_all)
+		self.send_all_profiles(self._send_to_all)
+	
+	
+	def apply_controller_config(self, c, cfg):
+		config = cfg.get_controller_config(c.get_id())
+		c.apply_config(config)
+		c.set_input_coalescing(bool(config["input_coalescing"]))
+	
+	
+	def update_state_ring(self, c, cfg):
+		"""
+		Starts or stops publishing state of controller into state ring file,
+		depending on 'enable_sniffing' setting. Has to be called on main thread.
+		"""
+		mapper = c.get_mapper()
+		if mapper is None or mapper.get_controller() is not c:
+			# Controller was removed meanwhile
+			return
+		if cfg["enable_sniffing"] and not mapper.state_ring:
+			try:
+				if not os.path.exists(get_runtime_path()):
+					os.makedirs(get_runtime_path(), 0o700)
+				mapper.set_state_ring(StateRing(get_state_ring_path(c.get_id())))
+			except (IOError, OSError) as e:
+				log.error("Failed to create state ring for %s: %s", c.get_id(), e)
+		elif not cfg["enable_sniffing"] and mapper.state_ring:
+			mapper.set_state_ring(None)
 	
 	
 	def remove_controller(self, c):
 		mapper = c.mapper
 		if mapper:
 			mapper.release_virtual_buttons()
+			mapper.set_recorder(None)
+			mapper.set_state_ring(None)
 		c.disconnected()
 		
-		with self.lock:
-			while c in self.controllers:
-				self.controllers.remove(c)
-			log.debug("Controller removed: %s", c)
-			
-			if mapper == self.default_mapper and len(self.controllers) > 0:
-				# Special case, default_mapper should be always
-				# assigned to something, so if controller with default_mapper
-				# is disconnected, it's reassigned to next available controller
-				swap_c = self.controllers[0]
-				swap_mapper = swap_c.get_mapper()
-				swap_mapper.set_controller(None)
-				swap_c.set_mapper(mapper)
-				mapper.set_controller(swap_c)
-				self.free_mappers.append(swap_mapper)
-				log.debug("Reassigned default_mapper to %s", swap_c)
-			else:
-				c.set_mapper(None)
-				if mapper:
-					mapper.set_controller(None)
-					self.free_mappers.append(mapper)
-			self.send_controller_list(self._send_to_all)
+		while c in self.controllers:
+			self.controllers.remove(c)
+		log.debug("Controller removed: %s", c)
+		
+		if mapper == self.default_mapper and len(self.controllers) > 0:
+			# Special case, default_mapper should be always
+			# assigned to something, so if controller with default_mapper
+			# is disconnected, it's reassigned to next available controller
+			swap_c = self.controllers[0]
+			swap_mapper = swap_c.get_mapper()
+			swap_mapper.set_controller(None)
+			swap_mapper.set_state_ring(None)
+			swap_c.set_mapper(mapper)
+			mapper.set_controller(swap_c)
+			self.free_mappers.append(swap_mapper)
+			self.update_state_ring(swap_c, Config.shared())
+			log.debug("Reassigned default_mapper to %s", swap_c)
+		else:
+			c.set_mapper(None)
+			if mapper:
+				mapper.set_controller(None)
+				self.free_mappers.append(mapper)
+		self.send_controller_list(self._send_to_all)
 	
 	
 	def get_active_ids(self):
@@ -588,9 +681,8 @@ class SCCDaemon(Daemon):
 		Every error has id that can be later used to remove it from list to
 		indicate that error has been resolved.
 		"""
-		with self.lock:
-			self.errors.append(( id, error ))
-			self._send_to_all(("Error: %s\n" % (error,)).encode("utf-8"))
+		self.errors.append(( id, error ))
+		self._send_to_all(("Error: %s\n" % (error,)).encode("utf-8"))
 	
 	
 	def remove_error(self, id):
@@ -601,10 +693,9 @@ class SCCDaemon(Daemon):
 		When last error is removed, this method automatically sends "Ready."
 		message to indicate that daemon is ready to serve clients.
 		"""
-		with self.lock:
-			self.errors = [ (_id, error) for (_id, error) in self.errors if _id != id ]
-			if len(self.errors) == 0:
-				self._send_to_all(b"Ready.\n")
+		self.errors = [ (_id, error) for (_id, error) in self.errors if _id != id ]
+		if len(self.errors) == 0:
+			self._send_to_all(b"Ready.\n")
 	
 	
 	def send_controller_list(self, method):
@@ -654,37 +745,38 @@ class SCCDaemon(Daemon):
 	def run(self):
 		log.debug("Starting SCCDaemon...")
 		signal.signal(signal.SIGTERM, self.sigterm)
+		self.init_tracing()
 		self.init_drivers()
 		self.dev_monitor.start()
 		load_custom_module(log)
 		self.default_mapper = self.init_default_mapper()
 		self.free_mappers.append(self.default_mapper)
 		self.load_default_profile()
-		self.lock.acquire()
+		self.scheduler.set_wakeup(self.poller.wakeup)
 		self.start_listening()
 		self.connect_x()
-		self.lock.release()
 		self.start_drivers()
 		self.dev_monitor.rescan()
 		
 		while True:
+			# Sleeps until some fd is ready or until next scheduled task
+			self.poller.poll(self.scheduler.get_timeout())
 			for fn in self.mainloops:
 				fn()
+			# Sends inputs coalesced while handling this iteration. If any
+			# was sent, mainloops are called once more, so feedback and
+			# everything else it generated is not waiting for next wakeup.
+			flushed = False
+			for c in self.controllers:
+				flushed = c.flush_input() or flushed
+			if flushed:
+				for fn in self.mainloops:
+					fn()
 	
 	
 	def start_listening(self):
-		if os.path.exists(self.socket_file):
-			os.unlink(self.socket_file)
-		instance = self
-		
-		class SSHandler(StreamRequestHandler):
-			def handle(self):
-				instance._sshandler(self.connection, self.rfile, self.wfile)
-		
-		self.sserver = ThreadingUnixStreamServer(self.socket_file, SSHandler)
-		t = threading.Thread(target=self.sserver.serve_forever)
-		t.daemon = True
-		t.start()
+		self.sserver = ControlServer(self.poller, self.socket_file,
+			self._on_client_connected)
 		os.chmod(self.socket_file, stat.S_IRUSR | stat.S_IWUSR)
 		log.debug("Created control socket %s", self.socket_file)
 	
@@ -693,15 +785,11 @@ class SCCDaemon(Daemon):
 		"""
 		Starts gesture detection on specified pad.
 		Calls callback with gesture string when finished.
-		
-		Should be called with lock held.
 		"""
 		gd = None
 		
 		def cb(detector, gesture):
-			# This callback is expected to be called with lock held
-			with self.lock:
-				self._apply(mapper, what, lambda a : a.original_action)
+			self._apply(mapper, what, lambda a : a.original_action)
 			log.debug("Gesture detected on %s: %s", what, gesture)
 			callback(gesture)
 		
@@ -720,40 +808,39 @@ class SCCDaemon(Daemon):
 		return gd	
 	
 	
-	def _sshandler(self, connection, rfile, wfile):
-		with self.lock:
-			client = Client(connection, self.default_mapper, rfile, wfile)
-			self.clients.add(client)
-			wfile.write(b"SCCDaemon\n")
-			wfile.write(("Version: %s\n" % (DAEMON_VERSION,)).encode("utf-8"))
-			wfile.write(("PID: %s\n" % (os.getpid(),)).encode("utf-8"))
-			self.send_controller_list(wfile.write)
-			self.send_all_profiles(wfile.write)
-			if len(self.errors) == 0:
-				wfile.write(b"Ready.\n")
-			else:
-				for id, error in self.errors:
-					wfile.write(("Error: %s\n" % (error,)).encode("utf-8"))
-		
-		while True:
-			try:
-				line = rfile.readline()
-			except Exception:
-				# Connection terminated
-				break
-			if len(line) == 0: break
-			if len(line.strip(b"\t\n ")) > 0:
-				self._handle_message(client, line.strip(b"\n"))
-		
-		with self.lock:
-			client.unlock_actions(self)
-			if self.osd_daemon == client:
-				log.info("scc-osd-daemon lost")
-				self.osd_daemon = None
-			if self.autoswitch_daemon == client:
-				log.info("scc-autoswitch-daemon lost")
-				self.autoswitch_daemon = None
-			self.clients.remove(client)
+	def _on_client_connected(self, connection):
+		client = Client(connection, self.default_mapper)
+		connection.on_message = lambda c, line: self._on_client_message(client, line)
+		connection.on_close = lambda c: self._on_client_disconnected(client)
+		self.clients.add(client)
+		wfile = client.wfile
+		wfile.write(b"SCCDaemon\n")
+		wfile.write(("Version: %s\n" % (DAEMON_VERSION,)).encode("utf-8"))
+		wfile.write(("PID: %s\n" % (os.getpid(),)).encode("utf-8"))
+		self.send_controller_list(wfile.write)
+		self.send_all_profiles(wfile.write)
+		if len(self.errors) == 0:
+			wfile.write(b"Ready.\n")
+		else:
+			for id, error in self.errors:
+				wfile.write(("Error: %s\n" % (error,)).encode("utf-8"))
+	
+	
+	def _on_client_message(self, client, line):
+		if len(line.strip(b"\t\n ")) > 0:
+			self._handle_message(client, line)
+	
+	
+	def _on_client_disconnected(self, client):
+		client.stop_events()
+		client.unlock_actions(self)
+		if self.osd_daemon == client:
+			log.info("scc-osd-daemon lost")
+			self.osd_daemon = None
+		if self.autoswitch_daemon == client:
+			log.info("scc-autoswitch-daemon lost")
+			self.autoswitch_daemon = None
+		self.clients.discard(client)
 	
 	
 	def _handle_message(self, client, message):
@@ -761,26 +848,33 @@ class SCCDaemon(Daemon):
 		Handles message recieved from client.
 		"""
 		if message.startswith(b"Profile:"):
-			with self.lock:
-				try:
-					filename = message[8:].decode("utf-8").strip("\t ")
-					self._set_profile(client.mapper, filename)
-					log.info("Loaded profile '%s'", filename)
-					client.wfile.write(b"OK.\n")
-				except Exception as e:
-					exc = traceback.format_exc()
-					log.exception(e)
+			# Loading profile is slow, so it is done on another thread.
+			# Other messages from same client wait until it's finished.
+			filename = message[8:].decode("utf-8").strip("\t ")
+			def cb(load_time, swap_time, error):
+				if error:
+					exc = "".join(traceback.format_exception(
+						type(error), error, error.__traceback__))
+					log.error(exc)
 					tb = str(exc).encode("utf-8").decode('unicode_escape').encode("latin1")
 					client.wfile.write(b"Fail: " + tb + b"\n")
+				else:
+					log.info("Loaded profile '%s' in %.1fms", filename,
+						(load_time + swap_time) * 1000.0)
+					client.wfile.write(("Profile loaded: %.1f %.1f %s\n" % (
+						load_time * 1000.0, swap_time * 1000.0, filename)).encode("utf-8"))
+					client.wfile.write(b"OK.\n")
+				client.connection.resume()
+			client.connection.pause()
+			self._set_profile(client.mapper, filename, cb)
 		elif message.startswith(b"OSD:"):
 			if not self.osd_daemon:
 				client.wfile.write(b"Fail: Cannot show OSD; there is no scc-osd-daemon registered\n")
 			else:
 				try:
 					text = message[5:].decode("utf-8").strip("\t ")
-					with self.lock:
-						if not self._osd("message", text):
-							raise Exception()
+					if not self._osd("message", text):
+						raise Exception()
 					client.wfile.write(b"OK.\n")
 				except Exception:
 					client.wfile.write(b"Fail: cannot display OSD\n")
@@ -798,28 +892,53 @@ class SCCDaemon(Daemon):
 				log.exception(e)
 				client.wfile.write(b"Fail: %s\n" % (e,))
 		elif message.startswith(b"Controller."):
-			with self.lock:
-				client.mapper = self.default_mapper
-				client.wfile.write(b"OK.\n")
+			client.mapper = self.default_mapper
+			client.wfile.write(b"OK.\n")
 		elif message.startswith(b"Controller:"):
-			with self.lock:
-				try:
-					controller_id = message[11:].strip().decode('utf-8')
-					for c in self.controllers:
-						if c.get_id() == controller_id:
-							client.mapper = c.get_mapper()
-							client.wfile.write(b"OK.\n")
-							break
-					else:
-						raise Exception("goto fail")
-				except Exception as e:
-					client.wfile.write(b"Fail: no such controller\n")
+			try:
+				controller_id = message[11:].strip().decode('utf-8')
+				for c in self.controllers:
+					if c.get_id() == controller_id:
+						client.mapper = c.get_mapper()
+						client.wfile.write(b"OK.\n")
+						break
+				else:
+					raise Exception("goto fail")
+			except Exception as e:
+				client.wfile.write(b"Fail: no such controller\n")
 		elif message.startswith(b"State."):
-			if Config()["enable_sniffing"]:
+			if Config.shared()["enable_sniffing"]:
 				client.wfile.write(b"State: %s\n" % (str(client.mapper.state), ))
 			else:
 				log.warning("Refused 'State' request: Sniffing disabled")
 				client.wfile.write(b"Fail: Sniffing disabled.\n")
+		elif message.startswith(b"Stats."):
+			lines = []
+			if tracing.ENABLED:
+				for mapper in self.get_traced_mappers():
+					c = mapper.get_controller()
+					for stat in mapper.tracer.get_stats():
+						lines.append("Stats: %s %s %i %.1f %.1f %.1f\n" % (
+							((c.get_id() if c else "-"), ) + stat))
+			for c in self.clients:
+				if c.events_sent or c.events_dropped:
+					lines.append("Events: %x %i %i\n" % (hash(c),
+						c.events_sent, c.events_dropped))
+			for c in self.controllers:
+				if c.get_input_coalescing():
+					lines.append("Coalesced: %s %i %i\n" % (c.get_id(),
+						c.coalesced_merged, c.coalesced_dropped))
+				stats = c.get_input_stats()
+				if stats:
+					lines.append("Input: %s %i %i %i\n" % ((c.get_id(), ) + stats))
+				stats = c.get_control_stats()
+				if stats:
+					lines.append("Control: %s %i %i %i %i %i %.1f %.1f %.1f\n" % (
+						(c.get_id(), ) + stats))
+			cache = self.profile_cache
+			lines.append("ProfileCache: %i %i %i\n" % (
+				cache.hits, cache.misses, len(cache)))
+			client.wfile.write("".join(lines).encode("utf-8") + b"OK.\n")
 		elif message.startswith(b"Led:"):
 			try:
 				number = int(message[4:])
@@ -830,12 +949,11 @@ class SCCDaemon(Daemon):
 			if client.mapper.get_controller():
 				client.mapper.get_controller().set_led_level(number)
 		elif message.startswith(b"Observe:"):
-			if Config()["enable_sniffing"]:
+			if Config.shared()["enable_sniffing"]:
 				to_observe = [ x for x in message.split(b":", 1)[1].strip(b" \t\r").split(b" ") ]
-				with self.lock:
-					for l in to_observe:
-						client.observe_action(self, SCCDaemon.source_to_constant(l))
-					client.wfile.write(b"OK.\n")
+				for l in to_observe:
+					client.observe_action(self, SCCDaemon.source_to_constant(l))
+				client.wfile.write(b"OK.\n")
 			else:
 				log.warning("Refused 'Observe' request: Sniffing disabled")
 				client.wfile.write(b"Fail: Sniffing disabled.\n")
@@ -847,69 +965,63 @@ class SCCDaemon(Daemon):
 				e = str(e).encode("utf-8").decode('unicode_escape').encode("latin1")
 				client.wfile.write(b"Fail: failed to parse: " + e + b"\n")
 				return
-			with self.lock:
-				try:
-					if not self._can_lock_action(client.mapper, SCCDaemon.source_to_constant(l)):
-						client.wfile.write(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
-						return
-				except ValueError as e:
-					tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
-					client.wfile.write(b"Fail: " + tb + b"\n")
+			try:
+				if not self._can_lock_action(client.mapper, SCCDaemon.source_to_constant(l)):
+					client.wfile.write(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
 					return
-				client.replace_action(self, SCCDaemon.source_to_constant(l), action)
-				client.wfile.write(b"OK.\n")
+			except ValueError as e:
+				tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
+				client.wfile.write(b"Fail: " + tb + b"\n")
+				return
+			client.replace_action(self, SCCDaemon.source_to_constant(l), action)
+			client.wfile.write(b"OK.\n")
 		elif message.startswith(b"Lock:"):
 			to_lock = [ x for x in message.split(b":", 1)[1].strip(b" \t\r").split(b" ") ]
-			with self.lock:
-				try:
-					for l in to_lock:
-						if not self._can_lock_action(client.mapper, SCCDaemon.source_to_constant(l)):
-							client.wfile.write(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
-							return
-				except ValueError as e:
-					tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
-					client.wfile.write(b"Fail: " + tb + b"\n")
-					return
+			try:
 				for l in to_lock:
-					client.lock_action(self, SCCDaemon.source_to_constant(l))
+					if not self._can_lock_action(client.mapper, SCCDaemon.source_to_constant(l)):
+						client.wfile.write(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
+						return
+			except ValueError as e:
+				tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
+				client.wfile.write(b"Fail: " + tb + b"\n")
+				return
+			for l in to_lock:
+				client.lock_action(self, SCCDaemon.source_to_constant(l))
+			client.wfile.write(b"OK.\n")
+		elif message.startswith(b"Event format:"):
+			format = message[13:].strip(b" \t")
+			if format in (b"text", b"binary"):
+				client.set_binary_events(format == b"binary")
 				client.wfile.write(b"OK.\n")
+			else:
+				client.wfile.write(b"Fail: Unknown event format\n")
 		elif message.startswith(b"Unlock."):
-			with self.lock:
-				client.unlock_actions(self)
-				client.wfile.write(b"OK.\n")
+			client.unlock_actions(self)
+			client.wfile.write(b"OK.\n")
 		elif message.startswith(b"Reconfigure."):
-			with self.lock:
-				# Load config
-				cfg = Config()
-				# Reconfigure connected controllers
-				for c in self.controllers:
-					c.apply_config(cfg.get_controller_config(c.get_id()))
-				# Start or stop scc-autoswitch-daemon as needed
-				need_autoswitch_daemon = len(cfg["autoswitch"]) > 0
-				if need_autoswitch_daemon and self.xdisplay and not self.autoswitch_daemon:
-					self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
-				elif not need_autoswitch_daemon and self.autoswitch_daemon:
-					self._remove_subproccess("scc-autoswitch-daemon")
-					self.autoswitch_daemon.close()
-					self.autoswitch_daemon = None
-				# Respond
-				try:
-					client.wfile.write(b"OK.\n")
-					self._send_to_all("Reconfigured.\n".encode("utf-8"))
-				except:
-					pass
+			# Load config. Reloaded even if file looks unchanged, as
+			# modification time may have too low resolution to notice
+			cfg = Config.shared()
+			cfg.reload()
+			# Reconfigure connected controllers
+			for c in self.controllers:
+				self.apply_controller_config(c, cfg)
+				self.update_state_ring(c, cfg)
+			# Start or stop scc-autoswitch-daemon as needed
+			need_autoswitch_daemon = len(cfg["autoswitch"]) > 0
+			if need_autoswitch_daemon and self.xdisplay and not self.autoswitch_daemon:
+				self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
+			elif not need_autoswitch_daemon and self.autoswitch_daemon:
+				self._remove_subproccess("scc-autoswitch-daemon")
+				self.autoswitch_daemon.close()
+				self.autoswitch_daemon = None
+			# Respond
+			client.wfile.write(b"OK.\n")
+			self._send_to_all("Reconfigured.\n".encode("utf-8"))
 		elif message.startswith(b"Rescan."):
-			cbs = []
-			with self.lock:
-				cbs += self.rescan_cbs
-				# Respond first
-				try:
-					client.wfile.write(b"OK.\n")
-				except:
-					pass
-			# Do stuff later
-			# (this cannot be done while self.lock is held, as creating new
-			# controller would create race condition)
+			# Respond first
+			client.wfile.write(b"OK.\n")
 			for cb in self.rescan_cbs:
 				try:
 					cb()
@@ -923,11 +1035,10 @@ class SCCDaemon(Daemon):
 
 		elif message.startswith(b"Turnoff."):
 			to_turn_off = []
-			with self.lock:
-				if client.mapper.get_controller():
-					to_turn_off.append(client.mapper.get_controller())
-				else:
-					to_turn_off += [ c for c in self.controllers ]
+			if client.mapper.get_controller():
+				to_turn_off.append(client.mapper.get_controller())
+			else:
+				to_turn_off += [ c for c in self.controllers ]
 			for c in to_turn_off:
 				c.turnoff()
 			client.wfile.write(b"OK.\n")
@@ -939,16 +1050,14 @@ class SCCDaemon(Daemon):
 				tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
 				client.wfile.write(b"Fail: " + tb + b"\n")
 				return
-			with self.lock:
-				client.request_gesture(self, what, up_angle)
-				client.wfile.write(b"OK.\n")
+			client.request_gesture(self, what, up_angle)
+			client.wfile.write(b"OK.\n")
 		elif message.startswith(b"Restart."):
 			self.on_sa_restart()
 		elif message.startswith(b"Gestured:"):
 			gstr = message[9:].strip()
 			client.gesture_action.gesture(client.mapper, gstr)
-			with self.lock:
-				client.wfile.write(b"OK.\n")
+			client.wfile.write(b"OK.\n")
 		elif message.startswith(b"Selected:"):
 			menuaction = None
 			def press(mapper):
@@ -965,39 +1074,37 @@ class SCCDaemon(Daemon):
 					log.error("Error while processing menu action")
 					log.exception(e)
 			
-			with self.lock:
-				try:
-					#menu_id, item_id = shsplit(message)[1:]
-					#print(message)
-					tmp = shsplit(str(message, "utf-8"))
-					menu_id, item_id = tmp[1:]
-					menuaction = None
-					if menu_id in (None, "None"):
-						menuaction = self.osd_ids[item_id]
-					elif "." in menu_id:
-						# TODO: Move this common place
-						data = json.loads(open(menu_id, "r").read())
-						menudata = MenuData.from_json_data(data, TalkingActionParser())
-						menuaction = menudata.get_by_id(item_id).action
-					else:
-						menuaction = client.mapper.profile.menus[menu_id].get_by_id(item_id).action
-					client.wfile.write(b"OK.\n")
-				except:
-					log.warning("Selected menu item is no longer valid.")
-					client.wfile.write(b"Fail: Selected menu item is no longer valid\n")
-				if menuaction:
-					client.mapper.schedule(0, press)
-		elif message.startswith(b"Register:"):
-			with self.lock:
-				if message.strip().endswith(b"osd"):
-					if self.osd_daemon: self.osd_daemon.close()
-					self.osd_daemon = client
-					log.info("Registered scc-osd-daemon")
-				elif message.strip().endswith(b"autoswitch"):
-					if self.autoswitch_daemon: self.autoswitch_daemon.close()
-					self.autoswitch_daemon = client
-					log.info("Registered scc-autoswitch-daemon")
+			try:
+				#menu_id, item_id = shsplit(message)[1:]
+				#print(message)
+				tmp = shsplit(str(message, "utf-8"))
+				menu_id, item_id = tmp[1:]
+				menuaction = None
+				if menu_id in (None, "None"):
+					menuaction = self.osd_ids[item_id]
+				elif "." in menu_id:
+					# TODO: Move this common place
+					data = json.loads(open(menu_id, "r").read())
+					menudata = MenuData.from_json_data(data, TalkingActionParser())
+					menuaction = menudata.get_by_id(item_id).action
+				else:
+					menuaction = client.mapper.profile.menus[menu_id].get_by_id(item_id).action
 				client.wfile.write(b"OK.\n")
+			except:
+				log.warning("Selected menu item is no longer valid.")
+				client.wfile.write(b"Fail: Selected menu item is no longer valid\n")
+			if menuaction:
+				client.mapper.schedule(0, press)
+		elif message.startswith(b"Register:"):
+			if message.strip().endswith(b"osd"):
+				if self.osd_daemon: self.osd_daemon.close()
+				self.osd_daemon = client
+				log.info("Registered scc-osd-daemon")
+			elif message.strip().endswith(b"autoswitch"):
+				if self.autoswitch_daemon: self.autoswitch_daemon.close()
+				self.autoswitch_daemon = client
+				log.info("Registered scc-autoswitch-daemon")
+			client.wfile.write(b"OK.\n")
 		else:
 			client.wfile.write(b"Fail: Unknown command\n")
 	
@@ -1008,7 +1115,7 @@ class SCCDaemon(Daemon):
 		managed subproccesses, effectively preventing daemon from
 		auto-restarting it.
 		
-		Should be called while lock is acquired
+		Has to be called on main thread.
 		"""
 		n = []
 		for i in self.subprocs:
@@ -1024,7 +1131,7 @@ class SCCDaemon(Daemon):
 		Returns True if action assigned to axis,
 		pad or button is not yet locked.
 		
-		Should be called while self.lock is acquired.
+		Has to be called on main thread.
 		"""
 		# TODO: Probably move to mapper
 		is_locked = (lambda a: isinstance(a, LockedAction) or
@@ -1078,6 +1185,7 @@ class SCCDaemon(Daemon):
 			mapper.profile.pads[what] = a
 		else:
 			raise ValueError("Unknown source: %s" % (what,))
+		mapper.profile_changed()
 	
 	
 	@staticmethod
@@ -1102,9 +1210,7 @@ class SCCDaemon(Daemon):
 	
 	
 	def _remove_socket(self):
-		self.sserver.shutdown()
-		if os.path.exists(self.socket_file):
-			os.unlink(self.socket_file)
+		self.sserver.close()
 		log.debug("Control socket removed")
 	
 	
@@ -1120,21 +1226,123 @@ class SCCDaemon(Daemon):
 
 
 class Client(object):
-	def __init__(self, connection, mapper, rfile, wfile):
+	# Maximum number of 'Event:' messages waiting to be sent. If client
+	# doesn't read them fast enough, analog updates are dropped once limit
+	# is reached and client is disconnected if there is 4 times more
+	# waiting button events.
+	MAX_QUEUED_EVENTS = 256
+	
+	def __init__(self, connection, mapper):
+		# 'connection' is scc.control_server.Connection. It's also
+		# available as 'wfile', as it can be written to as to file.
 		self.connection = connection
-		self.rfile = rfile
-		self.wfile = wfile
+		self.wfile = connection
 		self.mapper = mapper
 		self.gesture_action = None
 		self.locked_actions = {}
+		# Events are queued and written only when socket can take them,
+		# so slow client can't block input processing. Every item in
+		# _events is list with single event, so analog update can be
+		# replaced by newer one while waiting. _analog maps source to such
+		# item and is cleared after every button event, so updates are
+		# never moved before it.
+		self.binary_events = False
+		self._events = deque()
+		self._analog = {}
+		self._closed = False
+		self.events_sent = 0
+		self.events_dropped = 0
+		connection.on_writable = self._send_events
 	
 	
 	def close(self):
 		""" Closes connection to this client """
-		try:
-			self.connection.shutdown(True)
-		except:
-			pass
+		self.connection.shutdown()
+	
+	
+	def set_binary_events(self, enabled):
+		""" Switches between 'Event:' messages and binary frames """
+		self.binary_events = enabled
+	
+	
+	def send_event(self, controller_id, what, values, source=None):
+		"""
+		Queues event to be sent to client. Never blocks.
+		'what' is name of button, pad or stick, 'values' is list of numbers.
+		
+		'source' should be set for analog updates. Queued update from same
+		source is then replaced by new one instead of sending both.
+		Events without source (button presses and releases) are always sent.
+		"""
+		if self._closed:
+			return
+		event = ( controller_id, what, values )
+		if source is not None:
+			item = self._analog.get(source)
+			if item is not None:
+				item[0] = event
+				self.events_dropped += 1
+				return
+			if len(self._events) >= self.MAX_QUEUED_EVENTS:
+				self.events_dropped += 1
+				return
+			item = self._analog[source] = [ event ]
+		else:
+			if len(self._events) >= self.MAX_QUEUED_EVENTS * 4:
+				log.warning("Client %x is not reading events, disconnecting", hash(self))
+				self.stop_events()
+				self.close()
+				return
+			item = [ event ]
+			self._analog.clear()
+		self._events.append(item)
+		if len(self._events) == 1:
+			self.connection.wait_writable()
+	
+	
+	def _send_events(self, connection):
+		""" Called by connection when socket can take more data """
+		items, self._events = self._events, deque()
+		self._analog.clear()
+		if items:
+			self.wfile.write(self._format_events([ x[0] for x in items ]))
+			self.events_sent += len(items)
+	
+	
+	@staticmethod
+	def _format_text(controller_id, what, values):
+		return ("Event: %s %s %s\n" % (controller_id, what,
+			" ".join([ str(x) for x in values ]))).encode("utf-8")
+	
+	
+	def _format_events(self, events):
+		""" Returns events encoded as 'Event:' messages or binary frames """
+		if not self.binary_events:
+			return b"".join([ self._format_text(*e) for e in events ])
+		data, frame, frame_id = [], [], None
+		for controller_id, what, values in events:
+			if frame and controller_id != frame_id:
+				data.append(binevents.pack(frame_id, frame))
+				frame = []
+			if what in binevents.SOURCE_IDS:
+				frame_id = controller_id
+				frame.append(( what, values ))
+			else:
+				# Not representable in binary, sent as text
+				if frame:
+					data.append(binevents.pack(frame_id, frame))
+					frame = []
+				data.append(self._format_text(controller_id, what, values))
+		if frame:
+			data.append(binevents.pack(frame_id, frame))
+		return b"".join(data)
+	
+	
+	def stop_events(self):
+		""" Stops sending events. Called when client disconnects """
+		self._closed = True
+		self._events.clear()
+		self._analog.clear()
 	
 	
 	def request_gesture(self, daemon, what, up_angle):
@@ -1142,10 +1350,9 @@ class Client(object):
 		Handler used when client requested gesture detection with
 		"Gesture:" message.
 		
-		Should be called while daemon.lock is acquired.
+		Has to be called on main thread.
 		"""
 		def cb(gesture):
-			# Called while lock is being held
 			try:
 				self.wfile.write(b"Gesture: %s %s\n" % (what, gesture))
 			except:
@@ -1160,7 +1367,7 @@ class Client(object):
 		"""
 		Locks action so event can be send to client instead of handling it.
 		
-		Should be called while daemon.lock is acquired.
+		Has to be called on main thread.
 		"""
 		def lock(action, what):
 			# ObservingAction should be above LockedAction
@@ -1176,7 +1383,7 @@ class Client(object):
 		"""
 		Enables observing of action so event is both sent to client and handled.
 		
-		Should be called while daemon.lock is acquired.
+		Has to be called on main thread.
 		"""
 		daemon._apply(self.mapper, what,
 				lambda a : ObservingAction(what, self, a))
@@ -1187,14 +1394,14 @@ class Client(object):
 		Temporally replaces action in way that allows reversing operation when
 		client disconnects.
 		
-		Should be called while daemon.lock is acquired.
+		Has to be called on main thread.
 		"""
 		daemon._apply(self.mapper, what,
 				lambda a : ReplacedAction(what, self, action, a))
 	
 	
 	def unlock_actions(self, daemon):
-		""" Should be called while daemon.lock is acquired """
+		""" Has to be called on main thread """
 		locked, self.locked_actions = self.locked_actions, {}
 		for mapper in locked:
 			s = locked[mapper]
@@ -1205,7 +1412,7 @@ class Client(object):
 	def reaply_locks(self, daemon, mapper):
 		"""
 		Called after profile is changed.
-		Should be called while daemon.lock is acquired
+		Has to be called on main thread.
 		"""
 		if mapper in self.locked_actions:
 			s, self.locked_actions[mapper] = self.locked_actions[mapper], set()
@@ -1238,36 +1445,23 @@ class ReportingAction(Action):
 	__str__ = __repr__
 	
 	
-	def _report(self, message):
-		try:
-			self.client.wfile.write(message.encode("utf-8"))
-		except Exception as e:
-			# May fail when client dies
-			self.client.rfile.close()
-			self.client.wfile.close()
+	def _report(self, mapper, what, values, source=None):
+		self.client.send_event(mapper.get_controller().get_id(),
+			what, values, source)
 	
 	
 	def trigger(self, mapper, position, old_position):
 		if mapper.get_controller():
-			self._report("Event: %s %s %s %s\n" % (
-				mapper.get_controller().get_id(),
-				nameof(self.what), position, old_position
-			))
+			self._report(mapper, nameof(self.what), [ position, old_position ],
+				( mapper, self.what ))
 	
 	
 	def button_press(self, mapper, number=1):
 		if mapper.get_controller():
 			if self.what == SCButtons.STICKPRESS:
-				self._report("Event: %s STICKPRESS %s\n" % (
-					mapper.get_controller().get_id(),
-					number
-				))
+				self._report(mapper, "STICKPRESS", [ number ])
 			else:
-				self._report("Event: %s %s %s\n" % (
-					mapper.get_controller().get_id(),
-					nameof(self.what),
-					number
-				))
+				self._report(mapper, nameof(self.what), [ number ])
 	
 	
 	def button_release(self, mapper):
@@ -1281,10 +1475,7 @@ class ReportingAction(Action):
 							or abs(y - self.old_pos[1] > min_difference)):
 			self.old_pos = x, y
 			if mapper.get_controller():
-				self._report("Event: %s %s %s %s\n" % (
-					mapper.get_controller().get_id(),
-					what, x, y
-				))
+				self._report(mapper, what, [ x, y ], ( mapper, what ))
 
 
 class LockedAction(ReportingAction):
@@ -7,18 +7,44 @@ Runs in SCCDaemon's (single-threaded) mainloop. That means all callbacks are
 also called on main thread.
 
 Use schedule(delay, callback, *data) to register one-time task.
+
+Mainloop uses next_deadline() to compute how long it can sleep.
+
+Tasks are kept in binary heap ordered by (time, sequence number), so tasks
+scheduled for same time are executed in order in which they were scheduled.
+Canceling is lazy; canceled task is only marked as such and dropped once it
+gets to the top of the heap.
 """
-import time, queue, logging
+import time, heapq, itertools, threading, logging
+from collections import deque
 log = logging.getLogger("Scheduler")
 
-# TODO: Maybe create actual thread for this? Use poler? Scrap everything and rewrite it in GO?
 
 class Scheduler(object):
+	# When there is more canceled tasks than this and they make more than
+	# half of the heap, heap is rebuilt without them
+	COMPACT_THRESHOLD = 64
 	
 	def __init__(self):
-		self._scheduled = queue.PriorityQueue()
-		self._next = None
+		self._heap = []
+		self._canceled = 0
+		self._counter = itertools.count()
 		self._now = time.time()
+		# Tasks scheduled from other threads are only appended here and
+		# moved to heap by main thread. deque.append is atomic.
+		self._incoming = deque()
+		self._wakeup = None
+		self._owner = None
+	
+	
+	def set_wakeup(self, callback):
+		"""
+		Sets function that is called when task is scheduled from thread
+		other than one calling this method (which should be the main thread).
+		Used to wake up mainloop sleeping in poller.
+		"""
+		self._wakeup = callback
+		self._owner = threading.get_ident()
 	
 	
 	def schedule(self, delay, callback, *data):
@@ -29,61 +55,128 @@ class Scheduler(object):
 		
 		Returned Task instance can be used to cancel task once scheduled.
 		"""
-		task = Task(self._now + delay, callback, data)
-		if self._next is None or task.time < self._next.time:
-			if self._next:
-				self._scheduled.put(self._next)
-			self._next = task
+		# self._now is None while mainloop is sleeping and after it wakes up,
+		# until run() is called again
+		now = time.time() if self._now is None else self._now
+		task = Task(now + delay, next(self._counter), callback, data)
+		if self._owner is not None and threading.get_ident() != self._owner:
+			self._incoming.append(task)
+			if self._wakeup:
+				self._wakeup()
 		else:
-			self._scheduled.put(task)
+			heapq.heappush(self._heap, (task.time, task.seq, task))
 		return task
 	
 	
 	def cancel_task(self, task):
 		"""
 		Returns True if task was sucessfully removed or False if task was
-		already executed or not known at all.
+		already executed, canceled or not known at all.
+		
+		Task is not removed from heap right away, only marked as canceled.
+		"""
+		if task.canceled or not task.pending:
+			return False
+		task.canceled = True
+		task.pending = False
+		self._canceled += 1
+		if (self._canceled > self.COMPACT_THRESHOLD
+				and self._canceled * 2 > len(self._heap)):
+			self._compact()
+		return True
+	
+	
+	def _compact(self):
+		"""
+		Rebuilds heap without canceled tasks. Canceled tasks scheduled from
+		other threads may still be in _incoming and stay counted.
+		"""
+		size = len(self._heap)
+		self._heap[:] = [ x for x in self._heap if not x[2].canceled ]
+		heapq.heapify(self._heap)
+		self._canceled -= size - len(self._heap)
+	
+	
+	def _receive(self):
+		""" Moves tasks scheduled from other threads to heap """
+		while self._incoming:
+			task = self._incoming.popleft()
+			heapq.heappush(self._heap, (task.time, task.seq, task))
+	
+	
+	def _drop_canceled(self):
+		""" Removes canceled tasks from top of heap """
+		heap = self._heap
+		while heap and heap[0][2].canceled:
+			heapq.heappop(heap)
+			self._canceled -= 1
+	
+	
+	def next_deadline(self):
+		"""
+		Returns time (as returned by time.time()) when next task should be
+		executed or None if there is nothing scheduled.
 		
-		Note that this is slow as hell and completly thread-unsafe,
-		so it _has_ to be called on main thread.
+		Has to be called on main thread.
 		"""
-		if task == self._next:
-			self._next = None if self._scheduled.empty() else self._scheduled.get()
-			return True
-		# Fun part: All tasks are removed from PriorityQueue
-		# until correct is found. Then everything is put back
-		tasks, found = [], False
-		while not self._scheduled.empty():
-			t = self._scheduled.get()
-			if t == task:
-				found = True
-				break
-			tasks.append(t)
-		for t in tasks:
-			self._scheduled.put(t)
-		return found
+		if self._incoming:
+			self._receive()
+		self._drop_canceled()
+		if self._heap:
+			return self._heap[0][0]
+		return None
+	
+	
+	def get_timeout(self):
+		"""
+		Returns number of seconds until next task should be executed,
+		zero if some task is already late or None if nothing is scheduled.
+		
+		Expected to be called just before mainloop goes to sleep.
+		"""
+		self._now = None
+		deadline = self.next_deadline()
+		if deadline is None:
+			return None
+		return max(0.0, deadline - time.time())
+	
+	
+	def __len__(self):
+		""" Returns number of tasks that are still waiting to be executed """
+		return len(self._heap) + len(self._incoming) - self._canceled
 	
 	
 	def run(self):
-		self._now = time.time()
-		while self._next and self._now >= self._next.time:
-			callback, data = self._next.callback, self._next.data
-			self._next = None if self._scheduled.empty() else self._scheduled.get()
-			callback(*data)
+		if self._incoming:
+			self._receive()
+		self._now = now = time.time()
+		heap = self._heap
+		while heap and heap[0][0] <= now:
+			task = heapq.heappop(heap)[2]
+			if task.canceled:
+				self._canceled -= 1
+				continue
+			task.pending = False
+			task.callback(*task.data)
 
 
 class Task(object):
+	__slots__ = ('time', 'seq', 'callback', 'data', 'pending', 'canceled')
 	
-	def __init__(self, time, callback, data):
+	def __init__(self, time, seq, callback, data):
 		self.time = time
+		self.seq = seq
 		self.callback = callback
 		self.data = data
+		self.pending = True
+		self.canceled = False
 	
 	
 	def cancel(self):
 		""" Marks task as canceled, without actually removing it from scheduler """
 		self.callback = lambda *a, **b: False
 		self.data = ()
-
+	
+	
 	def __lt__(self, other):
-		self.time < other.time
+		return (self.time, self.seq) < (other.time, other.seq)
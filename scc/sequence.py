@@ -0,0 +1,45 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Input Sequence
+
+Tracks 16-bit sequence numbers of input packets received from controller,
+counting lost and reordered packets. Used by Steam Controller drivers.
+"""
+
+
+class InputSequence(object):
+	"""
+	Packet with sequence number lower than previous one by less than
+	'reorder_window' is considered to be reordered. Bigger jump back means
+	that sequence was restarted, for example by turning controller off
+	and on again.
+	"""
+	
+	def __init__(self, reorder_window=64):
+		self.reorder_window = reorder_window
+		self.last = None			# sequence number of last accepted packet
+		self.received = 0
+		self.lost = 0
+		self.reordered = 0
+	
+	
+	def check(self, seq):
+		"""
+		Counts packet with sequence number 'seq'. Returns False if packet
+		is older than one already received, or same, and should be ignored.
+		"""
+		self.received += 1
+		if self.last is not None:
+			diff = (seq - self.last) & 0xFFFF
+			if diff == 0 or diff > 0x10000 - self.reorder_window:
+				self.reordered += 1
+				return False
+			if diff < 0x8000:
+				self.lost += diff - 1
+		self.last = seq
+		return True
+	
+	
+	def get_stats(self):
+		""" Returns (received, lost, reordered) """
+		return self.received, self.lost, self.reordered
@@ -0,0 +1,157 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - State Ring
+
+Publishes state of controller into memory-mapped file, so local programs
+(OSD, input tester, overlays) can read it at their own rate, without
+asking daemon over socket. Daemon only writes into mapped memory, so
+publishing state costs no syscalls, no matter how many readers are there.
+
+File starts with header (magic, version, number of slots, size of frame,
+'closed' flag, sequence and number of frames written so far), followed
+by ring of frames stored in same format as in scc.recorder, except that
+time is absolute (as returned by time.time).
+
+Access is guarded by seqlock: writer increments sequence before and after
+writing frame, so sequence is odd while write is in progress. Reader
+copies what it needs and retries if sequence was odd or changed meanwhile.
+
+When controller is disconnected (or sniffing disabled), 'closed' flag
+is set and file is removed. Readers should then reopen file, as daemon
+creates new one when controller is connected again.
+"""
+from scc.recorder import FIELDS, FRAME, RecordedInput
+import os, mmap, time, struct, logging
+log = logging.getLogger("StateRing")
+
+MAGIC = b"SCCSTR"
+VERSION = 1
+DEFAULT_SLOTS = 64
+RETRIES = 100
+# magic, version, slots, frame size, closed, sequence, frames written
+HEADER = struct.Struct('<6sHIIIIQ')
+CLOSED_OFFSET = 16
+SEQUENCE_OFFSET = 20
+FRAMES_OFFSET = 24
+UINT32 = struct.Struct('<I')
+UINT64 = struct.Struct('<Q')
+
+
+class StateRing(object):
+	"""
+	Writes states into ring file. Set to Mapper using set_state_ring method.
+	"""
+	
+	def __init__(self, filename, slots=DEFAULT_SLOTS):
+		size = HEADER.size + slots * FRAME.size
+		fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+		try:
+			os.ftruncate(fd, size)
+			self._map = mmap.mmap(fd, size)
+		finally:
+			os.close(fd)
+		HEADER.pack_into(self._map, 0, MAGIC, VERSION, slots, FRAME.size, 0, 0, 0)
+		self._slots = slots
+		self._sequence = 0
+		self._frames = 0
+		self.filename = filename
+	
+	
+	def publish(self, controller, state):
+		m = self._map
+		self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+		UINT32.pack_into(m, SEQUENCE_OFFSET, self._sequence)
+		FRAME.pack_into(m, HEADER.size + (self._frames % self._slots) * FRAME.size,
+			time.time(), 1 if controller.get_gyro_enabled() else 0,
+			*[ int(getattr(state, x, 0)) for x in FIELDS ])
+		self._frames += 1
+		UINT64.pack_into(m, FRAMES_OFFSET, self._frames)
+		self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+		UINT32.pack_into(m, SEQUENCE_OFFSET, self._sequence)
+	
+	
+	def close(self):
+		""" Marks ring as closed and removes its file """
+		if self._map:
+			UINT32.pack_into(self._map, CLOSED_OFFSET, 1)
+			self._map.close()
+			self._map = None
+			try:
+				os.unlink(self.filename)
+			except OSError:
+				pass
+			log.debug("Removed '%s'", self.filename)
+
+
+class StateRingReader(object):
+	"""
+	Reads states published by StateRing.
+	Raises IOError if file cannot be opened and ValueError if it's not valid.
+	"""
+	
+	def __init__(self, filename):
+		with open(filename, "rb") as f:
+			self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		if len(self._map) < HEADER.size:
+			self._map.close()
+			raise ValueError("Not a state ring: '%s'" % (filename,))
+		magic, version, self._slots, frame_size = HEADER.unpack_from(self._map)[0:4]
+		if (magic != MAGIC or version != VERSION or frame_size != FRAME.size
+				or len(self._map) < HEADER.size + self._slots * FRAME.size):
+			self._map.close()
+			raise ValueError("Not a state ring: '%s'" % (filename,))
+		self.filename = filename
+	
+	
+	def is_closed(self):
+		""" Returns True if writer closed ring and file should be reopened """
+		return UINT32.unpack_from(self._map, CLOSED_OFFSET)[0] != 0
+	
+	
+	def get_frame_count(self):
+		"""
+		Returns number of frames written so far. Cheap way to check
+		if anything new was published since last read.
+		"""
+		return UINT64.unpack_from(self._map, FRAMES_OFFSET)[0]
+	
+	
+	def read(self, history=1):
+		"""
+		Returns list of up to 'history' last published frames, oldest first.
+		Every frame is (time, gyro_enabled, RecordedInput) tuple, same as
+		returned by scc.recorder.load.
+		
+		Returns None if consistent copy couldn't be taken in RETRIES attempts.
+		"""
+		m = self._map
+		for i in range(RETRIES):
+			sequence = UINT32.unpack_from(m, SEQUENCE_OFFSET)[0]
+			if sequence & 1:
+				continue
+			frames = UINT64.unpack_from(m, FRAMES_OFFSET)[0]
+			raw = []
+			for n in range(max(0, frames - min(history, self._slots)), frames):
+				offset = HEADER.size + (n % self._slots) * FRAME.size
+				raw.append(m[offset:offset + FRAME.size])
+			if UINT32.unpack_from(m, SEQUENCE_OFFSET)[0] == sequence:
+				break
+		else:
+			return None
+		rv = []
+		for data in raw:
+			values = FRAME.unpack(data)
+			rv.append(( values[0], bool(values[1]), RecordedInput._make(values[2:]) ))
+		return rv
+	
+	
+	def get_state(self):
+		""" Returns last published state, or None if there is none yet """
+		frames = self.read()
+		return frames[-1][2] if frames else None
+	
+	
+	def close(self):
+		if self._map:
+			self._map.close()
+			self._map = None
@@ -0,0 +1,159 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Tracing
+
+Optional measurement of time spent processing each input packet. Enabled
+by setting 'latency_tracing' in config to number of seconds between
+summaries written to log.
+
+Every Mapper gets its own Tracer, which works as lap timer: begin() is
+called when mapper starts processing input and every following stage()
+call attributes time elapsed since previous stage to named stage.
+In same way, action() attributes time elapsed since previous action (or
+stage) to class of action that was just executed.
+
+Time between packet being recieved from USB and mapper starting to process
+it is measured as 'decode' stage. USB driver stores time when packet was
+recieved using packet_received() and forgets it with packet_done() after
+packet is handled, but only if ENABLED is set. Controller.send_input
+remembers that time along with input created from packet and mapper
+passes it to begin(). Input that was not created while handling USB
+packet, or was sent by timer later, has no 'decode' stage.
+"""
+from time import perf_counter
+import logging
+log = logging.getLogger("Tracing")
+
+# Set by daemon when tracing is enabled in config
+ENABLED = False
+# Time (as returned by perf_counter) when input packet that is being
+# handled was received, or None
+_received = None
+
+
+def packet_received():
+	""" Called by drivers when input packet is recieved from device """
+	global _received
+	_received = perf_counter()
+
+
+def packet_done():
+	"""
+	Called by drivers when received packet is handled, whether any input
+	was created from it or not.
+	"""
+	global _received
+	_received = None
+
+
+def get_received():
+	"""
+	Returns time when packet that is being handled was received,
+	or None if there is no such packet.
+	"""
+	return _received
+
+
+class Histogram(object):
+	"""
+	Keeps last SIZE samples in ring buffer and computes percentiles
+	over them when asked.
+	"""
+	SIZE = 1024
+	__slots__ = ('_samples', '_index', 'count')
+	
+	def __init__(self):
+		self._samples = [ 0.0 ] * Histogram.SIZE
+		self._index = 0
+		self.count = 0
+	
+	
+	def add(self, value):
+		self._samples[self._index] = value
+		self._index = (self._index + 1) % Histogram.SIZE
+		self.count += 1
+	
+	
+	def summary(self):
+		"""
+		Returns (count, p50, p99, max) computed from last SIZE samples.
+		Count is total number of samples ever added.
+		"""
+		samples = sorted(self._samples[0:min(self.count, Histogram.SIZE)])
+		if not samples:
+			return 0, 0.0, 0.0, 0.0
+		return (self.count,
+			samples[len(samples) * 50 // 100],
+			samples[len(samples) * 99 // 100],
+			samples[-1])
+
+
+class Tracer(object):
+	STAGES = ( "decode", "input", "scheduler", "events", "feedback", "total" )
+	
+	def __init__(self):
+		self.stages = { x : Histogram() for x in Tracer.STAGES }
+		self.actions = {}		# action class name -> Histogram
+		self._start = None
+		self._last = None		# end of last stage
+		self._lap = None		# end of last stage or action
+	
+	
+	def begin(self, received=None):
+		"""
+		Called when mapper starts processing input. 'received' is time
+		when packet input was created from was received, if known.
+		"""
+		self._start = self._last = self._lap = t = perf_counter()
+		if received is not None:
+			self.stages["decode"].add(t - received)
+			self._start = received
+	
+	
+	def stage(self, name):
+		""" Attributes time since end of previous stage to stage 'name' """
+		t = perf_counter()
+		self.stages[name].add(t - self._last)
+		self._last = self._lap = t
+	
+	
+	def action(self, action):
+		""" Attributes time since last lap to class of 'action' """
+		t = perf_counter()
+		name = action.__class__.__name__
+		if name not in self.actions:
+			self.actions[name] = Histogram()
+		self.actions[name].add(t - self._lap)
+		self._lap = t
+	
+	
+	def end(self):
+		""" Called when feedback is generated and frame is done """
+		self.stage("feedback")
+		self.stages["total"].add(self._last - self._start)
+	
+	
+	def get_stats(self):
+		"""
+		Returns list of (name, count, p50, p99, max) tuples for every stage
+		and every action class, all times in microseconds.
+		Action classes are prefixed by 'action:'.
+		"""
+		rv = []
+		items = ([ (x, self.stages[x]) for x in Tracer.STAGES ]
+			+ [ ("action:" + x, self.actions[x]) for x in sorted(self.actions) ])
+		for name, h in items:
+			count, p50, p99, mx = h.summary()
+			if count:
+				rv.append(( name, count, p50 * 1000000.0,
+					p99 * 1000000.0, mx * 1000000.0 ))
+		return rv
+	
+	
+	def log_summary(self, prefix):
+		""" Writes one line with stats of all stages to log """
+		parts = [ "%s p50=%.0fus p99=%.0fus max=%.0fus" % (name, p50, p99, mx)
+			for name, count, p50, p99, mx in self.get_stats()
+			if not name.startswith("action:") ]
+		if parts:
+			log.info("%s: %s", prefix, ", ".join(parts))
@@ -22,10 +22,9 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-import os, ctypes, time
-from ctypes import Structure, POINTER, c_bool, c_int16, c_uint16, c_int32, byref
+import os, ctypes, struct, time
+from ctypes import Structure, POINTER, c_bool, c_int16, c_uint16, c_int32, c_long, byref
 from math import pi, copysign, sqrt, fmod
-from scc.lib.libusb1 import timeval
 from scc.tools import find_library
 from scc.cheader import defines
 from scc.lib import IntEnum
@@ -41,6 +40,17 @@ else:
 	CHEAD = defines('/usr/include', 'linux/input.h')
 
 MAX_FEEDBACK_EFFECTS = 4
+# Size of buffer used to batch events, in events. When more than this is
+# generated before synEvent, buffer is written to device early.
+EVENT_BUFFER_SIZE = 64
+
+EV_SYN = CHEAD['EV_SYN']
+EV_KEY = CHEAD['EV_KEY']
+EV_REL = CHEAD['EV_REL']
+EV_ABS = CHEAD['EV_ABS']
+EV_MSC = CHEAD['EV_MSC']
+SYN_REPORT = CHEAD['SYN_REPORT']
+MSC_SCAN = CHEAD['MSC_SCAN']
 
 # Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
 Keys = IntEnum('Keys', {i: CHEAD[i] for i in CHEAD.keys() if (i.startswith('KEY_') or
@@ -175,6 +185,12 @@ Scans = {
 	Keys.KEY_FORWARD: 0xc00f3,
 }
 
+class timeval(ctypes.Structure):
+	_fields_ = [
+		('tv_sec', c_long),
+		('tv_usec', c_long)
+	]
+
 class InputEvent(ctypes.Structure):
 	_fields_ = [
 		('time', timeval),
@@ -197,18 +213,31 @@ class FeedbackEvent(ctypes.Structure):
 	def __init__(self):
 		self.in_use = False
 
+# struct input_event, packed directly into event buffer. Kernel fills time.
+INPUT_EVENT = struct.Struct('@llHHi')
+assert INPUT_EVENT.size == ctypes.sizeof(InputEvent)
 
 class UInput(object):
 	"""
 	UInput class permits to create a uinput device.
 
 	See Gamepad, Mouse, Keyboard for examples
+
+	By default, every synEvent writes all events generated since last
+	synEvent to device with single syscall. With batching enabled (see
+	set_batching), synEvent only marks end of report and everything is
+	written only when flush is called.
 	"""
 
 
 	def __init__(self, vendor, product, version, name, keys, axes, rels, keyboard=False, rumble=False):
 		self._lib = None
 		self._k = keys
+		self._buffer = bytearray(INPUT_EVENT.size * EVENT_BUFFER_SIZE)
+		self._view = memoryview(self._buffer)
+		self._offset = 0
+		self._synced = True
+		self._batching = False
 		self.name = name
 		if not axes or len(axes) == 0:
 			self._a, self._amin, self._amax, self._afuzz, self._aflat = [[]] * 5
@@ -268,6 +297,41 @@ class UInput(object):
 			raise CannotCreateUInputException("Failed to create uinput device. Error code: %s" % (self._fd,))
 
 
+	def set_batching(self, batching):
+		"""
+		Enables or disables batching. When enabled, events are written to
+		device only when flush() is called.
+		"""
+		self._batching = batching
+		if not batching:
+			self.flush()
+
+
+	def _queue(self, type, code, value):
+		""" Stores event in buffer, writing buffer to device if it's full """
+		if self._offset >= len(self._buffer):
+			self.flush()
+		try:
+			INPUT_EVENT.pack_into(self._buffer, self._offset, 0, 0, type, code, value)
+		except struct.error:
+			# Out of range value, truncated same way as ctypes would do it
+			INPUT_EVENT.pack_into(self._buffer, self._offset, 0, 0, type, code,
+				ctypes.c_int32(int(value)).value)
+		self._offset += INPUT_EVENT.size
+		self._synced = False
+
+
+	def flush(self):
+		""" Writes all buffered events to device """
+		if self._offset:
+			try:
+				os.write(self._fd, self._view[0:self._offset])
+			except OSError:
+				# Same as in C code, failed write is ignored
+				pass
+			self._offset = 0
+
+
 	def getDescriptor(self):
 		return self._fd
 
@@ -279,9 +343,7 @@ class UInput(object):
 		@param int axis		 key or btn event (KEY_* or BTN_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_key(self._fd,
-							 ctypes.c_uint16(key),
-							 ctypes.c_int32(val))
+		self._queue(EV_KEY, key, val)
 
 
 	def axisEvent(self, axis, val):
@@ -291,9 +353,7 @@ class UInput(object):
 		@param int axis		 abs event (ABS_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_abs(self._fd,
-							 ctypes.c_uint16(axis),
-							 ctypes.c_int32(val))
+		self._queue(EV_ABS, axis, val)
 
 	def relEvent(self, rel, val):
 		"""
@@ -302,9 +362,7 @@ class UInput(object):
 		@param int rel		  rel event (REL_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_rel(self._fd,
-							 ctypes.c_uint16(rel),
-							 ctypes.c_int32(val))
+		self._queue(EV_REL, rel, val)
 
 	def scanEvent(self, val):
 		"""
@@ -312,14 +370,17 @@ class UInput(object):
 
 		@param int val		  scan event value (scancode)
 		"""
-		self._lib.uinput_scan(self._fd,
-							  ctypes.c_int32(val))
+		self._queue(EV_MSC, MSC_SCAN, val)
 
 	def synEvent(self):
 		"""
 		Generate a syn event
 		"""
-		self._lib.uinput_syn(self._fd)
+		if not self._synced:
+			self._queue(EV_SYN, SYN_REPORT, 0)
+			self._synced = True
+			if not self._batching:
+				self.flush()
 
 
 	def setDelayPeriod(self, delay, period):
@@ -355,6 +416,7 @@ class UInput(object):
 
 	def __del__(self):
 		if self._lib:
+			self.flush()
 			self._lib.uinput_destroy(self._fd)
 
 
@@ -696,6 +758,8 @@ class Dummy(object):
 	pressEvent = keyEvent
 	releaseEvent = keyEvent
 	reset = keyEvent
+	flush = keyEvent
+	set_batching = keyEvent
 
 	def keyManaged(self, ev):
 		return False
@@ -43,6 +43,7 @@ class OSDDaemon(object):
 		self._hash_of_colors = -1
 		self._visible_messages = {}
 		self._window = None
+		self._pool = {}					# class -> window, see _get_window
 		self._registered = False
 		self._last_profile_change = 0
 		self._recent_profiles_undo = None
@@ -159,9 +160,47 @@ class OSDDaemon(object):
 		)
 	
 	
+	def _get_window(self, cls, *args):
+		"""
+		Returns prepared instance of OSD window, or creates new one if there
+		is none. Prepared instance is then replaced by new one once GTK is
+		idle, so next window of same type is not constructed while user
+		waits for it.
+		
+		Windows are not reused after being displayed; They are destroyed
+		when closed, as before.
+		"""
+		window = self._pool.pop(cls, None)
+		if window is None:
+			window = cls(*args)
+		GLib.idle_add(self._prepare_window, cls, args)
+		return window
+	
+	
+	def _prepare_window(self, cls, args):
+		if cls not in self._pool:
+			try:
+				self._pool[cls] = cls(*args)
+			except Exception:
+				log.error(traceback.format_exc())
+				log.error("Failed to prepare %s", cls.__name__)
+		return False
+	
+	
+	@staticmethod
+	def _measure_first_frame(window, start):
+		""" Logs time between receiving OSD message and window being drawn """
+		def on_draw(*a):
+			window.disconnect(handler[0])
+			log.debug("%s displayed in %.1fms", window.__class__.__name__,
+				(time.perf_counter() - start) * 1000.0)
+		handler = [ window.connect_after('draw', on_draw) ]
+	
+	
 	def on_unknown_message(self, daemon, message):
 		if not message.startswith("OSD:"):
 			return
+		start = time.perf_counter()
 		if message.startswith("OSD: message"):
 			args = shsplit(message)[1:]
 			m = Message()
@@ -188,9 +227,10 @@ class OSDDaemon(object):
 				log.warning("Another OSD is already visible - refusing to show keyboard")
 			else:
 				args = shsplit(message)[1:]
-				self._window = Keyboard(self.config)
+				self._window = self._get_window(Keyboard, self.config)
 				self._window.connect('destroy', self.on_keyboard_closed)
 				self._window.parse_argumets(args)
+				self._measure_first_frame(self._window, start)
 				self._window.show()
 				self._window.use_daemon(self.daemon)
 		elif message.startswith("OSD: gesture"):
@@ -198,9 +238,10 @@ class OSDDaemon(object):
 				log.warning("Another OSD is already visible - refusing to show keyboard")
 			else:
 				args = shsplit(message)[1:]
-				self._window = GestureDisplay(self.config)
+				self._window = self._get_window(GestureDisplay, self.config)
 				self._window.parse_argumets(args)
 				self._window.use_daemon(self.daemon)
+				self._measure_first_frame(self._window, start)
 				self._window.show()
 				self._window.connect('destroy', self.on_gesture_recognized)
 		elif self._is_menu_message(message):
@@ -209,21 +250,22 @@ class OSDDaemon(object):
 				log.warning("Another OSD is already visible - refusing to show menu")
 			else:
 				if message.startswith("OSD: hmenu"):
-					self._window = HorizontalMenu()
+					self._window = self._get_window(HorizontalMenu)
 				elif message.startswith("OSD: radialmenu"):
-					self._window = RadialMenu()
+					self._window = self._get_window(RadialMenu)
 				elif message.startswith("OSD: quickmenu"):
-					self._window = QuickMenu()
+					self._window = self._get_window(QuickMenu)
 				elif message.startswith("OSD: gridmenu"):
-					self._window = GridMenu()
+					self._window = self._get_window(GridMenu)
 				elif message.startswith("OSD: dialog"):
-					self._window = Dialog()
+					self._window = self._get_window(Dialog)
 				else:
-					self._window = Menu()
+					self._window = self._get_window(Menu)
 				self._window.connect('destroy', self.on_menu_closed)
 				self._window.use_config(self.config)
 				try:
 					if self._window.parse_argumets(args):
+						self._measure_first_frame(self._window, start)
 						self._window.show()
 						self._window.use_daemon(self.daemon)
 					else:
@@ -0,0 +1,79 @@
+from scc.appindex import AppIndex
+import os
+
+CHAR_MAP = { "A": "2", "B": "2", "C": "2", "D": "3", "E": "3", "F": "3",
+	"I": "4", "M": "6", "O": "6", "P": "7", "R": "7", "T": "8", "X": "9" }
+
+APPS = [
+	("firefox.desktop", "Firefox"),
+	("gimp.desktop", "GIMP Image Editor"),
+	("terminal.desktop", "Terminal"),
+	("editor.desktop", "Text Editor"),
+]
+
+
+def create_index(tmp_path, monkeypatch):
+	monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+	monkeypatch.setenv("XDG_DATA_DIRS", str(tmp_path / "shared"))
+	os.makedirs(str(tmp_path / "data" / "applications"))
+	index = AppIndex(CHAR_MAP, str(tmp_path / "cache" / "launcher.json"))
+	index.rebuild(APPS)
+	return index
+
+
+def ids(apps):
+	return [ a.id for a in apps ]
+
+
+class TestAppIndex(object):
+	
+	def test_search(self, tmp_path, monkeypatch):
+		"""
+		Tests if search returns same applications as testing
+		every one of them would, while query is typed and erased.
+		"""
+		index = create_index(tmp_path, monkeypatch)
+		for query in ("3", "33", "334", "3348", "33486", "334", "2", "", "8", "83"):
+			expected = [ a.id for a in index.apps if query and query in a.keys ]
+			assert ids(index.search(query)) == expected
+		assert ids(index.search("3348")) == [ "gimp.desktop", "editor.desktop" ]
+	
+	
+	def test_match(self, tmp_path, monkeypatch):
+		"""
+		Tests if matched range skips characters that are not on keyboard.
+		"""
+		index = create_index(tmp_path, monkeypatch)
+		app = index.search("983348")[0]
+		assert app.id == "editor.desktop"
+		start, end = index.match(app, "983348")
+		assert app.name[start:end] == "xt Edit"
+		assert index.match(app, "999") == (0, 0)
+	
+	
+	def test_recent(self, tmp_path, monkeypatch):
+		"""
+		Tests if launched applications are sorted first and remembered.
+		"""
+		index = create_index(tmp_path, monkeypatch)
+		assert ids(index.search("3348")) == [ "gimp.desktop", "editor.desktop" ]
+		index.launched("editor.desktop")
+		assert ids(index.search("3348")) == [ "editor.desktop", "gimp.desktop" ]
+		other = AppIndex(CHAR_MAP, index.filename)
+		assert other.load()
+		assert ids(other.search("3348")) == [ "editor.desktop", "gimp.desktop" ]
+	
+	
+	def test_invalidate(self, tmp_path, monkeypatch):
+		"""
+		Tests if saved index is not used after application directory is
+		changed or created, but launched applications are kept.
+		"""
+		index = create_index(tmp_path, monkeypatch)
+		index.launched("terminal.desktop")
+		os.makedirs(str(tmp_path / "shared" / "applications"))
+		other = AppIndex(CHAR_MAP, index.filename)
+		assert not other.load()
+		assert other.recent == [ "terminal.desktop" ]
+		other.rebuild(APPS)
+		assert AppIndex(CHAR_MAP, index.filename).load()
@@ -0,0 +1,58 @@
+from scc.calibration import PadRotation, parse_axis
+from scc.constants import STICK_PAD_MAX
+
+
+class State(object):
+	""" Mutable state, like ones used by SC drivers """
+	def __init__(self, lpad_x=0, lpad_y=0, rpad_x=0, rpad_y=0):
+		self.lpad_x, self.lpad_y = lpad_x, lpad_y
+		self.rpad_x, self.rpad_y = rpad_x, rpad_y
+
+
+class TestCalibration(object):
+	
+	def test_rotation(self):
+		"""
+		Tests if pads are rotated by configured angle
+		and only when respective pad is touched.
+		"""
+		r = PadRotation(90, -90)
+		state = State(1000, 0, 1000, 0)
+		r.apply(state, True, True)
+		assert (state.lpad_x, state.lpad_y) == (0, -1000)
+		assert (state.rpad_x, state.rpad_y) == (0, 1000)
+		state = State(1000, 0, 1000, 0)
+		r.apply(state, False, True)
+		assert (state.lpad_x, state.lpad_y) == (1000, 0)
+		assert (state.rpad_x, state.rpad_y) == (0, 1000)
+	
+	
+	def test_rotation_clamp(self):
+		"""
+		Tests if rotated values are clamped to pad range.
+		"""
+		r = PadRotation(45, 0)
+		state = State(STICK_PAD_MAX, STICK_PAD_MAX)
+		r.apply(state, True, True)
+		assert state.lpad_x == STICK_PAD_MAX
+		assert state.lpad_y == 0
+	
+	
+	def test_from_config(self):
+		"""
+		Tests if PadRotation is not created when there is nothing to rotate.
+		"""
+		assert PadRotation.from_config({ "input_rotation_l" : 0, "input_rotation_r" : 0 }) is None
+		r = PadRotation.from_config({ "input_rotation_l" : 20, "input_rotation_r" : 0 })
+		assert r.left is not None and r.right is None
+	
+	
+	def test_parse_axis(self):
+		"""
+		Tests if inverted and unsigned axes are calibrated to pad range.
+		"""
+		cal = parse_axis({ "min" : 0, "max" : 255 })
+		assert cal.offset == -1.0
+		assert 255 * cal.scale + cal.offset == 1.0
+		cal = parse_axis({ "min" : 127, "max" : -128 })
+		assert 127 * cal.scale + cal.offset < -0.99
@@ -0,0 +1,110 @@
+from scc.control_server import Connection
+from scc.sccdaemon import Client
+from scc.poller import Poller
+from scc import binevents
+import socket
+
+
+def create_client():
+	a, b = socket.socketpair()
+	poller = Poller()
+	client = Client(Connection(poller, a), None)
+	return client, b, poller
+
+
+def read_lines(sock, poller, count):
+	data = b""
+	sock.settimeout(5)
+	while data.count(b"\n") < count:
+		poller.poll(0)
+		data += sock.recv(65536)
+	return data.decode("utf-8").strip("\n").split("\n")
+
+
+class TestClientEvents(object):
+	
+	def test_send(self):
+		"""
+		Tests if queued events are sent in order.
+		"""
+		client, sock, poller = create_client()
+		client.send_event("sc0", "A", [ 1 ])
+		client.send_event("sc0", "STICK", [ 1, 2 ], "STICK")
+		client.send_event("sc0", "A", [ 0 ])
+		assert read_lines(sock, poller, 3) == [ "Event: sc0 A 1",
+			"Event: sc0 STICK 1 2", "Event: sc0 A 0" ]
+		assert client.events_sent == 3
+		client.stop_events()
+	
+	
+	def test_coalescing(self):
+		"""
+		Tests if waiting analog updates are replaced by newer ones,
+		but never moved before button event.
+		"""
+		client, sock, poller = create_client()
+		# Nothing is sent until poller finds socket writable
+		client.send_event("sc0", "STICK", [ 1, 1 ], "STICK")
+		client.send_event("sc0", "STICK", [ 2, 2 ], "STICK")
+		client.send_event("sc0", "A", [ 1 ])
+		client.send_event("sc0", "STICK", [ 3, 3 ], "STICK")
+		client.send_event("sc0", "STICK", [ 4, 4 ], "STICK")
+		assert read_lines(sock, poller, 3) == [ "Event: sc0 STICK 2 2",
+			"Event: sc0 A 1", "Event: sc0 STICK 4 4" ]
+		assert client.events_dropped == 2
+		client.stop_events()
+	
+	
+	def test_limit(self):
+		"""
+		Tests if analog updates are dropped when too many events are waiting.
+		"""
+		client, sock, poller = create_client()
+		for i in range(Client.MAX_QUEUED_EVENTS):
+			client.send_event("sc0", "A", [ i % 2 ])
+		client.send_event("sc0", "STICK", [ 1, 1 ], "STICK")
+		assert client.events_dropped == 1
+		client.send_event("sc0", "A", [ 0 ])
+		lines = read_lines(sock, poller, Client.MAX_QUEUED_EVENTS + 1)
+		assert len(lines) == Client.MAX_QUEUED_EVENTS + 1
+		assert "Event: sc0 STICK 1 1" not in lines
+		client.stop_events()
+	
+	
+	def test_not_reading(self):
+		"""
+		Tests if client that doesn't read events is disconnected instead
+		of blocking whoever is sending them.
+		"""
+		client, sock, poller = create_client()
+		closed = []
+		client.connection.on_close = closed.append
+		for i in range(10000):
+			client.send_event("sc0", "A", [ i % 2 ])
+			poller.poll(0)
+			if closed:
+				break
+		assert closed
+	
+	
+	def test_binary(self):
+		"""
+		Tests if events are sent as binary frames, one for every controller,
+		after binary format is requested.
+		"""
+		client, sock, poller = create_client()
+		client.set_binary_events(True)
+		client.send_event("sc0", "A", [ 1 ])
+		client.send_event("sc0", "STICK", [ 1, -2 ], "STICK")
+		client.send_event("sc1", "LT", [ 255, 0 ], "LT")
+		poller.poll(0)
+		data = b""
+		sock.settimeout(5)
+		while True:
+			first = binevents.unpack(data)
+			if first and binevents.unpack(data[first[2]:]):
+				break
+			data += sock.recv(4096)
+		assert first[0:2] == ("sc0", [ ("A", [ 1 ]), ("STICK", [ 1, -2 ]) ])
+		assert binevents.unpack(data[first[2]:])[0:2] == ("sc1", [ ("LT", [ 255, 0 ]) ])
+		client.stop_events()
@@ -0,0 +1,81 @@
+from scc.constants import SCButtons
+from scc.drivers.fake import FakeController
+from test_inputs import ZERO_STATE
+
+
+class RememberingMapper(object):
+	def __init__(self):
+		self.inputs = []
+	
+	def input(self, controller, old_state, state):
+		self.inputs.append(( old_state, state ))
+
+
+def create_controller():
+	c = FakeController(0)
+	c.set_mapper(RememberingMapper())
+	c.set_input_coalescing(True)
+	return c
+
+
+class TestCoalescing(object):
+	
+	def test_analog(self):
+		"""
+		Tests if only newest analog values are sent to mapper.
+		"""
+		c = create_controller()
+		old_state = ZERO_STATE
+		for x in range(1, 10):
+			state = ZERO_STATE._replace(stick_x=x * 100)
+			c.send_input(old_state, state)
+			old_state = state
+		assert c.mapper.inputs == []
+		assert c.flush_input()
+		assert c.mapper.inputs == [ (ZERO_STATE, old_state) ]
+		assert c.coalesced_dropped == 8
+		assert not c.flush_input()
+		assert len(c.mapper.inputs) == 1
+	
+	
+	def test_buttons_merged(self):
+		"""
+		Tests if inputs changing different buttons are merged.
+		"""
+		c = create_controller()
+		s1 = ZERO_STATE._replace(buttons=SCButtons.A)
+		s2 = ZERO_STATE._replace(buttons=SCButtons.A | SCButtons.B)
+		c.send_input(ZERO_STATE, s1)
+		c.send_input(s1, s2)
+		c.flush_input()
+		assert c.mapper.inputs == [ (ZERO_STATE, s2) ]
+		assert c.coalesced_merged == 1
+	
+	
+	def test_press_not_lost(self):
+		"""
+		Tests if pressing and releasing button before flush
+		generates both press and release.
+		"""
+		c = create_controller()
+		pressed = ZERO_STATE._replace(buttons=SCButtons.A, stick_x=10)
+		released = ZERO_STATE._replace(stick_x=20)
+		c.send_input(ZERO_STATE, pressed)
+		c.send_input(pressed, released)
+		assert c.mapper.inputs == [ (ZERO_STATE, pressed) ]
+		c.flush_input()
+		assert c.mapper.inputs == [ (ZERO_STATE, pressed), (pressed, released) ]
+	
+	
+	def test_disable(self):
+		"""
+		Tests if disabling coalescing sends pending input
+		and if inputs are sent right away when disabled.
+		"""
+		c = create_controller()
+		state = ZERO_STATE._replace(stick_x=10)
+		c.send_input(ZERO_STATE, state)
+		c.set_input_coalescing(False)
+		assert c.mapper.inputs == [ (ZERO_STATE, state) ]
+		c.send_input(state, ZERO_STATE)
+		assert c.mapper.inputs[-1] == (state, ZERO_STATE)
@@ -0,0 +1,104 @@
+from scc.config import Config
+import os, json, pytest
+
+
+def setup_config(tmp_path, monkeypatch):
+	monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+	Config._shared = None
+	return Config.shared()
+
+
+class TestConfig(object):
+	
+	def test_shared(self, tmp_path, monkeypatch):
+		"""
+		Tests if shared instance is created with defaults
+		and then reused while file is not changed.
+		"""
+		cfg = setup_config(tmp_path, monkeypatch)
+		assert os.path.exists(cfg.filename)
+		assert cfg["recent_max"] == 10
+		assert Config.shared() is cfg
+		assert not cfg.is_changed()
+	
+	
+	def test_reload(self, tmp_path, monkeypatch):
+		"""
+		Tests if shared instance is reloaded after file is changed.
+		"""
+		cfg = setup_config(tmp_path, monkeypatch)
+		other = Config()
+		other["enable_sniffing"] = True
+		other.save()
+		assert cfg.is_changed()
+		assert Config.shared() is cfg
+		assert cfg["enable_sniffing"] == True
+		assert not cfg.is_changed()
+	
+	
+	def test_no_save(self, tmp_path, monkeypatch):
+		"""
+		Tests if complete config is not written back when loaded
+		and if missing values are still filled and saved.
+		"""
+		cfg = setup_config(tmp_path, monkeypatch)
+		st = os.stat(cfg.filename)
+		os.utime(cfg.filename, ns=(st.st_atime_ns, st.st_mtime_ns - 10**9))
+		mtime = os.stat(cfg.filename).st_mtime_ns
+		Config()
+		assert os.stat(cfg.filename).st_mtime_ns == mtime
+		
+		data = json.loads(open(cfg.filename).read())
+		del data["recent_max"]
+		with open(cfg.filename, "w") as f:
+			f.write(json.dumps(data))
+		assert Config.shared()["recent_max"] == 10
+		assert "recent_max" in json.loads(open(cfg.filename).read())
+		assert not cfg.is_changed()
+	
+	
+	def test_read_only(self, tmp_path, monkeypatch):
+		"""
+		Tests if values of shared instance can't be changed
+		and if editable instance can still change and save them.
+		"""
+		cfg = setup_config(tmp_path, monkeypatch)
+		with pytest.raises(TypeError):
+			cfg["recent_max"] = 5
+		with pytest.raises(TypeError):
+			cfg["drivers"]["fake"] = True
+		with pytest.raises(AttributeError):
+			cfg["recent_profiles"].append("Desktop")
+		
+		other = Config()
+		other["recent_max"] = 5
+		other["drivers"]["fake"] = True
+		other.save()
+		assert Config.shared()["recent_max"] == 5
+		assert Config.shared()["drivers"]["fake"] == True
+	
+	
+	def test_controller_config(self, tmp_path, monkeypatch):
+		"""
+		Tests if controller config returned by shared instance has defaults
+		filled in, but nothing is stored into shared values or saved.
+		"""
+		cfg = setup_config(tmp_path, monkeypatch)
+		other = Config()
+		other.get_controller_config("sc1")["led_level"] = 20
+		other.save()
+		data = json.loads(open(cfg.filename).read())
+		del data["controllers"]["sc1"]["idle_timeout"]
+		with open(cfg.filename, "w") as f:
+			f.write(json.dumps(data))
+		
+		cfg = Config.shared()
+		ccfg = cfg.get_controller_config("sc1")
+		assert ccfg["led_level"] == 20
+		assert ccfg["idle_timeout"] == Config.CONTROLLER_DEFAULTS["idle_timeout"]
+		assert "idle_timeout" not in cfg["controllers"]["sc1"]
+		assert cfg.get_controller_config("sc2")["name"] == "sc2"
+		assert "sc2" not in cfg["controllers"]
+		ccfg["led_level"] = 50
+		assert cfg.get_controller_config("sc1")["led_level"] == 20
+		assert not cfg.is_changed()
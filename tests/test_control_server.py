@@ -0,0 +1,144 @@
+from scc.control_server import ControlServer, MAX_BUFFERED
+from scc.poller import Poller
+import os, socket
+
+
+class Recorder(object):
+	""" Accepts connections and records everything that happens to them """
+	
+	def __init__(self):
+		self.connections = []
+		self.messages = []
+		self.closed = []
+	
+	def on_connect(self, connection):
+		connection.on_message = lambda c, line: self.messages.append(line)
+		connection.on_close = self.closed.append
+		self.connections.append(connection)
+
+
+def create_server(tmp_path):
+	poller, recorder = Poller(), Recorder()
+	server = ControlServer(poller, str(tmp_path / "daemon.socket"), recorder.on_connect)
+	return server, poller, recorder
+
+
+def connect(server, poller):
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	sock.connect(server.socket_file)
+	sock.settimeout(5)
+	poller.poll(0)
+	return sock
+
+
+def poll_until(poller, condition):
+	for i in range(100):
+		if condition():
+			return True
+		poller.poll(0.05)
+	return condition()
+
+
+class TestControlServer(object):
+	
+	def test_lines(self, tmp_path):
+		"""
+		Tests if messages split between reads and multiple messages
+		in single read are dispatched as separate lines.
+		"""
+		server, poller, recorder = create_server(tmp_path)
+		sock = connect(server, poller)
+		assert len(recorder.connections) == 1
+		sock.sendall(b"Led: ")
+		poller.poll(0.1)
+		assert recorder.messages == []
+		sock.sendall(b"50\nUnlock.\nTurnoff.\n")
+		assert poll_until(poller, lambda : len(recorder.messages) == 3)
+		assert recorder.messages == [ b"Led: 50", b"Unlock.", b"Turnoff." ]
+		server.close()
+	
+	
+	def test_clients(self, tmp_path):
+		"""
+		Tests if multiple clients are served by single thread
+		and responses reach correct one.
+		"""
+		server, poller, recorder = create_server(tmp_path)
+		socks = [ connect(server, poller) for i in range(10) ]
+		assert len(recorder.connections) == 10
+		responded = []
+		def on_message(c, line):
+			c.write(line + b" OK.\n")
+			responded.append(c)
+		for c in recorder.connections:
+			c.on_message = on_message
+		for i, sock in enumerate(socks):
+			sock.sendall(b"%i\n" % (i,))
+		assert poll_until(poller, lambda : len(responded) == 10)
+		for i, sock in enumerate(socks):
+			assert sock.recv(100) == b"%i OK.\n" % (i,)
+		server.close()
+	
+	
+	def test_pause(self, tmp_path):
+		"""
+		Tests if messages received while connection is paused are
+		dispatched only after it's resumed.
+		"""
+		server, poller, recorder = create_server(tmp_path)
+		sock = connect(server, poller)
+		connection = recorder.connections[0]
+		connection.on_message = lambda c, line: (
+			recorder.messages.append(line), c.pause())
+		sock.sendall(b"Profile: a\nUnlock.\n")
+		assert poll_until(poller, lambda : len(recorder.messages) == 1)
+		poller.poll(0.1)
+		assert recorder.messages == [ b"Profile: a" ]
+		connection.resume()
+		assert recorder.messages == [ b"Profile: a", b"Unlock." ]
+		server.close()
+	
+	
+	def test_buffering(self, tmp_path):
+		"""
+		Tests if data that can't be sent immediately is sent once
+		other side starts reading and if connection is closed when
+		other side doesn't read at all.
+		"""
+		server, poller, recorder = create_server(tmp_path)
+		sock = connect(server, poller)
+		connection = recorder.connections[0]
+		chunk = b"x" * 65535 + b"\n"
+		# Write more than socket buffer can hold, but less than MAX_BUFFERED
+		for i in range(8):
+			connection.write(chunk)
+		assert connection._out
+		data = b""
+		while len(data) < 8 * len(chunk):
+			poller.poll(0)
+			data += sock.recv(len(chunk))
+		assert data == chunk * 8
+		assert poll_until(poller, lambda : not connection._out)
+		
+		for i in range(MAX_BUFFERED // len(chunk) + 8):
+			connection.write(chunk)
+		assert poll_until(poller, lambda : recorder.closed)
+		server.close()
+	
+	
+	def test_close(self, tmp_path):
+		"""
+		Tests if on_close is called when other side disconnects and if
+		closing server closes remaining connections and removes socket.
+		"""
+		server, poller, recorder = create_server(tmp_path)
+		a = connect(server, poller)
+		b = connect(server, poller)
+		a.close()
+		assert poll_until(poller, lambda : len(recorder.closed) == 1)
+		assert recorder.closed[0] is recorder.connections[0]
+		assert len(server.connections) == 1
+		server.close()
+		assert len(recorder.closed) == 2
+		assert b.recv(100) == b""
+		assert not os.path.exists(server.socket_file)
@@ -0,0 +1,109 @@
+from scc.control_server import Connection
+from scc.sccdaemon import SCCDaemon, Client
+from scc.constants import SCButtons
+from scc.parser import ActionParser
+from scc.profile import Profile
+from scc.mapper import Mapper
+from scc.config import Config
+from scc.drivers.fake import FakeController
+from test_inputs import ZERO_STATE, RememberingDummy
+import scc.tracing
+import socket, time, threading
+
+
+def create_daemon(tmp_path, monkeypatch, **config):
+	monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+	monkeypatch.setattr(scc.tracing, "ENABLED", False)
+	cfg = Config()
+	for key in config:
+		cfg[key] = config[key]
+	cfg.save()
+	Config._shared = None
+	return SCCDaemon(str(tmp_path / "daemon.pid"), str(tmp_path / "daemon.socket"))
+
+
+def create_mapper(daemon):
+	mapper = Mapper(Profile(ActionParser()), daemon.scheduler,
+		keyboard=False, mouse=False, gamepad=False, poller=None)
+	mapper.keyboard = RememberingDummy()
+	mapper.set_controller(FakeController(0))
+	mapper.get_controller().set_mapper(mapper)
+	return mapper
+
+
+def create_client(daemon, mapper):
+	a, b = socket.socketpair()
+	b.settimeout(5)
+	return Client(Connection(daemon.poller, a), mapper), b
+
+
+def read_response(sock, poller):
+	""" Reads lines until 'OK.' or 'Fail:' is received """
+	data = b""
+	while not data.endswith(b"OK.\n") and b"Fail:" not in data:
+		poller.poll(0)
+		data += sock.recv(65536)
+	return data.decode("utf-8").strip("\n").split("\n")
+
+
+def run_until(daemon, condition):
+	""" Runs daemon mainloop until condition is met """
+	end = time.time() + 5
+	while not condition() and time.time() < end:
+		daemon.poller.poll(0.05)
+		daemon.scheduler.run()
+	assert condition()
+
+
+class TestDaemon(object):
+	
+	def test_stats(self, tmp_path, monkeypatch):
+		"""
+		Tests if 'Stats.' is answered with latency measured by tracer
+		when tracing is enabled.
+		"""
+		daemon = create_daemon(tmp_path, monkeypatch, latency_tracing=5)
+		daemon.init_tracing()
+		assert scc.tracing.ENABLED
+		mapper = create_mapper(daemon)
+		mapper.set_tracer(scc.tracing.Tracer())
+		daemon.default_mapper = mapper
+		state = ZERO_STATE._replace(buttons=SCButtons.A)
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		
+		client, sock = create_client(daemon, mapper)
+		daemon._handle_message(client, b"Stats.")
+		lines = read_response(sock, daemon.poller)
+		assert lines[-1] == "OK."
+		stats = { l.split(" ")[2] : l.split(" ") for l in lines
+			if l.startswith("Stats: ") }
+		assert stats["total"][1] == "fake0"
+		assert stats["total"][3] == "1"
+	
+	
+	def test_profile_order(self, tmp_path, monkeypatch):
+		"""
+		Tests if profile requested last is used even when one requested
+		before it takes longer to load.
+		"""
+		daemon = create_daemon(tmp_path, monkeypatch)
+		mapper = create_mapper(daemon)
+		profiles = { "slow": Profile(ActionParser()), "fast": Profile(ActionParser()) }
+		slow_loaded = threading.Event()
+		def load(filename, parser):
+			if filename == "slow":
+				slow_loaded.wait(5)
+			return profiles[filename]
+		monkeypatch.setattr(daemon.profile_cache, "load", load)
+		
+		results = {}
+		def callback(name):
+			return lambda load_time, swap_time, error: results.update({ name: error })
+		daemon._set_profile(mapper, "slow", callback("slow"))
+		daemon._set_profile(mapper, "fast", callback("fast"))
+		run_until(daemon, lambda : "fast" in results)
+		slow_loaded.set()
+		run_until(daemon, lambda : "slow" in results)
+		assert results["fast"] is None
+		assert results["slow"] is not None
+		assert mapper.profile is profiles["fast"]
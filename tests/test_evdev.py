@@ -0,0 +1,161 @@
+from scc.drivers.evdevdrv import EvdevController, EVENT
+from scc.drivers.evdevdrv import EV_SYN, EV_KEY, EV_ABS, SYN_REPORT
+from scc.constants import SCButtons, STICK_PAD_MAX, TRIGGER_MAX
+import os
+
+CONFIG = {
+	"buttons" : { "304" : "A", "310" : "LB", "312" : "ltrig" },
+	"axes" : {
+		"0" : { "axis" : "stick_x", "min" : -32768, "max" : 32767 },
+		"1" : { "axis" : "stick_y", "min" : 32767, "max" : -32768 },
+		"3" : { "axis" : "rpad_x", "min" : -32768, "max" : 32767 },
+	},
+	"dpads" : {
+		"544" : { "axis" : "lpad_y", "min" : -1, "max" : 1, "positive" : True },
+	},
+}
+
+
+class FakeDevice(object):
+	""" Device with fd that can be written to """
+	fn = "/dev/input/event-test"
+	
+	def __init__(self):
+		self.fd, self.w = os.pipe()
+		os.set_blocking(self.fd, False)
+	
+	def write(self, *events):
+		os.write(self.w, b"".join([ EVENT.pack(0, 0, *e) for e in events ]))
+	
+	def close(self):
+		os.close(self.fd)
+		os.close(self.w)
+
+
+class RememberingMapper(object):
+	def __init__(self):
+		self.inputs = []
+		self.scheduled = []
+	
+	def input(self, controller, old_state, state):
+		self.inputs.append(( old_state, state ))
+	
+	def schedule(self, delay, cb, *data):
+		self.scheduled.append(cb)
+		return None
+	
+	def cancel_task(self, task):
+		pass
+
+
+def create_controller():
+	device = FakeDevice()
+	c = EvdevController(None, device, None, CONFIG)
+	c.set_mapper(RememberingMapper())
+	return c, device
+
+
+class TestEvdev(object):
+	
+	def test_one_input_per_report(self):
+		"""
+		Tests if mapper gets exactly one input for every SYN_REPORT,
+		no matter how many events report contains.
+		"""
+		c, device = create_controller()
+		device.write(( EV_KEY, 304, 1 ), ( EV_KEY, 312, 1 ), ( EV_ABS, 0, 32767 ),
+			( EV_ABS, 1, -32768 ), ( EV_SYN, SYN_REPORT, 0 ))
+		c.input()
+		assert len(c.mapper.inputs) == 1
+		old_state, state = c.mapper.inputs[0]
+		assert old_state.buttons == 0 and old_state.stick_x == 0
+		assert state.buttons == SCButtons.A
+		assert state.ltrig == TRIGGER_MAX
+		assert state.stick_x > STICK_PAD_MAX * 0.99
+		assert state.stick_y > STICK_PAD_MAX * 0.99
+		device.close()
+	
+	
+	def test_report_split_between_reads(self):
+		"""
+		Tests if events are not sent to mapper before SYN_REPORT is read.
+		"""
+		c, device = create_controller()
+		device.write(( EV_KEY, 304, 1 ), ( EV_KEY, 310, 1 ))
+		c.input()
+		assert len(c.mapper.inputs) == 0
+		device.write(( EV_KEY, 310, 0 ), ( EV_SYN, SYN_REPORT, 0 ),
+			( EV_KEY, 304, 0 ), ( EV_SYN, SYN_REPORT, 0 ))
+		c.input()
+		assert [ s.buttons for (o, s) in c.mapper.inputs ] == [ SCButtons.A, 0 ]
+		device.close()
+	
+	
+	def test_pad_touch_emulation(self):
+		"""
+		Tests if moving axis mapped to pad and pressing dpad mapped to pad
+		emulates pad touch.
+		"""
+		c, device = create_controller()
+		device.write(( EV_ABS, 3, 32767 ), ( EV_KEY, 544, 1 ), ( EV_SYN, SYN_REPORT, 0 ))
+		c.input()
+		old_state, state = c.mapper.inputs[-1]
+		assert state.buttons & SCButtons.RPADTOUCH
+		assert state.buttons & SCButtons.LPADTOUCH
+		assert state.buttons & SCButtons.LPAD
+		assert state.rpad_x > STICK_PAD_MAX * 0.99
+		assert state.lpad_y > 0
+		device.close()
+	
+	
+	def test_state_changed_by_other_source(self):
+		"""
+		Tests if fields changed outside of report being read are preserved.
+		"""
+		c, device = create_controller()
+		device.write(( EV_KEY, 304, 1 ))
+		c.input()
+		c._state = c._state._replace(buttons=SCButtons.B, gpitch=10)
+		device.write(( EV_SYN, SYN_REPORT, 0 ))
+		c.input()
+		old_state, state = c.mapper.inputs[-1]
+		assert state.buttons == SCButtons.A | SCButtons.B
+		assert state.gpitch == 10
+		device.close()
+	
+	
+	def test_pad_touch_emulation_canceled(self):
+		"""
+		Tests if pad touch is emulated again when axis is moved after
+		emulated touch was released.
+		"""
+		c, device = create_controller()
+		device.write(( EV_ABS, 3, 32767 ), ( EV_SYN, SYN_REPORT, 0 ),
+			( EV_ABS, 3, 0 ), ( EV_SYN, SYN_REPORT, 0 ))
+		c.input()
+		assert c.mapper.inputs[-1][1].buttons & SCButtons.RPADTOUCH
+		c.cancel_padpress_emulation(c.mapper)
+		assert not c.mapper.inputs[-1][1].buttons & SCButtons.RPADTOUCH
+		del c.mapper.scheduled[:]
+		device.write(( EV_ABS, 3, 32767 ), ( EV_SYN, SYN_REPORT, 0 ))
+		c.input()
+		assert c.mapper.inputs[-1][1].buttons & SCButtons.RPADTOUCH
+		assert c.mapper.scheduled == [ c.cancel_padpress_emulation ]
+		device.close()
+	
+	
+	def test_coalescing(self):
+		"""
+		Tests if reports are coalesced when input coalescing is enabled.
+		"""
+		c, device = create_controller()
+		c.set_input_coalescing(True)
+		device.write(( EV_KEY, 304, 1 ), ( EV_SYN, SYN_REPORT, 0 ),
+			( EV_ABS, 0, 32767 ), ( EV_SYN, SYN_REPORT, 0 ))
+		c.input()
+		assert c.mapper.inputs == []
+		assert c.flush_input()
+		old_state, state = c.mapper.inputs[-1]
+		assert state.buttons == SCButtons.A
+		assert state.stick_x > STICK_PAD_MAX * 0.99
+		device.close()
@@ -0,0 +1,67 @@
+from scc.gridindex import GridIndex
+import random
+
+
+class Rect(object):
+	def __init__(self, x, y, w, h):
+		self.x, self.y, self.w, self.h = x, y, w, h
+	
+	def contains(self, x, y):
+		return (x >= self.x and y >= self.y
+			and x <= self.x + self.w and y <= self.y + self.h)
+
+
+def linear(items, x, y):
+	for i in items:
+		if i.contains(x, y):
+			return i
+	return None
+
+
+class TestGridIndex(object):
+	
+	def test_edges(self):
+		"""
+		Tests if points on edges and corners are found,
+		including ones laying on cell boundaries.
+		"""
+		a, b = Rect(0, 0, 10, 10), Rect(10, 0, 10, 10)
+		index = GridIndex([ a, b ], cell_size=10)
+		assert index.find(0, 0) is a
+		assert index.find(10, 10) is a
+		assert index.find(10.5, 10) is b
+		assert index.find(20, 0) is b
+		assert index.find(20.5, 0) is None
+		assert index.find(-0.5, 5) is None
+	
+	
+	def test_order(self):
+		"""
+		Tests if first matching item is returned when items overlap,
+		same as with linear search.
+		"""
+		big, small = Rect(0, 0, 100, 100), Rect(40, 40, 5, 5)
+		assert GridIndex([ big, small ]).find(42, 42) is big
+		assert GridIndex([ small, big ]).find(42, 42) is small
+	
+	
+	def test_random(self):
+		"""
+		Tests if index gives same results as linear search on random layout.
+		"""
+		rnd = random.Random(1)
+		items = [ Rect(rnd.uniform(-50, 500), rnd.uniform(-50, 500),
+			rnd.uniform(0, 80), rnd.uniform(0, 80)) for i in range(200) ]
+		items.append(Rect(30, 30, 0, 0))
+		index = GridIndex(items)
+		for i in range(5000):
+			x, y = rnd.uniform(-100, 600), rnd.uniform(-100, 600)
+			assert index.find(x, y) is linear(items, x, y)
+		assert index.find(30, 30) is linear(items, 30, 30)
+	
+	
+	def test_empty(self):
+		"""
+		Tests if empty index finds nothing.
+		"""
+		assert GridIndex([]).find(0, 0) is None
@@ -249,3 +249,46 @@ class TestInputs(object):
 		_state, state = state, state._replace(buttons=SCButtons.A)
 		mapper.input(mapper.controller, _state, state)
 		assert Keys.KEY_Y in mapper.keyboard.pressed
+	
+	
+	@input_test
+	def test_multiple_buttons(self, mapper):
+		"""
+		Tests pressing and releasing multiple buttons with one input,
+		with one of them not bound to anything.
+		"""
+		mapper.profile.buttons[SCButtons.A] = (parser
+			.restart("button(Keys.KEY_ENTER)")).parse()
+		mapper.profile.buttons[SCButtons.B] = (parser
+			.restart("button(Keys.KEY_ESC)")).parse()
+		state = ZERO_STATE._replace(buttons=SCButtons.A | SCButtons.B | SCButtons.X)
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		assert mapper.keyboard.pressed == { Keys.KEY_ENTER, Keys.KEY_ESC }
+		mapper.input(mapper.controller, state, ZERO_STATE)
+		assert not mapper.keyboard.pressed
+	
+	
+	@input_test
+	def test_profile_changed(self, mapper):
+		"""
+		Tests if action changed in profile after input was processed
+		is used once profile_changed is called or new profile is assigned.
+		"""
+		state = ZERO_STATE._replace(buttons=SCButtons.A)
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		mapper.input(mapper.controller, state, ZERO_STATE)
+		assert not mapper.keyboard.pressed
+		
+		mapper.profile.buttons[SCButtons.A] = (parser
+			.restart("button(Keys.KEY_ENTER)")).parse()
+		mapper.profile_changed()
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		assert Keys.KEY_ENTER in mapper.keyboard.pressed
+		mapper.input(mapper.controller, state, ZERO_STATE)
+		
+		profile = Profile(parser)
+		profile.buttons[SCButtons.A] = (parser
+			.restart("button(Keys.KEY_TAB)")).parse()
+		mapper.profile = profile
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		assert mapper.keyboard.pressed == { Keys.KEY_TAB }
@@ -0,0 +1,35 @@
+from scc.poller import Poller
+import os, time, threading
+
+
+def wakeup_from_thread(poller):
+	t = threading.Thread(target=poller.wakeup)
+	t.start()
+	t.join()
+
+
+class TestPoller(object):
+	
+	def test_wakeup(self, monkeypatch):
+		"""
+		Tests if wakeup() called from another thread wakes up poll()
+		every time, even after it was called while poller was reading
+		from wakeup pipe.
+		"""
+		poller = Poller()
+		real_read = os.read
+		def read(fd, size):
+			if fd == poller._wakeup_r:
+				wakeup_from_thread(poller)
+			return real_read(fd, size)
+		
+		monkeypatch.setattr(os, "read", read)
+		wakeup_from_thread(poller)
+		poller.poll(1)
+		monkeypatch.undo()
+		
+		for i in range(100):
+			wakeup_from_thread(poller)
+			start = time.perf_counter()
+			poller.poll(1)
+			assert time.perf_counter() - start < 0.5
@@ -0,0 +1,81 @@
+from scc.constants import SCButtons
+from scc.parser import ActionParser
+from scc.profile import Profile, ProfileCache
+from scc.modifiers import ModeModifier
+import os, shutil
+
+PROFILE = os.path.join("default_profiles", "Desktop.sccprofile")
+
+def copy_profile(tmp_path, name="test.sccprofile"):
+	filename = str(tmp_path / name)
+	shutil.copy(PROFILE, filename)
+	return filename
+
+
+class TestProfileCache(object):
+	
+	def test_hit(self, tmp_path):
+		"""
+		Tests if second load is served from cache and returns
+		new profile with new action instances.
+		"""
+		filename = copy_profile(tmp_path)
+		cache = ProfileCache()
+		p1 = cache.load(filename, ActionParser())
+		p2 = cache.load(filename, ActionParser())
+		assert (cache.hits, cache.misses) == (1, 1)
+		assert p1 is not p2
+		assert p1.buttons[SCButtons.A] is not p2.buttons[SCButtons.A]
+		assert ([ a.to_string() for a in p1.get_actions() ]
+			== [ a.to_string() for a in p2.get_actions() ])
+	
+	
+	def test_modified(self, tmp_path):
+		"""
+		Tests if profile is loaded again when file is modified.
+		"""
+		filename = copy_profile(tmp_path)
+		cache = ProfileCache()
+		cache.load(filename, ActionParser())
+		p = Profile(ActionParser()).load(filename)
+		a = ActionParser().restart("button(Keys.KEY_Z)").parse()
+		p.buttons[SCButtons.A] = a
+		p.save(filename)
+		st = os.stat(filename)
+		os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+		p = cache.load(filename, ActionParser())
+		assert (cache.hits, cache.misses) == (0, 2)
+		assert p.buttons[SCButtons.A].to_string() == a.to_string()
+	
+	
+	def test_eviction(self, tmp_path):
+		"""
+		Tests if least recently used profile is dropped from full cache.
+		"""
+		files = [ copy_profile(tmp_path, "%s.sccprofile" % (x,)) for x in range(3) ]
+		cache = ProfileCache(2)
+		cache.load(files[0], ActionParser())
+		cache.load(files[1], ActionParser())
+		cache.load(files[0], ActionParser())
+		cache.load(files[2], ActionParser())
+		assert len(cache) == 2
+		cache.load(files[0], ActionParser())
+		cache.load(files[1], ActionParser())
+		assert (cache.hits, cache.misses) == (2, 4)
+	
+	
+	def test_modeshift(self, tmp_path):
+		"""
+		Tests if ModeModifier, which holds closures, survives caching.
+		"""
+		filename = str(tmp_path / "test.sccprofile")
+		p = Profile(ActionParser())
+		p.buttons[SCButtons.A] = ActionParser().restart(
+			"mode(B, button(Keys.KEY_B), button(Keys.KEY_A))").parse()
+		p.save(filename)
+		cache = ProfileCache()
+		cache.load(filename, ActionParser())
+		a = cache.load(filename, ActionParser()).buttons[SCButtons.A]
+		assert cache.hits == 1
+		assert isinstance(a, ModeModifier)
+		assert len(a.checks) == 1
@@ -0,0 +1,86 @@
+from scc.constants import STICK_PAD_MIN, SCButtons
+from scc.drivers.replay import ReplayController
+from scc.drivers.fake import FakeController
+from scc.recorder import Recorder, load
+from scc.parser import ActionParser
+from scc.profile import Profile
+from scc.scheduler import Scheduler
+from scc.mapper import Mapper
+from test_inputs import ZERO_STATE, RememberingDummy
+import time
+
+parser = ActionParser()
+
+def create_mapper():
+	profile = Profile(parser)
+	profile.buttons[SCButtons.A] = parser.restart("button(Keys.KEY_ENTER)").parse()
+	profile.pads[Profile.LEFT] = parser.restart(
+		"ball(XY(mouse(Rels.REL_HWHEEL), mouse(Rels.REL_WHEEL)))").parse()
+	mapper = Mapper(profile, Scheduler(), keyboard=False, mouse=False, gamepad=False)
+	mapper.keyboard = RememberingDummy()
+	mapper.mouse = RememberingDummy()
+	mapper._testing = True
+	return mapper
+
+
+class TestRecorder(object):
+	
+	def test_load(self, tmp_path):
+		"""
+		Tests if recorded inputs are loaded back with same values and times.
+		"""
+		filename = str(tmp_path / "test.sccrec")
+		r = Recorder(filename, 3)
+		c = FakeController(0)
+		states = [ ZERO_STATE._replace(buttons=SCButtons.A, lpad_x=-5),
+			ZERO_STATE._replace(ltrig=255, q4=STICK_PAD_MIN) ]
+		for s in states:
+			r.record(c, s)
+		r.close()
+		
+		flags, frames = load(filename)
+		assert flags == 3
+		assert len(frames) == 2
+		assert frames[0][0] == 0.0
+		for (t, gyro, recorded), s in zip(frames, states):
+			assert not gyro
+			for field in ZERO_STATE._fields:
+				assert getattr(recorded, field) == getattr(s, field)
+			assert recorded.accel_x == 0
+	
+	
+	def test_replay(self, tmp_path):
+		"""
+		Tests if replaying recording generates same outputs
+		as original inputs did.
+		"""
+		filename = str(tmp_path / "test.sccrec")
+		_time = time.time
+		t = [ _time() ]
+		time.time = lambda : t[0]
+		try:
+			mapper = create_mapper()
+			mapper.set_controller(FakeController(0))
+			mapper.set_recorder(Recorder(filename))
+			state = ZERO_STATE
+			for x in range(0, STICK_PAD_MIN, -1000):
+				new_state = state._replace(buttons=SCButtons.LPADTOUCH | SCButtons.A, lpad_x=x)
+				mapper.input(mapper.controller, state, new_state)
+				state = new_state
+				t[0] += 0.01
+			for x in range(50):
+				mapper.input(mapper.controller, state, ZERO_STATE)
+				state = ZERO_STATE
+				t[0] += 0.01
+			mapper.set_recorder(None)
+		finally:
+			time.time = _time
+		
+		assert mapper.mouse.scroll_x != 0
+		c = ReplayController(filename)
+		replayed = create_mapper()
+		replayed.set_controller(c)
+		c.set_mapper(replayed)
+		c.replay()
+		assert replayed.mouse.scroll_x == mapper.mouse.scroll_x
+		assert replayed.keyboard.pressed == mapper.keyboard.pressed
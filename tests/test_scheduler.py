@@ -0,0 +1,101 @@
+from scc.scheduler import Scheduler
+import threading, time
+
+class TestScheduler(object):
+	
+	def test_order(self):
+		"""
+		Tests if tasks are executed ordered by time and, for same time,
+		in order in which they were scheduled.
+		"""
+		s, out = Scheduler(), []
+		s.schedule(0.002, out.append, 3)
+		for i in range(3):
+			s.schedule(0, out.append, i)
+		time.sleep(0.01)
+		s.run()
+		assert out == [ 0, 1, 2, 3 ]
+	
+	
+	def test_cancel(self):
+		"""
+		Tests if canceled task is not executed and if canceling same
+		or already executed task returns False.
+		"""
+		s, out = Scheduler(), []
+		tasks = [ s.schedule(0, out.append, i) for i in range(4) ]
+		assert s.cancel_task(tasks[1])
+		assert not s.cancel_task(tasks[1])
+		assert len(s) == 3
+		s.run()
+		assert out == [ 0, 2, 3 ]
+		assert not s.cancel_task(tasks[0])
+		assert len(s) == 0
+	
+	
+	def test_compact(self):
+		"""
+		Tests if scheduler stays consistent when many tasks are canceled.
+		"""
+		s, out = Scheduler(), []
+		keep = s.schedule(0, out.append, "kept")
+		for i in range(Scheduler.COMPACT_THRESHOLD * 4):
+			s.cancel_task(s.schedule(0, out.append, i))
+		assert len(s) == 1
+		s.run()
+		assert out == [ "kept" ]
+		assert not keep.pending
+	
+	
+	def test_next_deadline(self):
+		"""
+		Tests if next_deadline skips canceled tasks.
+		"""
+		s = Scheduler()
+		assert s.next_deadline() is None
+		assert s.get_timeout() is None
+		first = s.schedule(10, lambda: None)
+		second = s.schedule(20, lambda: None)
+		assert s.next_deadline() == first.time
+		s.cancel_task(first)
+		assert s.next_deadline() == second.time
+		assert 10 < s.get_timeout() <= 20
+	
+	
+	def test_other_thread(self):
+		"""
+		Tests if task scheduled from other thread wakes up main thread
+		and gets executed.
+		"""
+		s, out, woken = Scheduler(), [], []
+		s.set_wakeup(lambda: woken.append(True))
+		t = threading.Thread(target=lambda: s.schedule(0, out.append, 1))
+		t.start()
+		t.join()
+		assert woken
+		assert s.next_deadline() is not None
+		s.run()
+		assert out == [ 1 ]
+	
+	
+	def test_compact_incoming(self):
+		"""
+		Tests if tasks scheduled from other thread and canceled before
+		they got to heap are counted correctly when heap is compacted.
+		"""
+		s, out = Scheduler(), []
+		s.set_wakeup(lambda: None)
+		incoming = []
+		t = threading.Thread(target=lambda: incoming.extend([
+			s.schedule(0, out.append, i) for i in range(10) ]))
+		t.start()
+		t.join()
+		for task in incoming:
+			s.cancel_task(task)
+		keep = s.schedule(0, out.append, "kept")
+		for i in range(Scheduler.COMPACT_THRESHOLD * 4):
+			s.cancel_task(s.schedule(0, out.append, i))
+		assert len(s) == 1
+		s.run()
+		assert out == [ "kept" ]
+		assert len(s) == 0
@@ -0,0 +1,76 @@
+from scc.sequence import InputSequence
+
+
+def feed(sequence, numbers):
+	""" Returns list of sequence numbers that were accepted """
+	return [ seq for seq in numbers if sequence.check(seq) ]
+
+
+class TestInputSequence(object):
+	
+	def test_in_order(self):
+		"""
+		Tests if packets received in order are all accepted
+		and nothing is counted as lost.
+		"""
+		sequence = InputSequence()
+		assert feed(sequence, range(100, 200)) == list(range(100, 200))
+		assert sequence.get_stats() == (100, 0, 0)
+	
+	
+	def test_gap(self):
+		"""
+		Tests if skipped sequence numbers are counted as lost.
+		"""
+		sequence = InputSequence()
+		assert feed(sequence, [ 10, 11, 15, 16, 20 ]) == [ 10, 11, 15, 16, 20 ]
+		assert sequence.get_stats() == (5, 6, 0)
+	
+	
+	def test_wrap(self):
+		"""
+		Tests if sequence number wrapping from 0xFFFF to 0 is neither
+		lost nor reordered packet.
+		"""
+		sequence = InputSequence()
+		numbers = [ 0xFFFD, 0xFFFE, 0xFFFF, 0, 1, 2 ]
+		assert feed(sequence, numbers) == numbers
+		assert sequence.get_stats() == (6, 0, 0)
+		# Packet from before wrap arriving late
+		assert feed(sequence, [ 0xFFFE ]) == []
+		assert sequence.get_stats() == (7, 0, 1)
+		# Gap over wrap
+		sequence = InputSequence()
+		assert feed(sequence, [ 0xFFFE, 1 ]) == [ 0xFFFE, 1 ]
+		assert sequence.get_stats() == (2, 2, 0)
+	
+	
+	def test_reordered(self):
+		"""
+		Tests if packets older than last accepted one, or same, are
+		ignored and counted as reordered, also when wrapping.
+		"""
+		sequence = InputSequence(reorder_window=64)
+		assert feed(sequence, [ 100, 102, 101, 103, 103, 40, 104 ]) == [ 100, 102, 103, 104 ]
+		assert sequence.get_stats() == (7, 1, 3)
+		
+		sequence = InputSequence(reorder_window=64)
+		assert feed(sequence, [ 0xFFFF, 1, 0, 0xFFFE, 2 ]) == [ 0xFFFF, 1, 2 ]
+		assert sequence.get_stats() == (5, 1, 2)
+	
+	
+	def test_restart(self):
+		"""
+		Tests if jump back by more than reorder window is taken as
+		restarted controller and following packets are accepted.
+		"""
+		sequence = InputSequence(reorder_window=64)
+		assert feed(sequence, range(5000, 5010)) == list(range(5000, 5010))
+		assert feed(sequence, range(0, 10)) == list(range(0, 10))
+		assert sequence.get_stats() == (20, 0, 0)
+		# Restart to number just below last one can't be told from
+		# reordered packets, so those are ignored until sequence catches up
+		sequence = InputSequence(reorder_window=64)
+		assert feed(sequence, range(20, 30)) == list(range(20, 30))
+		assert feed(sequence, range(0, 35)) == list(range(30, 35))
+		assert sequence.get_stats() == (45, 0, 30)
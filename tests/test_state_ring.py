@@ -0,0 +1,120 @@
+from scc.statering import StateRing, StateRingReader, UINT32, SEQUENCE_OFFSET
+from scc.constants import SCButtons, STICK_PAD_MIN
+from scc.drivers.fake import FakeController
+from scc.parser import ActionParser
+from scc.profile import Profile
+from scc.scheduler import Scheduler
+from scc.mapper import Mapper
+from test_inputs import ZERO_STATE, RememberingDummy
+import os, pytest
+
+
+class TestStateRing(object):
+	
+	def test_read(self, tmp_path):
+		"""
+		Tests if published states are read back with same values.
+		"""
+		filename = str(tmp_path / "sc0.state")
+		ring = StateRing(filename)
+		reader = StateRingReader(filename)
+		c = FakeController(0)
+		assert reader.get_frame_count() == 0
+		assert reader.get_state() is None
+		
+		state = ZERO_STATE._replace(buttons=SCButtons.A, lpad_x=-5, q4=STICK_PAD_MIN)
+		ring.publish(c, state)
+		assert reader.get_frame_count() == 1
+		recorded = reader.get_state()
+		for field in ZERO_STATE._fields:
+			assert getattr(recorded, field) == getattr(state, field)
+		assert recorded.accel_x == 0
+		ring.close()
+		reader.close()
+	
+	
+	def test_history(self, tmp_path):
+		"""
+		Tests if history is returned oldest first and only last 'slots'
+		frames are kept.
+		"""
+		filename = str(tmp_path / "sc0.state")
+		ring = StateRing(filename, slots=4)
+		reader = StateRingReader(filename)
+		c = FakeController(0)
+		for i in range(10):
+			ring.publish(c, ZERO_STATE._replace(ltrig=i))
+		assert reader.get_frame_count() == 10
+		assert [ s.ltrig for t, gyro, s in reader.read(3) ] == [ 7, 8, 9 ]
+		assert [ s.ltrig for t, gyro, s in reader.read(100) ] == [ 6, 7, 8, 9 ]
+		times = [ t for t, gyro, s in reader.read(4) ]
+		assert times == sorted(times)
+		ring.close()
+		reader.close()
+	
+	
+	def test_write_in_progress(self, tmp_path):
+		"""
+		Tests if reader gives up instead of returning state
+		that is being written.
+		"""
+		filename = str(tmp_path / "sc0.state")
+		ring = StateRing(filename)
+		reader = StateRingReader(filename)
+		ring.publish(FakeController(0), ZERO_STATE)
+		UINT32.pack_into(ring._map, SEQUENCE_OFFSET, ring._sequence + 1)
+		assert reader.read() is None
+		UINT32.pack_into(ring._map, SEQUENCE_OFFSET, ring._sequence)
+		assert len(reader.read()) == 1
+		ring.close()
+		reader.close()
+	
+	
+	def test_close(self, tmp_path):
+		"""
+		Tests if closing ring removes file and marks it as closed
+		for readers that have it open.
+		"""
+		filename = str(tmp_path / "sc0.state")
+		ring = StateRing(filename)
+		reader = StateRingReader(filename)
+		assert not reader.is_closed()
+		ring.close()
+		assert reader.is_closed()
+		assert not os.path.exists(filename)
+		reader.close()
+	
+	
+	def test_invalid(self, tmp_path):
+		"""
+		Tests if reader refuses file that is not state ring.
+		"""
+		filename = str(tmp_path / "sc0.state")
+		with open(filename, "wb") as f:
+			f.write(b"\0" * 1024)
+		with pytest.raises(ValueError):
+			StateRingReader(filename)
+	
+	
+	def test_mapper(self, tmp_path):
+		"""
+		Tests if mapper publishes every input.
+		"""
+		parser = ActionParser()
+		profile = Profile(parser)
+		profile.buttons[SCButtons.A] = parser.restart("button(Keys.KEY_ENTER)").parse()
+		mapper = Mapper(profile, Scheduler(), keyboard=False, mouse=False, gamepad=False)
+		mapper.keyboard = RememberingDummy()
+		mapper._testing = True
+		filename = str(tmp_path / "sc0.state")
+		c = FakeController(0)
+		mapper.set_controller(c)
+		mapper.set_state_ring(StateRing(filename))
+		reader = StateRingReader(filename)
+		
+		mapper.input(c, ZERO_STATE, ZERO_STATE._replace(buttons=SCButtons.A))
+		mapper.input(c, ZERO_STATE._replace(buttons=SCButtons.A), ZERO_STATE)
+		assert [ s.buttons for t, gyro, s in reader.read(2) ] == [ SCButtons.A, 0 ]
+		mapper.set_state_ring(None)
+		assert reader.is_closed()
+		reader.close()
@@ -0,0 +1,114 @@
+from scc.tracing import Histogram, Tracer
+from scc.constants import SCButtons
+from scc.parser import ActionParser
+from scc.profile import Profile
+from scc.scheduler import Scheduler
+from scc.mapper import Mapper
+from scc.drivers.fake import FakeController
+from test_inputs import ZERO_STATE, RememberingDummy
+import scc.tracing
+
+
+def create_mapper(controller):
+	mapper = Mapper(Profile(ActionParser()), Scheduler(),
+		keyboard=False, mouse=False, gamepad=False, poller=None)
+	mapper.keyboard = RememberingDummy()
+	mapper.set_controller(controller)
+	mapper.set_tracer(Tracer())
+	controller.set_mapper(mapper)
+	return mapper
+
+
+def decode_count(mapper):
+	return { x[0] : x[1] for x in mapper.tracer.get_stats() }.get("decode", 0)
+
+
+class TestTracing(object):
+	
+	def test_histogram(self):
+		"""
+		Tests if percentiles are computed only from last Histogram.SIZE
+		samples while count includes everything.
+		"""
+		h = Histogram()
+		assert h.summary() == (0, 0.0, 0.0, 0.0)
+		for i in range(Histogram.SIZE):
+			h.add(1000.0)
+		for i in range(Histogram.SIZE):
+			h.add(float(i))
+		count, p50, p99, mx = h.summary()
+		assert count == Histogram.SIZE * 2
+		assert p50 == Histogram.SIZE // 2
+		assert p99 == Histogram.SIZE * 99 // 100
+		assert mx == Histogram.SIZE - 1
+	
+	
+	def test_mapper(self):
+		"""
+		Tests if mapper with tracer set measures every stage and
+		every executed action.
+		"""
+		parser = ActionParser()
+		mapper = Mapper(Profile(parser), Scheduler(),
+			keyboard=False, mouse=False, gamepad=False, poller=None)
+		mapper.keyboard = RememberingDummy()
+		mapper.set_controller(FakeController(0))
+		mapper.get_controller().set_mapper(mapper)
+		mapper.set_tracer(Tracer())
+		mapper.profile.buttons[SCButtons.A] = (parser
+			.restart("button(Keys.KEY_ENTER)")).parse()
+		
+		scc.tracing.packet_received()
+		state = ZERO_STATE._replace(buttons=SCButtons.A)
+		mapper.controller.send_input(ZERO_STATE, state)
+		scc.tracing.packet_done()
+		mapper.controller.send_input(state, ZERO_STATE)
+		
+		stats = { x[0] : x[1:] for x in mapper.tracer.get_stats() }
+		assert stats["decode"][0] == 1
+		for name in ("input", "scheduler", "events", "feedback", "total"):
+			assert stats[name][0] == 2
+		assert stats["action:ButtonAction"][0] == 2
+		assert stats["total"][3] >= stats["input"][3]
+	
+	
+	def test_packet_not_sent(self):
+		"""
+		Tests if time when packet was received is not used for input of other
+		controller when nothing was sent to mapper while handling that packet.
+		"""
+		usb_mapper = create_mapper(FakeController(0))
+		evdev_mapper = create_mapper(FakeController(1))
+		state = ZERO_STATE._replace(buttons=SCButtons.A)
+		# Packet dropped as reordered, for example
+		scc.tracing.packet_received()
+		scc.tracing.packet_done()
+		evdev_mapper.controller.send_input(ZERO_STATE, state)
+		assert decode_count(evdev_mapper) == 0
+		
+		scc.tracing.packet_received()
+		usb_mapper.controller.send_input(ZERO_STATE, state)
+		scc.tracing.packet_done()
+		evdev_mapper.controller.send_input(state, ZERO_STATE)
+		assert decode_count(usb_mapper) == 1
+		assert decode_count(evdev_mapper) == 0
+	
+	
+	def test_coalesced(self):
+		"""
+		Tests if coalesced input is measured from time when first
+		of merged packets was received.
+		"""
+		mapper = create_mapper(FakeController(0))
+		mapper.controller.set_input_coalescing(True)
+		scc.tracing.packet_received()
+		first = scc.tracing.get_received()
+		mapper.controller.send_input(ZERO_STATE, ZERO_STATE._replace(stick_x=10))
+		scc.tracing.packet_done()
+		scc.tracing.packet_received()
+		mapper.controller.send_input(ZERO_STATE, ZERO_STATE._replace(stick_x=20))
+		scc.tracing.packet_done()
+		assert mapper.controller.flush_input()
+		assert mapper.controller.input_received == first
+		assert decode_count(mapper) == 1
+		assert not mapper.controller.flush_input()
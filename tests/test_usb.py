@@ -0,0 +1,175 @@
+import pytest
+try:
+	from scc.drivers.usb import USBDevice, _usb
+	from scc.drivers.sc_dongle import SCController
+	from scc.lib import usb1
+	from scc.config import Config
+except OSError:
+	# libusb-1.0 is not available
+	pytest.skip("libusb not available", allow_module_level=True)
+
+
+class FakeTransfer(object):
+	""" Transfer that is completed by test """
+	def __init__(self):
+		self.submitted = 0
+		self.status = usb1.TRANSFER_COMPLETED
+		self.data = b""
+	
+	def setInterrupt(self, endpoint, size, callback):
+		self.endpoint, self.size, self.callback = endpoint, size, callback
+	
+	def setControl(self, request_type, request, value, index, data,
+				callback, user_data, timeout):
+		self.request_type, self.callback, self.user_data = request_type, callback, user_data
+	
+	def getUserData(self):
+		return self.user_data
+	
+	def submit(self):
+		self.submitted += 1
+	
+	def getStatus(self):
+		return self.status
+	
+	def getActualLength(self):
+		return len(self.data)
+	
+	def getBuffer(self):
+		return self.data
+	
+	def complete(self, data, status=usb1.TRANSFER_COMPLETED):
+		self.data = data
+		self.status = status
+		self.callback(self)
+
+
+class FakeHandle(object):
+	def __init__(self):
+		self.transfers = []
+	
+	def getTransfer(self):
+		self.transfers.append(FakeTransfer())
+		return self.transfers[-1]
+
+
+class TestUSB(object):
+	
+	def test_input_transfers(self):
+		"""
+		Tests if requested number of input transfers is kept submitted
+		and every full packet is passed to callback.
+		"""
+		handle = FakeHandle()
+		device = USBDevice(None, handle)
+		received = []
+		device.set_input_interrupt(2, 4, lambda endpoint, data: received.append(data), 3)
+		assert len(handle.transfers) == 3
+		for t in handle.transfers:
+			assert t.endpoint == usb1.ENDPOINT_IN | 2
+			assert t.size == 4
+			assert t.submitted == 1
+		
+		# Transfers may complete in any order
+		handle.transfers[1].complete(b"abcd")
+		handle.transfers[0].complete(b"efgh")
+		assert received == [ b"abcd", b"efgh" ]
+		assert [ t.submitted for t in handle.transfers ] == [ 2, 2, 1 ]
+		
+		# Short packet is not passed to callback, but transfer is resubmitted
+		handle.transfers[2].complete(b"ab")
+		assert received == [ b"abcd", b"efgh" ]
+		assert handle.transfers[2].submitted == 2
+		
+		# Failed transfer is not resubmitted
+		handle.transfers[2].complete(b"abcd", usb1.TRANSFER_ERROR)
+		assert received == [ b"abcd", b"efgh" ]
+		assert handle.transfers[2].submitted == 2
+	
+	
+	def test_input_transfers_default(self, monkeypatch):
+		"""
+		Tests if number of input transfers is taken from config
+		when not specified.
+		"""
+		monkeypatch.setattr(_usb, "input_transfers", 4)
+		handle = FakeHandle()
+		device = USBDevice(None, handle)
+		device.set_input_interrupt(1, 64, lambda endpoint, data: None)
+		assert len(handle.transfers) == 4
+		assert len(device._transfer_list) == 4
+	
+	
+	def test_request(self):
+		"""
+		Tests if request callback is called with response read
+		after request is sent.
+		"""
+		handle = FakeHandle()
+		device = USBDevice(None, handle)
+		responses = []
+		device.make_request(1, responses.append, b"\xae\x15\x01")
+		device.flush()
+		transfer, = handle.transfers
+		assert transfer.request_type == 0x21
+		transfer.complete(b"")
+		device.flush()
+		assert transfer.request_type == 0xA1
+		transfer.complete(b"serial")
+		assert responses == [ b"serial" ]
+		assert device.get_control_stats()[0:3] == (1, 0, 0)
+	
+	
+	def test_request_failed(self):
+		"""
+		Tests if failed request is sent again and callback is called
+		with None after all retries fail, both when sending request
+		and when reading response.
+		"""
+		handle = FakeHandle()
+		device = USBDevice(None, handle)
+		responses = []
+		device.make_request(1, responses.append, b"\xae\x15\x01")
+		device.send_control(1, b"\x87")
+		device.flush()
+		transfer, = handle.transfers
+		# Reading response fails, request is sent again before other control
+		transfer.complete(b"")
+		device.flush()
+		transfer.complete(b"", usb1.TRANSFER_TIMED_OUT)
+		device.flush()
+		assert transfer.request_type == 0x21
+		assert transfer.user_data[4] is False and transfer.user_data[3] is not None
+		for i in range(USBDevice.REQUEST_RETRIES):
+			assert responses == []
+			transfer.complete(b"", usb1.TRANSFER_ERROR)
+			device.flush()
+		assert responses == [ None ]
+		assert device.get_control_stats()[2] == USBDevice.REQUEST_RETRIES + 1
+		# Queued control is sent after request has failed
+		assert transfer.request_type == 0x21
+		assert transfer.user_data[3] is None
+	
+	
+	def test_serial_failed(self, tmp_path, monkeypatch):
+		"""
+		Tests if controller whose serial number request failed
+		is remembered, so serial is requested again on next input.
+		"""
+		monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+		cfg = Config()
+		cfg["ignore_serials"] = False
+		cfg.save()
+		Config._shared = None
+		
+		class FakeDongle(object):
+			def __init__(self):
+				self._no_serial = []
+			def make_request(self, index, callback, data, size=64):
+				callback(None)
+		
+		dongle = FakeDongle()
+		c = SCController(None, 2, 1)
+		c._driver = dongle
+		c.read_serial()
+		assert dongle._no_serial == [ c ]